@@ -1,12 +1,13 @@
 #/auth/google.py
 
 from fastapi import APIRouter, Depends, HTTPException, Response, Request
-import requests, os, uuid, datetime
+import os, uuid, datetime
 from sqlmodel import select, Session
 from ..db import get_session
 from ..models import User, SessionModel
 from ..utils.utils import create_token
 from ..utils.response import success, error
+from .google_keys import google_keys, verify_google_id_token, InvalidGoogleToken
 
 router = APIRouter()
 
@@ -18,11 +19,11 @@ def google_verify(payload: dict, response: Response, session: Session = Depends(
     if not id_token:
         return error("id_token required", 400, {"code": "MISSING_TOKEN"})
 
-    # Validate Google token
-    info = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}").json()
-
-    if info.get("aud") != GOOGLE_CLIENT_ID:
-        return error("Invalid Google aud", 400, {"code": "INVALID_AUD"})
+    # Validate Google token locally (signature, aud, iss, exp, email_verified)
+    try:
+        info = verify_google_id_token(id_token, GOOGLE_CLIENT_ID, google_keys)
+    except InvalidGoogleToken as e:
+        return error(str(e), 400, {"code": e.code})
 
     email = info.get("email")
     name = info.get("name", "")
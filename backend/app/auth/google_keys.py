@@ -0,0 +1,131 @@
+# app/auth/google_keys.py
+# Local verification of Google ID tokens against Google's published signing keys
+# (instead of a tokeninfo round trip per login). Keys are fetched over a pooled
+# HTTP client, kept for as long as their Cache-Control allows and refreshed in
+# the background shortly before they expire.
+import os, re, time, threading
+from typing import Dict, Optional
+import httpx
+import jwt
+
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_MAX_AGE = 3600
+REFRESH_MARGIN = 300  # refresh this many seconds before the keys expire
+MIN_REFETCH_INTERVAL = 30  # unknown `kid` may force a refetch at most this often
+CLOCK_SKEW = 60
+
+
+class InvalidGoogleToken(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+class GoogleKeyStore:
+    def __init__(self, url: str = GOOGLE_CERTS_URL, client: Optional[httpx.Client] = None):
+        self.url = url
+        self._client = client or httpx.Client(timeout=5.0, limits=httpx.Limits(max_keepalive_connections=4))
+        self._keys: Dict[str, object] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self):
+        response = self._client.get(self.url)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            if jwk.get("kid"):
+                keys[jwk["kid"]] = jwt.PyJWK(jwk).key
+        now = time.monotonic()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + _max_age(response.headers.get("cache-control"))
+
+    def get_key(self, kid: str):
+        now = time.monotonic()
+        with self._lock:
+            key = self._keys.get(kid)
+            fresh = now < self._expires_at
+            may_refetch = now - self._fetched_at >= MIN_REFETCH_INTERVAL
+        if key is not None and fresh:
+            return key
+        if not fresh or may_refetch:
+            # expired, or Google rotated keys since our last fetch
+            self.refresh()
+            with self._lock:
+                key = self._keys.get(kid)
+        return key
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                wait = self._expires_at - REFRESH_MARGIN - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                print("[GOOGLE] key refresh failed", e)
+                self._stop.wait(MIN_REFETCH_INTERVAL)
+
+    def start_background_refresh(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="google-keys", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+
+def verify_google_id_token(token: str, audience: str, store: GoogleKeyStore) -> dict:
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError:
+        raise InvalidGoogleToken("Malformed Google token", "INVALID_TOKEN")
+
+    try:
+        key = store.get_key(header.get("kid", ""))
+    except httpx.HTTPError:
+        raise InvalidGoogleToken("Google signing keys unavailable", "KEYS_UNAVAILABLE")
+    if key is None:
+        raise InvalidGoogleToken("Unknown Google signing key", "INVALID_TOKEN")
+
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=audience,
+            leeway=CLOCK_SKEW,
+            options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        )
+    except jwt.InvalidAudienceError:
+        raise InvalidGoogleToken("Invalid Google aud", "INVALID_AUD")
+    except jwt.ExpiredSignatureError:
+        raise InvalidGoogleToken("Google token expired", "TOKEN_EXPIRED")
+    except jwt.PyJWTError:
+        raise InvalidGoogleToken("Invalid Google token", "INVALID_TOKEN")
+
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise InvalidGoogleToken("Invalid Google issuer", "INVALID_ISS")
+    if claims.get("email_verified") not in (True, "true"):
+        raise InvalidGoogleToken("Google email not verified", "EMAIL_NOT_VERIFIED")
+    return claims
+
+
+google_keys = GoogleKeyStore()
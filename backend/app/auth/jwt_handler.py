@@ -4,6 +4,7 @@ from sqlmodel import Session, select
 from ..db import get_session
 from ..models import SessionModel, User
 from ..utils.utils import verify_token
+from ..utils.auth_cache import get_cached_user, cache_user, token_key
 import datetime
 
 def require_auth(request: Request, db: Session = Depends(get_session)) -> User:
@@ -20,17 +21,30 @@ def require_auth(request: Request, db: Session = Depends(get_session)) -> User:
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    # check session record
-    sess = db.exec(select(SessionModel).where(SessionModel.token == token)).first()
-    if not sess:
+    # the cache only saves the session lookup, never the signature check
+    cached = get_cached_user(token_key(token))
+    if cached and cached[0].id == user_id:
+        return cached[0]
+
+    # check session record and its user in one round trip
+    row = db.exec(
+        select(SessionModel, User)
+        .join(User, User.id == SessionModel.user_id, isouter=True)
+        .where(SessionModel.token == token)
+    ).first()
+    if not row:
         raise HTTPException(status_code=401, detail="Invalid session")
+    sess, user = row
 
     # check expiry (use timezone-aware compare)
-    if sess.expires_at and sess.expires_at < datetime.datetime.now(datetime.timezone.utc):
+    expires_at = sess.expires_at
+    if expires_at and expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+    if expires_at and expires_at < datetime.datetime.now(datetime.timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
 
-    user = db.exec(select(User).where(User.id == sess.user_id)).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    cache_user(token_key(token), user, expires_at)
     return user
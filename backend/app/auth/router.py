@@ -2,11 +2,14 @@
 
 from fastapi import APIRouter, Depends, Request, Response
 from sqlmodel import select, Session
+from sqlalchemy import delete
 from ..db import get_session
 from ..models import User, OTP, SessionModel
 from ..schemas import RegisterIn, LoginIn, VerifyOTPIn
 from ..utils.response import success, error
-from ..utils.utils import send_otp_email_sendgrid, create_token
+from ..utils.utils import create_token
+from ..utils.mailer import enqueue_otp_email, notify_email_worker
+from ..utils.auth_cache import invalidate_session
 import uuid, random, datetime
 
 router = APIRouter()
@@ -35,9 +38,9 @@ def register(payload: RegisterIn, session: Session = Depends(get_session)):
         expires_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=10)
     )
     session.add(otp)
+    enqueue_otp_email(session, user.email, code)
     session.commit()
-
-    send_otp_email_sendgrid(user.email, code)
+    notify_email_worker()
 
     return success(
         data={"accountId": user.id},
@@ -58,9 +61,9 @@ def login(payload: LoginIn, session: Session = Depends(get_session)):
         expires_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=10)
     )
     session.add(otp)
+    enqueue_otp_email(session, user.email, code)
     session.commit()
-
-    send_otp_email_sendgrid(user.email, code)
+    notify_email_worker()
 
     return success(
         data={"accountId": user.id},
@@ -75,8 +78,16 @@ def verify(payload: VerifyOTPIn, response: Response, session: Session = Depends(
         OTP.code == payload.passcode
     )).first()
 
-    if not otp or otp.expires_at < datetime.datetime.now(datetime.timezone.utc):
+    if not otp:
         return error("Invalid OTP", 400, {"code": "INVALID_OTP"})
+    expires_at = otp.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+    if expires_at < datetime.datetime.now(datetime.timezone.utc):
+        return error("Invalid OTP", 400, {"code": "INVALID_OTP"})
+
+    # a code works once; drop every outstanding code for this user with it
+    session.exec(delete(OTP).where(OTP.user_id == payload.accountId))
 
     session_id = str(uuid.uuid4())
     jwt = create_token(payload.accountId)
@@ -108,7 +119,9 @@ def verify(payload: VerifyOTPIn, response: Response, session: Session = Depends(
 def logout(request: Request, response: Response, db: Session = Depends(get_session)):
     token = request.cookies.get("session")
     if token:
-        sess = db.exec(select(SessionModel).where(SessionModel.token == token)).first()
+        invalidate_session(token)
+        # the cookie holds the session id (see verify-otp / google_verify)
+        sess = db.get(SessionModel, token)
         if sess:
             db.delete(sess)
             db.commit()
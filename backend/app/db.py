@@ -1,4 +1,7 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
 import os
 from dotenv import load_dotenv
 
@@ -8,12 +11,85 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise Exception("DATABASE_URL is missing in .env !")
 
-engine = create_engine(DATABASE_URL, echo=True)  # echo=True biar kelihatan migrasi SQL
+# Async driver URL for the async routes; derived from DATABASE_URL unless set.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# SQL logging is off unless DB_ECHO=1 (it used to print every statement)
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    driver = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+    }.get(scheme, scheme)
+    return driver + sep + rest
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+_async_engine = None
+
+def get_async_engine():
+    # created on first use so sync-only tools (CLI jobs) don't need the async driver
+    global _async_engine
+    if _async_engine is None:
+        url = ASYNC_DATABASE_URL or _async_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, **_engine_options(url))
+    return _async_engine
+
+def _sync_schema():
+    # create_all only creates missing tables; bring existing ones up to date
+    # with new nullable columns and indexes declared on the models.
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {col_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 def init_db():
-    from .models import User, File, SessionModel, OTP
+    from .models import User, Blob, File, FileShare, AccountUsage, SessionModel, OTP, UploadSession, EmailJob
     SQLModel.metadata.create_all(engine)
+    _sync_schema()
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+async def dispose_engines():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    engine.dispose()
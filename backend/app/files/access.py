@@ -0,0 +1,116 @@
+# app/files/access.py
+# Per-user sharing lives in file_shares (one row per file + grantee email);
+# File.users is kept as a mirror of the grantee emails for existing clients.
+import datetime
+from typing import List, Optional
+from sqlmodel import Session, select
+from sqlalchemy import delete
+from ..models import File as FileModel, FileShare, User
+
+SHARE_ROLES = ("viewer", "editor")
+_ID_CHUNK = 900  # stay under SQLite's bound-parameter limit
+
+
+def access_role(session: Session, file_obj: FileModel, user) -> Optional[str]:
+    """Return "owner", "shared-user" or None if `user` may not read the file."""
+    if file_obj.owner_id == user.id:
+        return "owner"
+    if not user.email:
+        return None
+    shared = session.exec(select(FileShare.id).where(
+        FileShare.file_id == file_obj.id,
+        FileShare.grantee_email == user.email.lower()
+    )).first()
+    return "shared-user" if shared else None
+
+
+def readable_ids(session: Session, files: List[FileModel], user) -> set:
+    """Ids among `files` that `user` owns or has been shared, without a query per file."""
+    allowed = {f.id for f in files if f.owner_id == user.id}
+    others = [f.id for f in files if f.id not in allowed]
+    if not user.email:
+        return allowed
+    for i in range(0, len(others), _ID_CHUNK):
+        allowed.update(session.exec(select(FileShare.file_id).where(
+            FileShare.file_id.in_(others[i:i + _ID_CHUNK]),
+            FileShare.grantee_email == user.email.lower()
+        )).all())
+    return allowed
+
+
+def _mirror_users(session: Session, file_obj: FileModel) -> List[str]:
+    emails = session.exec(
+        select(FileShare.grantee_email).where(FileShare.file_id == file_obj.id).order_by(FileShare.id)
+    ).all()
+    file_obj.users = list(emails)
+    file_obj.updatedAt = datetime.datetime.now(datetime.timezone.utc)
+    session.add(file_obj)
+    return file_obj.users
+
+
+def share_with(session: Session, file_obj: FileModel, email: str, role: str = "viewer") -> List[str]:
+    email = email.lower().strip()
+    share = session.exec(select(FileShare).where(
+        FileShare.file_id == file_obj.id,
+        FileShare.grantee_email == email
+    )).first()
+    if share:
+        share.role = role
+    else:
+        grantee = session.exec(select(User.id).where(User.email == email)).first()
+        share = FileShare(file_id=file_obj.id, grantee_email=email, grantee_user_id=grantee, role=role)
+    session.add(share)
+    session.flush()
+    return _mirror_users(session, file_obj)
+
+
+def unshare_with(session: Session, file_obj: FileModel, email: str) -> List[str]:
+    session.exec(delete(FileShare).where(
+        FileShare.file_id == file_obj.id,
+        FileShare.grantee_email == email.lower().strip()
+    ))
+    return _mirror_users(session, file_obj)
+
+
+def drop_shares(session: Session, file_id: str):
+    session.exec(delete(FileShare).where(FileShare.file_id == file_id))
+
+
+def migrate_json_shares(session: Session, batch_size: int = 1000) -> int:
+    """Copy File.users emails into file_shares for files that have no share rows
+    yet, so files shared through the old column later are picked up on the next
+    run. Returns rows created."""
+    created = 0
+    last_id = ""
+    while True:
+        files = session.exec(
+            select(FileModel.id, FileModel.users)
+            .where(FileModel.id > last_id)
+            .order_by(FileModel.id)
+            .limit(batch_size)
+        ).all()
+        if not files:
+            break
+        last_id = files[-1][0]
+        wanted = {
+            file_id: list(dict.fromkeys(e.lower().strip() for e in users if e and e.strip()))
+            for file_id, users in files if users
+        }
+        ids = list(wanted)
+        for i in range(0, len(ids), _ID_CHUNK):
+            for file_id in session.exec(select(FileShare.file_id).where(FileShare.file_id.in_(ids[i:i + _ID_CHUNK])).distinct()).all():
+                wanted.pop(file_id, None)
+
+        emails = list({email for batch in wanted.values() for email in batch})
+        grantees = {}
+        for i in range(0, len(emails), _ID_CHUNK):
+            grantees.update((email, user_id) for user_id, email in session.exec(
+                select(User.id, User.email).where(User.email.in_(emails[i:i + _ID_CHUNK]))
+            ).all())
+
+        for file_id, batch in wanted.items():
+            for email in batch:
+                session.add(FileShare(file_id=file_id, grantee_email=email, grantee_user_id=grantees.get(email), role="viewer"))
+                created += 1
+        session.commit()
+    return created
@@ -0,0 +1,280 @@
+# app/files/admission.py
+# Admission control for file transfers, so a burst of big uploads/downloads
+# cannot take every worker thread and all disk bandwidth from the API.
+#
+# Each direction has a limiter: at most *_MAX_CONCURRENT transfers at once and
+# *_MAX_PER_USER per user (per client address without a valid session, given as
+# the session cookie or an "Authorization: Bearer <session id>" header). A user
+# over their own limit gets 429 right away; when the global limit is reached
+# requests wait in a FIFO queue of TRANSFER_QUEUE_SIZE for up to
+# TRANSFER_QUEUE_TIMEOUT seconds, then (or when the queue is full) get 503. Both carry Retry-After. Admitted transfers are paced by token buckets
+# (*_BANDWIDTH bytes/s overall and *_BANDWIDTH_PER_USER), applied to the request
+# body for uploads and the response body for downloads.
+#
+# Limits are per process (per uvicorn worker); 0 disables a limit. Downloads handed
+# off with DOWNLOAD_DELIVERY=x-accel|x-sendfile are admitted but the proxy sends
+# the bytes, so use its own rate limiting (e.g. nginx limit_rate) for bandwidth.
+import os, time, asyncio, json
+from collections import defaultdict, deque
+from http.cookies import SimpleCookie
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge
+from sqlalchemy.exc import SQLAlchemyError
+from ..utils.auth_utils import session_user_async
+from ..utils.response import error
+
+
+def _limit(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+TRANSFER_QUEUE_SIZE = int(_limit("TRANSFER_QUEUE_SIZE", "64"))
+TRANSFER_QUEUE_TIMEOUT = _limit("TRANSFER_QUEUE_TIMEOUT", "10")
+TRANSFER_RETRY_AFTER = int(_limit("TRANSFER_RETRY_AFTER", "5"))
+
+LIMITS = {
+    "upload": {
+        "max_concurrent": int(_limit("UPLOAD_MAX_CONCURRENT", "16")),
+        "max_per_user": int(_limit("UPLOAD_MAX_PER_USER", "4")),
+        "bandwidth": _limit("UPLOAD_BANDWIDTH", "0"),
+        "bandwidth_per_user": _limit("UPLOAD_BANDWIDTH_PER_USER", "0"),
+    },
+    "download": {
+        "max_concurrent": int(_limit("DOWNLOAD_MAX_CONCURRENT", "32")),
+        "max_per_user": int(_limit("DOWNLOAD_MAX_PER_USER", "8")),
+        "bandwidth": _limit("DOWNLOAD_BANDWIDTH", "0"),
+        "bandwidth_per_user": _limit("DOWNLOAD_BANDWIDTH_PER_USER", "0"),
+    },
+}
+
+TRANSFERS_ACTIVE = Gauge("transfer_active", "Admitted transfers in progress", ["direction"], multiprocess_mode="livesum")
+TRANSFERS_QUEUED = Gauge("transfer_queued", "Transfers waiting for a slot", ["direction"], multiprocess_mode="livesum")
+TRANSFERS_REJECTED = Counter("transfer_rejected_total", "Transfers turned away", ["direction", "reason"])
+TRANSFER_THROTTLED = Counter("transfer_throttled_seconds_total", "Time transfers were paused by bandwidth limits", ["direction"])
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class TokenBucket:
+    """Bytes/second pacing. Callers take what they need and sleep off any debt,
+    so concurrent consumers share the rate roughly in arrival order."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def consume(self, amount: int) -> float:
+        if self.rate <= 0 or amount <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        delay = -self.tokens / self.rate
+        await asyncio.sleep(delay)
+        return delay
+
+
+class TransferLimiter:
+    def __init__(self, direction: str, max_concurrent: int, max_per_user: int, bandwidth: float, bandwidth_per_user: float,
+                 queue_size: int = TRANSFER_QUEUE_SIZE, queue_timeout: float = TRANSFER_QUEUE_TIMEOUT):
+        self.direction = direction
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.bandwidth_per_user = bandwidth_per_user
+        self.bucket = TokenBucket(bandwidth)
+        self.active = 0
+        self.per_user: Dict[str, int] = defaultdict(int)  # admitted + queued
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self._waiters = deque()
+
+    def _admit(self, key: str):
+        self.active += 1
+        self.per_user[key] += 1
+        TRANSFERS_ACTIVE.labels(self.direction).set(self.active)
+
+    def _forget(self, key: str):
+        self.per_user[key] -= 1
+        if self.per_user[key] <= 0:
+            self.per_user.pop(key, None)
+            self._user_buckets.pop(key, None)
+
+    async def acquire(self, key: str):
+        if self.max_per_user and self.per_user.get(key, 0) >= self.max_per_user:
+            TRANSFERS_REJECTED.labels(self.direction, "per_user").inc()
+            raise Rejected(429, "TOO_MANY_TRANSFERS", f"Too many concurrent {self.direction}s for this user")
+        if not self.max_concurrent or (self.active < self.max_concurrent and not self._waiters):
+            self._admit(key)
+            return
+        if len(self._waiters) >= self.queue_size:
+            TRANSFERS_REJECTED.labels(self.direction, "queue_full").inc()
+            raise Rejected(503, "TRANSFERS_BUSY", "Server is busy with other transfers")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.per_user[key] += 1
+        TRANSFERS_QUEUED.labels(self.direction).set(len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._drop_waiter(waiter)
+            self._forget(key)
+            TRANSFERS_REJECTED.labels(self.direction, "queue_timeout").inc()
+            raise Rejected(503, "TRANSFERS_BUSY", "Server is busy with other transfers")
+        except BaseException:
+            # client went away while queued; give back a slot already handed over
+            self._drop_waiter(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release(key)
+            else:
+                self._forget(key)
+            raise
+
+    def _drop_waiter(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        TRANSFERS_QUEUED.labels(self.direction).set(len(self._waiters))
+
+    def release(self, key: str):
+        self._forget(key)
+        # hand the slot straight to the next live waiter (active stays the same)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                TRANSFERS_QUEUED.labels(self.direction).set(len(self._waiters))
+                return
+        TRANSFERS_QUEUED.labels(self.direction).set(0)
+        self.active -= 1
+        TRANSFERS_ACTIVE.labels(self.direction).set(self.active)
+
+    async def throttle(self, key: str, amount: int):
+        delay = await self.bucket.consume(amount)
+        if self.bandwidth_per_user > 0:
+            bucket = self._user_buckets.get(key)
+            if bucket is None:
+                bucket = self._user_buckets[key] = TokenBucket(self.bandwidth_per_user)
+            delay += await bucket.consume(amount)
+        if delay:
+            TRANSFER_THROTTLED.labels(self.direction).inc(delay)
+
+
+limiters = {direction: TransferLimiter(direction, **limits) for direction, limits in LIMITS.items()}
+
+
+def transfer_direction(method: str, path: str) -> Optional[str]:
+    if method == "POST" and path in ("/files/upload", "/files/upload/stream"):
+        return "upload"
+    if method == "PATCH" and path.startswith("/files/uploads/"):
+        return "upload"
+    if method == "GET" and path.startswith(("/files/download/", "/files/signed/", "/uploads/")):
+        return "download"
+    if method == "POST" and path == "/files/download/zip":
+        return "download"
+    return None
+
+
+def _session_tokens(scope):
+    """Session ids the request carries: bearer header first, then the cookie."""
+    bearer = cookie_header = None
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and bearer is None:
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token.strip():
+                bearer = token.strip()
+        elif name == b"cookie" and cookie_header is None:
+            cookie_header = value.decode("latin-1")
+    if bearer:
+        yield bearer
+    if cookie_header:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(cookie_header)
+        except Exception:
+            return
+        morsel = cookie.get("session")
+        if morsel and morsel.value:
+            yield morsel.value
+
+
+async def _client_key(scope) -> str:
+    # runs before the route's auth: the user behind a valid session (which also
+    # warms the auth cache for the route), else the client address, so made-up or
+    # rotated tokens all share their address's limits. A failing session lookup
+    # falls back to the address too; the route's own auth reports the error.
+    for token in _session_tokens(scope):
+        try:
+            user = await session_user_async(token)
+        except (SQLAlchemyError, OSError) as e:
+            print("[ADMISSION] session lookup failed", e)
+            break
+        if user:
+            return f"user:{user.id}"
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+async def _reject(send, rejected: Rejected):
+    body = json.dumps(error(rejected.message, rejected.status, {"code": rejected.code, "retryAfter": TRANSFER_RETRY_AFTER})).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(TRANSFER_RETRY_AFTER).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        direction = transfer_direction(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if not direction:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[direction]
+        key = await _client_key(scope)
+        try:
+            await limiter.acquire(key)
+        except Rejected as rejected:
+            await _reject(send, rejected)
+            return
+
+        async def paced_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                await limiter.throttle(key, len(message.get("body", b"")))
+            return message
+
+        async def paced_send(message):
+            if message["type"] == "http.response.body":
+                await limiter.throttle(key, len(message.get("body", b"")))
+            await send(message)
+
+        try:
+            if direction == "upload":
+                await self.app(scope, paced_receive, send)
+            else:
+                await self.app(scope, receive, paced_send)
+        finally:
+            limiter.release(key)
@@ -0,0 +1,136 @@
+# app/files/batch.py
+# POST /files/batch: apply many delete / rename / share / unshare operations with
+# one ownership query and one commit. atomic=true (default) applies all or
+# nothing; atomic=false applies what it can and reports per-item results.
+# Disk cleanup for deleted files runs after the response is sent; it goes through
+# discard_stored, which keeps bytes that were uploaded again in the meantime.
+import datetime
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends
+from pydantic import BaseModel, EmailStr, Field
+from sqlmodel import Session, select
+from ..db import get_session
+from ..models import File as FileModel
+from ..utils.response import success, error
+from ..utils.auth_utils import require_auth
+from .access import share_with, unshare_with, SHARE_ROLES
+from .service import delete_file_record, discard_stored
+
+router = APIRouter()
+
+MAX_BATCH_OPERATIONS = 5000
+_ID_CHUNK = 900  # stay under SQLite's bound-parameter limit
+
+class BatchOperation(BaseModel):
+    op: str  # "delete" | "rename" | "share" | "unshare"
+    id: str
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    role: str = "viewer"
+
+class BatchPayload(BaseModel):
+    operations: List[BatchOperation] = Field(..., max_length=MAX_BATCH_OPERATIONS)
+    atomic: bool = True
+
+
+def _discard_released(released):
+    for file_obj, stored in released:
+        try:
+            discard_stored(file_obj, stored)
+        except Exception as e:
+            # left for scrub.py; the rest still get cleaned up
+            print("[BATCH] cleanup failed", file_obj.id, e)
+
+
+def _load_files(session: Session, ids: List[str]) -> dict:
+    files = {}
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        for f in session.exec(select(FileModel).where(FileModel.id.in_(chunk))).all():
+            files[f.id] = f
+    return files
+
+
+def _validate(op: BatchOperation, file_obj: Optional[FileModel], user) -> Optional[dict]:
+    if not file_obj:
+        return {"code": "FILE_NOT_FOUND"}
+    if file_obj.owner_id != user.id:
+        return {"code": "NOT_AUTHORIZED"}
+    if op.op == "rename":
+        if not op.name or not op.name.strip():
+            return {"code": "INVALID_NAME"}
+    elif op.op in ("share", "unshare"):
+        if not op.email:
+            return {"code": "MISSING_EMAIL"}
+        if op.op == "share" and op.role not in SHARE_ROLES:
+            return {"code": "INVALID_ROLE"}
+    elif op.op != "delete":
+        return {"code": "INVALID_OP"}
+    return None
+
+
+def _apply(session: Session, op: BatchOperation, file_obj: FileModel):
+    """Apply one operation; returns the storage a delete released, if any."""
+    if op.op == "delete":
+        return delete_file_record(session, file_obj)
+    elif op.op == "rename":
+        file_obj.name = op.name.strip()
+        file_obj.updatedAt = datetime.datetime.now(datetime.timezone.utc)
+        session.add(file_obj)
+    elif op.op == "share":
+        share_with(session, file_obj, op.email, op.role)
+    elif op.op == "unshare":
+        unshare_with(session, file_obj, op.email)
+    return None
+
+
+@router.post("")
+def batch_files(payload: BatchPayload, background: BackgroundTasks, user = Depends(require_auth), session: Session = Depends(get_session)):
+    if not payload.operations:
+        return error("No operations", 400, {"code": "EMPTY_BATCH"})
+
+    files = _load_files(session, list(dict.fromkeys(op.id for op in payload.operations)))
+
+    # validate everything up front against the one query above
+    results = []
+    deleted = set()
+    for index, op in enumerate(payload.operations):
+        file_obj = None if op.id in deleted else files.get(op.id)
+        err = _validate(op, file_obj, user)
+        results.append({"index": index, "id": op.id, "op": op.op, "ok": err is None, **({"error": err} if err else {})})
+        if err is None and op.op == "delete":
+            deleted.add(op.id)
+
+    failed = [r for r in results if not r["ok"]]
+    if failed and payload.atomic:
+        return error("Batch rejected", 400, {"code": "BATCH_INVALID", "results": results})
+
+    released = []
+    for op, result in zip(payload.operations, results):
+        if not result["ok"]:
+            continue
+        file_obj = files[op.id]
+        if payload.atomic:
+            stored = _apply(session, op, file_obj)
+        else:
+            try:
+                with session.begin_nested():
+                    stored = _apply(session, op, file_obj)
+            except Exception as e:
+                result["ok"] = False
+                result["error"] = {"code": "OPERATION_FAILED", "detail": str(e)}
+                continue
+        if stored:
+            released.append((file_obj, stored))
+
+    session.commit()
+
+    if released:
+        background.add_task(_discard_released, released)
+
+    applied = sum(1 for r in results if r["ok"])
+    return success(
+        data={"results": results, "applied": applied, "failed": len(results) - applied},
+        message="Batch applied",
+        code=200
+    )
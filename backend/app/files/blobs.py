@@ -0,0 +1,97 @@
+# app/files/blobs.py
+# Content-addressed blob store: one file per distinct sha256, shared by every
+# File row that points at it and removed when the last reference goes away.
+# The bytes live in storage.blob_storage (local disk or S3).
+#
+# The row's primary key doubles as the lock for the bytes: store_blob inserts the
+# row before it writes new bytes, and delete_unreferenced holds a placeholder row
+# while it deletes them, so a store and a delete of the same hash never overlap.
+import os, datetime
+from typing import Optional
+from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from ..models import Blob
+from .storage import Locator, blob_storage, remove_quietly
+
+
+def _locked(session: Session, blob_hash: str) -> Optional[Blob]:
+    return session.exec(select(Blob).where(Blob.hash == blob_hash).with_for_update()).first()
+
+
+def store_blob(session: Session, temp_path: str, blob_hash: str, size: int, encoding: Optional[str] = None) -> Blob:
+    """Take ownership of a fully written temp file and add one reference to its blob.
+
+    `size` and `blob_hash` describe the original content; `encoding` says how the
+    temp file is compressed, if at all. If the content is already stored the temp
+    file is dropped (the existing blob keeps its encoding), otherwise it is handed
+    to the blob storage. The caller commits.
+    """
+    blob = _locked(session, blob_hash)
+    if blob:
+        remove_quietly(temp_path)
+        blob.refCount += 1
+        session.add(blob)
+        return blob
+
+    blob = Blob(
+        hash=blob_hash, size=size, refCount=1, storedSize=os.path.getsize(temp_path), contentEncoding=encoding,
+        createdAt=datetime.datetime.now(datetime.timezone.utc),
+    )
+    try:
+        # row first: it waits for (or fails against) any concurrent store / delete of this hash
+        with session.begin_nested():
+            session.add(blob)
+    except IntegrityError:
+        # someone stored the same content concurrently; share their row
+        remove_quietly(temp_path)
+        blob = _locked(session, blob_hash)
+        blob.refCount += 1
+        session.add(blob)
+        return blob
+    blob_storage.put(blob_hash, temp_path)
+    return blob
+
+
+def acquire_blob(session: Session, blob_hash: str) -> Optional[Blob]:
+    """Add a reference to an already stored blob (no bytes transferred)."""
+    blob = _locked(session, blob_hash)
+    if not blob or blob_storage.stat(blob_hash) is None:
+        return None
+    blob.refCount += 1
+    session.add(blob)
+    return blob
+
+
+def release_blob(session: Session, blob_hash: str) -> Optional[Locator]:
+    """Drop one reference. Returns the locator to delete once the caller has committed,
+    or None while other File rows still use the blob."""
+    blob = _locked(session, blob_hash)
+    if not blob:
+        return None
+    blob.refCount -= 1
+    if blob.refCount > 0:
+        session.add(blob)
+        return None
+    session.delete(blob)
+    return ("blob", blob_hash)
+
+
+def delete_unreferenced(session: Session, blob_hash: str, store=None) -> bool:
+    """Delete a blob's bytes once its row is gone (call after the commit that removed
+    it). A placeholder row holds the hash meanwhile; if the content was stored again
+    in between, its row is there and the bytes are kept. Returns whether they were deleted."""
+    placeholder = Blob(hash=blob_hash, size=0, refCount=0)
+    try:
+        session.add(placeholder)
+        session.flush()
+    except (IntegrityError, OperationalError):
+        # stored again, or still being stored (SQLite: locked); keep the bytes,
+        # scrub.py removes them if they really are orphaned
+        session.rollback()
+        return False
+    try:
+        (store or blob_storage).delete(blob_hash)
+    finally:
+        session.delete(placeholder)
+        session.commit()
+    return True
@@ -0,0 +1,120 @@
+# app/files/compression.py
+# Optional compression of stored content. With STORAGE_COMPRESSION=zstd (needs
+# `pip install zstandard`) uploads of compressible types - text, CSV, JSON, XML,
+# logs, the older binary office formats - are zstd-compressed while they are
+# written to staging. Media and formats that are already compressed (images,
+# video, audio, archives, PDF, and docx/xlsx/odt, which are zip containers) are
+# stored as they are.
+#
+# Blob.contentEncoding / storedSize say how the bytes are stored and File rows
+# mirror them. File.size and checksum always describe the original content, so
+# usage, quotas, ETags and dedup by hash do not change.
+import os
+from typing import Iterator, Optional
+from .storage import stream_file
+
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "").lower() or None
+STORAGE_COMPRESSION_LEVEL = int(os.getenv("STORAGE_COMPRESSION_LEVEL", "3"))
+
+ENCODINGS = ("zstd",)
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/xml", "application/javascript",
+    "application/x-javascript", "application/sql", "application/x-sql", "application/yaml",
+    "application/x-yaml", "application/csv", "application/rtf", "application/x-sh",
+    "application/msword", "application/vnd.ms-excel", "application/vnd.ms-powerpoint",
+    "image/svg+xml",
+}
+COMPRESSIBLE_SUFFIXES = ("+xml", "+json")
+COMPRESSIBLE_EXTENSIONS = {
+    "txt", "text", "log", "csv", "tsv", "json", "ndjson", "jsonl", "xml", "yaml", "yml",
+    "md", "html", "htm", "css", "js", "sql", "svg", "rtf", "ini", "conf", "doc", "xls", "ppt",
+}
+
+if STORAGE_COMPRESSION and STORAGE_COMPRESSION not in ENCODINGS:
+    raise ValueError(f"Unknown STORAGE_COMPRESSION: {STORAGE_COMPRESSION}")
+
+
+def _zstd():
+    import zstandard
+    return zstandard
+
+
+if STORAGE_COMPRESSION:
+    _zstd()  # fail at startup rather than on the first upload
+
+
+def storage_encoding(content_type: Optional[str], name: Optional[str]) -> Optional[str]:
+    """Encoding to store new content of this type with, or None to store it as is."""
+    if not STORAGE_COMPRESSION:
+        return None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type.startswith(("image/", "video/", "audio/")) and content_type != "image/svg+xml":
+        return None
+    if (
+        content_type.startswith("text/")
+        or content_type in COMPRESSIBLE_TYPES
+        or content_type.endswith(COMPRESSIBLE_SUFFIXES)
+    ):
+        return STORAGE_COMPRESSION
+    extension = os.path.splitext(name or "")[1].lstrip(".").lower()
+    if content_type in ("", "application/octet-stream") and extension in COMPRESSIBLE_EXTENSIONS:
+        return STORAGE_COMPRESSION
+    return None
+
+
+def compressor(encoding: str):
+    """Streaming compressor: .compress(chunk) and a final .flush(), both returning bytes."""
+    if encoding != "zstd":
+        raise ValueError(f"Unknown content encoding: {encoding}")
+    return _zstd().ZstdCompressor(level=STORAGE_COMPRESSION_LEVEL).compressobj()
+
+
+def decompress(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    if encoding != "zstd":
+        raise ValueError(f"Unknown content encoding: {encoding}")
+    decoder = _zstd().ZstdDecompressor().decompressobj()
+    for chunk in chunks:
+        out = decoder.decompress(chunk)
+        if out:
+            yield out
+
+
+def _slice(chunks: Iterator[bytes], start: int, end: Optional[int]) -> Iterator[bytes]:
+    """Bytes start..end (inclusive) of a stream that can only be read from the top."""
+    position = 0
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            piece = chunk[max(start - position, 0):]
+            if end is not None and chunk_end > end + 1:
+                piece = piece[:len(piece) - (chunk_end - end - 1)]
+            if piece:
+                yield piece
+        position = chunk_end
+        if end is not None and position > end:
+            return
+
+
+def read_content(file_obj, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Original bytes start..end (inclusive) of a stored file, decompressing if needed."""
+    if not file_obj.contentEncoding:
+        return stream_file(file_obj, start, end)
+    chunks = decompress(stream_file(file_obj), file_obj.contentEncoding)
+    return _slice(chunks, start, end)
+
+
+def accepts_encoding(header: Optional[str], encoding: str) -> bool:
+    """Whether an Accept-Encoding header names `encoding` (q=0 refuses it)."""
+    for item in (header or "").split(","):
+        token, _, params = item.partition(";")
+        if token.strip().lower() != encoding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
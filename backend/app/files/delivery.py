@@ -0,0 +1,108 @@
+# app/files/delivery.py
+# How file bytes leave the server once access has been checked:
+#   direct      stream through the app (Range/ETag handled in ranges.py)
+#   x-accel     hand off to nginx via X-Accel-Redirect to an `internal` location
+#   x-sendfile  hand off to lighttpd/Apache via X-Sendfile with the absolute path
+# Files in a remote storage backend have no local path, and compressed files
+# (see compression.py) need decoding for most clients, so both are always
+# streamed through the app. Compressed bytes go out as they are, with
+# Content-Encoding, to clients that accept the encoding.
+#
+# X-Accel-Redirect paths are relative to X_ACCEL_ROOT (default uploads/), the
+# directory the nginx `internal` location aliases; with x-accel every local
+# storage directory (uploads/ and BLOB_DIR) must live under it, which is checked
+# at import along with the mode itself.
+import os
+from urllib.parse import quote
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import iterate_in_threadpool
+from .ranges import send_file, content_disposition, read_local_range
+from .storage import BLOB_DIR, UPLOAD_DIR, ObjectStat, file_path, locate, store_for
+from .compression import accepts_encoding, read_content
+
+DELIVERY_MODES = ("direct", "x-accel", "x-sendfile")
+DOWNLOAD_DELIVERY = os.getenv("DOWNLOAD_DELIVERY", "direct").lower()
+X_ACCEL_PREFIX = "/" + os.getenv("X_ACCEL_PREFIX", "/_protected/").strip("/") + "/"
+X_ACCEL_ROOT = os.getenv("X_ACCEL_ROOT", UPLOAD_DIR)
+
+
+def _accel_relative(path: str, root: str):
+    """`path` relative to `root`, or None when it is not inside it."""
+    relative = os.path.relpath(os.path.realpath(path), os.path.realpath(root))
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep) or os.path.isabs(relative):
+        return None
+    return relative.replace(os.sep, "/")
+
+
+def check_delivery_config(mode: str, accel_root: str):
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f"Unknown DOWNLOAD_DELIVERY mode: {mode} (expected one of {', '.join(DELIVERY_MODES)})")
+    if mode == "x-accel":
+        for directory in (UPLOAD_DIR, BLOB_DIR):
+            if _accel_relative(directory, accel_root) is None:
+                raise ValueError(f"DOWNLOAD_DELIVERY=x-accel needs {directory} inside X_ACCEL_ROOT ({accel_root})")
+
+
+check_delivery_config(DOWNLOAD_DELIVERY, X_ACCEL_ROOT)
+
+
+async def _no_bytes():
+    return
+    yield
+
+
+def _range_reader(file_obj):
+    locator = locate(file_obj)
+    store = store_for(locator)
+    path = store.local_path(locator[1])
+    if path:
+        return lambda start, end: read_local_range(path, start, end)
+
+    def read_remote(start: int, end: int):
+        if end < start:
+            return _no_bytes()
+        return iterate_in_threadpool(store.stream(locator[1], start, end))
+    return read_remote
+
+
+def _decoded_reader(file_obj):
+    def read_decoded(start: int, end: int):
+        if end < start:
+            return _no_bytes()
+        return iterate_in_threadpool(read_content(file_obj, start, end))
+    return read_decoded
+
+
+def _deliver_encoded(request: Request, file_obj, stat: ObjectStat, inline: bool, cache_control: str) -> Response:
+    encoding = file_obj.contentEncoding
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if accepts_encoding(request.headers.get("accept-encoding"), encoding):
+        return send_file(
+            request, file_obj, stat, _range_reader(file_obj), inline=inline,
+            extra_headers=headers, content_encoding=encoding,
+        )
+    # decompressed on the fly; a Range is served by decoding up to its end
+    decoded = ObjectStat(file_obj.size or 0, stat.mtime)
+    return send_file(request, file_obj, decoded, _decoded_reader(file_obj), inline=inline, extra_headers=headers)
+
+
+def deliver_file(request: Request, file_obj, stat: ObjectStat, inline: bool = False, cache_control: str = "private, no-cache") -> Response:
+    if file_obj.contentEncoding:
+        return _deliver_encoded(request, file_obj, stat, inline, cache_control)
+    path = file_path(file_obj)
+    relative = _accel_relative(path, X_ACCEL_ROOT) if path and DOWNLOAD_DELIVERY == "x-accel" else None
+    if DOWNLOAD_DELIVERY == "direct" or path is None or (DOWNLOAD_DELIVERY == "x-accel" and relative is None):
+        return send_file(request, file_obj, stat, _range_reader(file_obj), inline=inline, extra_headers={"Cache-Control": cache_control})
+
+    # the proxy serves the bytes itself, including Range, ETag and 304s
+    headers = {
+        "Content-Disposition": content_disposition(file_obj.name, inline),
+        "Cache-Control": cache_control,
+    }
+    if DOWNLOAD_DELIVERY == "x-accel":
+        headers["X-Accel-Redirect"] = X_ACCEL_PREFIX + quote(relative)
+    else:
+        headers["X-Sendfile"] = os.path.abspath(path)
+
+    return Response(status_code=200, media_type=file_obj.type or "application/octet-stream", headers=headers)
@@ -0,0 +1,106 @@
+# app/files/listing.py
+# Keyset pagination helpers for file listings. The cursor is an opaque
+# base64 token holding the sort value and id of the last row returned.
+# NULL sort values (only size can be NULL) go after every value ascending and
+# before them descending, spelled out so SQLite and Postgres agree.
+import base64, json, datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_, case, func
+from sqlmodel import select
+from ..models import File as FileModel
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+CATEGORIES = ("document", "image", "video", "audio")
+SORT_COLUMNS = {
+    "createdAt": FileModel.createdAt,
+    "name": FileModel.name,
+    "size": FileModel.size,
+}
+NULLABLE_SORTS = {"size"}
+PROJECTABLE_FIELDS = tuple(FileModel.model_fields.keys())
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def file_category(content_type: Optional[str]) -> str:
+    category = (content_type.split("/")[0] if content_type else "other").lower()
+    return category if category in CATEGORIES else "other"
+
+
+def category_expr():
+    """SQL twin of file_category: the category of FileModel.type, case-insensitive."""
+    lowered = func.lower(FileModel.type)
+    return case(
+        *[(lowered.like(f"{c}/%"), c) for c in CATEGORIES],
+        else_="other",
+    )
+
+
+def category_filter(category: str):
+    return category_expr() == (category if category in CATEGORIES else "other")
+
+
+def count_query(query):
+    """COUNT(*) of the rows `query` matches (filters only; ordering dropped)."""
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+
+def encode_cursor(sort: str, value: Any, row_id: str) -> str:
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(raw)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort:
+        raise InvalidCursor("Cursor belongs to a different sort order")
+    if sort == "createdAt" and value is not None:
+        value = datetime.datetime.fromisoformat(value)
+    return value, row_id
+
+
+def keyset_filter(sort: str, descending: bool, value: Any, row_id: str):
+    column = SORT_COLUMNS[sort]
+    if value is None:
+        # the last row had no value: only other NULLs (by id), then descending every value
+        if descending:
+            return or_(column.is_not(None), and_(column.is_(None), FileModel.id < row_id))
+        return and_(column.is_(None), FileModel.id > row_id)
+    if descending:
+        return or_(column < value, and_(column == value, FileModel.id < row_id))
+    after = or_(column > value, and_(column == value, FileModel.id > row_id))
+    if sort in NULLABLE_SORTS:
+        return or_(after, column.is_(None))
+    return after
+
+
+def keyset_order(sort: str, descending: bool) -> List:
+    column = SORT_COLUMNS[sort]
+    if sort not in NULLABLE_SORTS:
+        if descending:
+            return [column.desc(), FileModel.id.desc()]
+        return [column.asc(), FileModel.id.asc()]
+    if descending:
+        return [column.desc().nulls_first(), FileModel.id.desc()]
+    return [column.asc().nulls_last(), FileModel.id.asc()]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma separated `fields=` projection; `id` is always included."""
+    if not fields:
+        return None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(", ".join(unknown))
+    return ["id"] + [f for f in dict.fromkeys(wanted) if f != "id"]
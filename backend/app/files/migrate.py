@@ -0,0 +1,151 @@
+# app/files/migrate.py
+# Moves stored bytes into the current layout while the app keeps serving:
+#
+#   python -m app.files.migrate legacy [--batch N] [--dry-run]
+#       uploads/<accountId>/<bucketFileId> files -> content-addressed blobs in
+#       STORAGE_BACKEND. Each file is copied and hashed, then its File row is
+#       switched to the blob in one short transaction; the old file is removed
+#       only after that commit, so readers see either the old path or the blob.
+#       With STORAGE_COMPRESSION set, compressible types are compressed on the way.
+#
+#   python -m app.files.migrate blobs [--batch N] [--dry-run]
+#       copies the local blob tree into the S3 bucket from S3_* (run it while the
+#       app still uses STORAGE_BACKEND=local, then switch). Local blobs are kept.
+import os, sys, hashlib, argparse
+from typing import Dict
+from sqlmodel import Session, select
+from ..models import Blob, File as FileModel
+from .blobs import store_blob
+from .storage import (
+    BLOB_DIR, S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION,
+    LocalStorage, S3Storage, legacy_storage, locate, new_staging_path, remove_quietly,
+)
+from .streaming import copy_to_path
+from .compression import decompress, storage_encoding
+from .thumbnails import derivative_key, purge_derivatives
+
+DEFAULT_BATCH = 200
+
+
+def _migrate_file(session: Session, file_id: str, dry_run: bool) -> str:
+    file_obj = session.get(FileModel, file_id)
+    if not file_obj or file_obj.blobHash:
+        return "skipped"
+    key = locate(file_obj)[1]
+    src = legacy_storage.local_path(key)
+    if not os.path.exists(src):
+        return "missing"
+    if dry_run:
+        return "migrated"
+
+    encoding = storage_encoding(file_obj.type, file_obj.name)
+    temp = new_staging_path()
+    try:
+        with open(src, "rb") as f:
+            size, digest = copy_to_path(f, temp, sys.maxsize, encoding)
+        # re-read under lock: the row may have been deleted or migrated meanwhile
+        session.expire(file_obj)
+        file_obj = session.exec(select(FileModel).where(FileModel.id == file_id).with_for_update()).first()
+        if not file_obj or file_obj.blobHash:
+            session.rollback()
+            return "skipped"
+        old_key = derivative_key(file_obj)
+        blob = store_blob(session, temp, digest, size, encoding)
+        file_obj.blobHash = digest
+        file_obj.storedSize = blob.storedSize
+        file_obj.contentEncoding = blob.contentEncoding
+        file_obj.checksum = file_obj.checksum or digest
+        session.add(file_obj)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        remove_quietly(temp)
+
+    legacy_storage.delete(key)
+    if old_key != digest:
+        purge_derivatives(old_key)
+    return "migrated"
+
+
+def migrate_legacy(session: Session, batch_size: int = DEFAULT_BATCH, dry_run: bool = False) -> Dict[str, int]:
+    counts = {"migrated": 0, "missing": 0, "skipped": 0}
+    last_id = ""
+    while True:
+        ids = session.exec(
+            select(FileModel.id)
+            .where(FileModel.blobHash.is_(None), FileModel.id > last_id)
+            .order_by(FileModel.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return counts
+        last_id = ids[-1]
+        for file_id in ids:
+            try:
+                counts[_migrate_file(session, file_id, dry_run)] += 1
+            except Exception as e:
+                print(f"[MIGRATE] {file_id}: {e}")
+                counts["skipped"] += 1
+
+
+def copy_blobs(session: Session, source, target, batch_size: int = DEFAULT_BATCH, dry_run: bool = False) -> Dict[str, int]:
+    counts = {"copied": 0, "present": 0, "missing": 0, "corrupt": 0}
+    last_hash = ""
+    while True:
+        rows = session.exec(
+            select(Blob.hash, Blob.contentEncoding).where(Blob.hash > last_hash).order_by(Blob.hash).limit(batch_size)
+        ).all()
+        if not rows:
+            return counts
+        last_hash = rows[-1][0]
+        for blob_hash, encoding in rows:
+            if target.stat(blob_hash) is not None:
+                counts["present"] += 1
+                continue
+            src = source.local_path(blob_hash)
+            if not os.path.exists(src):
+                counts["missing"] += 1
+                continue
+            if dry_run:
+                counts["copied"] += 1
+                continue
+            temp = new_staging_path()
+            try:
+                with open(src, "rb") as f:
+                    _, digest = copy_to_path(f, temp, sys.maxsize)
+                if encoding:
+                    # the hash is of the original content
+                    digest = hashlib.sha256()
+                    for chunk in decompress(source.stream(blob_hash), encoding):
+                        digest.update(chunk)
+                    digest = digest.hexdigest()
+                if digest != blob_hash:
+                    print(f"[MIGRATE] blob {blob_hash} does not match its content, not copied")
+                    counts["corrupt"] += 1
+                    continue
+                target.put(blob_hash, temp)
+                counts["copied"] += 1
+            finally:
+                remove_quietly(temp)
+
+
+if __name__ == "__main__":
+    from ..db import engine
+
+    parser = argparse.ArgumentParser(prog="python -m app.files.migrate")
+    parser.add_argument("what", choices=("legacy", "blobs"))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        if args.what == "legacy":
+            counts = migrate_legacy(session, args.batch, args.dry_run)
+        else:
+            if not S3_BUCKET:
+                parser.error("set S3_BUCKET (and S3_ENDPOINT_URL / credentials) for the target bucket")
+            target = S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+            counts = copy_blobs(session, LocalStorage(BLOB_DIR), target, args.batch, args.dry_run)
+    print(" ".join(f"{k}={v}" for k, v in counts.items()))
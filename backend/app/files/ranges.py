@@ -0,0 +1,232 @@
+# app/files/ranges.py
+# Conditional and partial GET for stored files (RFC 9110/9111):
+# strong ETag + Last-Modified validators, If-None-Match / If-Modified-Since -> 304,
+# Range (single and multiple) with If-Range -> 206 / 416.
+# The bytes come from a `read_range(start, end)` callable returning an async
+# iterator, so the same logic serves local files and remote storage.
+import uuid, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from urllib.parse import quote
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 20  # more than this (after merging) is served as a plain 200
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `bytes=` Range header into sorted, merged (start, end) pairs, end inclusive.
+
+    Returns None when the header should be ignored (malformed, other unit, too many
+    ranges). Raises RangeNotSatisfiable when no range overlaps the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # suffix range: last N bytes
+            if not last:
+                return None
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = int(last) if last else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+RangeReader = Callable[[int, int], AsyncIterator[bytes]]
+
+
+def file_etag(file_obj, stat) -> str:
+    # content never changes for a given File row, so the sha256 is a strong validator;
+    # rows without one fall back to size + mtime of the stored bytes
+    if file_obj.checksum:
+        return f'"{file_obj.checksum}"'
+    return f'"{stat.size:x}-{int(stat.mtime * 1e6):x}"'
+
+
+def last_modified(file_obj, stat) -> datetime.datetime:
+    created = file_obj.createdAt
+    if not created:
+        return datetime.datetime.fromtimestamp(stat.mtime, datetime.timezone.utc).replace(microsecond=0)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=datetime.timezone.utc)
+    return created.replace(microsecond=0)
+
+
+def content_disposition(name: str, inline: bool = False) -> str:
+    kind = "inline" if inline else "attachment"
+    fallback = name.encode("ascii", "replace").decode().replace('"', "'").replace("\\", "_")
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(name)}"
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _parse_http_date(value: str) -> Optional[datetime.datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def is_not_modified(request: Request, etag: str, modified: datetime.datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag, weak=True)
+    since = request.headers.get("if-modified-since")
+    if since:
+        since_dt = _parse_http_date(since)
+        return since_dt is not None and modified <= since_dt
+    return False
+
+
+def _if_range_ok(request: Request, etag: str, modified: datetime.datetime) -> bool:
+    value = request.headers.get("if-range")
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag  # strong comparison only
+    since_dt = _parse_http_date(value)
+    return since_dt is not None and since_dt == modified
+
+
+async def read_local_range(path: str, start: int, end: int):
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _read_multipart(read_range: RangeReader, parts: List[Tuple[bytes, int, int]], closing: bytes):
+    for head, start, end in parts:
+        yield head
+        async for chunk in read_range(start, end):
+            yield chunk
+    yield closing
+
+
+def send_file(
+    request: Request, file_obj, stat, read_range: RangeReader, inline: bool = False,
+    extra_headers: Optional[dict] = None, content_encoding: Optional[str] = None,
+) -> Response:
+    """`stat` describes the bytes `read_range` returns (size, mtime). With
+    `content_encoding` they are the encoded representation (Content-Encoding),
+    which gets its own ETag; ranges then apply to the encoded bytes."""
+    size = stat.size
+    etag = file_etag(file_obj, stat)
+    if content_encoding:
+        etag = f'{etag[:-1]}-{content_encoding}"'
+    modified = last_modified(file_obj, stat)
+    media_type = file_obj.type or "application/octet-stream"
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if is_not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition(file_obj.name, inline)
+
+    range_header = request.headers.get("range")
+    ranges = None
+    if range_header and size > 0 and _if_range_ok(request, etag, modified):
+        try:
+            ranges = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read_range(0, size - 1), media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(read_range(start, end), status_code=206, media_type=media_type, headers=headers)
+
+    boundary = uuid.uuid4().hex
+    parts = []
+    length = 0
+    for start, end in ranges:
+        head = (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        parts.append((head, start, end))
+        length += len(head) + end - start + 1
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(length + len(closing))
+    return StreamingResponse(
+        _read_multipart(read_range, parts, closing),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
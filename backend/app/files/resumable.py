@@ -0,0 +1,280 @@
+# app/files/resumable.py
+# Resumable (tus-style) uploads:
+#   POST   /files/uploads                 -> create an upload session
+#   HEAD   /files/uploads/{upload_id}     -> current Upload-Offset
+#   PATCH  /files/uploads/{upload_id}     -> append bytes at Upload-Offset
+#   DELETE /files/uploads/{upload_id}     -> abort
+# When the last byte arrives the staged file goes into the blob store and a File row is created.
+# One PATCH per upload at a time: a second one in the same process gets 409 right
+# away. The body is written with no transaction open; the new offset is then
+# claimed with a conditional UPDATE (offset still what the request started from),
+# so a concurrent PATCH from another process gets 409 instead of a double append.
+import os, uuid, hashlib, datetime
+import aiofiles
+from fastapi import APIRouter, Depends, Request, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from sqlmodel import Session, select
+from sqlalchemy import delete, update
+from pydantic import BaseModel
+from typing import Optional
+from ..db import get_session
+from ..models import UploadSession
+from ..utils.response import success, error, FastJSONResponse
+from ..schemas import Envelope, FileOut
+from ..utils.auth_utils import require_auth
+from .streaming import MAX_UPLOAD_SIZE, CHUNK_SIZE, copy_to_path
+from .service import create_file_record
+from .usage import remaining_quota
+from .thumbnails import schedule_thumbnails
+from .storage import STAGING_DIR, new_staging_path, remove_quietly
+from .compression import storage_encoding
+
+router = APIRouter()
+
+UPLOAD_SESSION_TTL = datetime.timedelta(hours=int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+
+_appending = set()  # upload ids with a PATCH in progress in this process
+
+class CreateUploadPayload(BaseModel):
+    name: str
+    size: int
+    type: Optional[str] = None
+
+
+def staging_path(upload_id: str) -> str:
+    return os.path.join(STAGING_DIR, upload_id)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _offset_headers(upload: UploadSession) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Upload-Expires": upload.expires_at.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Cache-Control": "no-store",
+    }
+
+
+def purge_expired_uploads(session: Session, limit: int = 500) -> int:
+    """Drop expired upload sessions and their staged bytes. Returns rows removed."""
+    expired = session.exec(
+        select(UploadSession).where(UploadSession.expires_at < _now()).limit(limit)
+    ).all()
+    for upload in expired:
+        remove_quietly(staging_path(upload.id))
+        session.delete(upload)
+    if expired:
+        session.commit()
+    return len(expired)
+
+
+def _get_owned(session: Session, upload_id: str, user) -> Optional[UploadSession]:
+    upload = session.get(UploadSession, upload_id)
+    if not upload or upload.user_id != user.id:
+        return None
+    expires_at = upload.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+    if expires_at < _now():
+        return None
+    return upload
+
+
+def _stage_for_store(upload: UploadSession):
+    """Checksum (and, for compressible types, compress) the finished staging file.
+    Returns (path to store, checksum, encoding). Runs without a transaction open."""
+    src = staging_path(upload.id)
+    encoding = storage_encoding(upload.type, upload.name)
+    if encoding:
+        # chunks arrive at arbitrary offsets, so compression happens once, here
+        stored = new_staging_path()
+        with open(src, "rb") as f:
+            _, checksum = copy_to_path(f, stored, upload.length, encoding)
+        return stored, checksum, encoding
+
+    digest = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return src, digest.hexdigest(), None
+
+
+def _finalize(session: Session, upload: UploadSession, user):
+    try:
+        path, checksum, encoding = _stage_for_store(upload)
+    except FileNotFoundError:
+        # another request finished this upload first
+        return None, _status_error("Upload not found", 404, {"code": "UPLOAD_NOT_FOUND"})
+
+    # other uploads may have used up the quota since this one was created
+    quota = remaining_quota(session, user.accountId)
+    if quota is not None and upload.length > quota:
+        # keep the staged bytes: once space is freed, an empty PATCH at the end offset finishes it
+        session.rollback()
+        if path != staging_path(upload.id):
+            remove_quietly(path)
+        return None, _status_error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": quota}, upload)
+
+    if not session.exec(delete(UploadSession).where(UploadSession.id == upload.id)).rowcount:
+        session.rollback()
+        if path != staging_path(upload.id):
+            remove_quietly(path)
+        return None, _status_error("Upload not found", 404, {"code": "UPLOAD_NOT_FOUND"})
+    try:
+        new_file = create_file_record(session, user, upload.name, upload.type, path, upload.length, checksum, encoding)
+    except Exception:
+        session.rollback()
+        if path != staging_path(upload.id):
+            remove_quietly(path)
+        raise
+    remove_quietly(staging_path(upload.id))
+    return new_file, None
+
+
+def _status_error(message: str, status: int, details: dict, upload: Optional[UploadSession] = None) -> Response:
+    # resumable clients act on the status line, so these are real HTTP statuses
+    headers = _offset_headers(upload) if upload else {"Cache-Control": "no-store"}
+    return FastJSONResponse(error(message, status, details), status_code=status, headers=headers)
+
+
+def _claim_offset(session: Session, upload_id: str, claimed: int, offset: int, expires_at) -> bool:
+    """Record the new offset if nobody moved it since `claimed`."""
+    result = session.exec(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.offset == claimed)
+        .values(offset=offset, expires_at=expires_at)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _load_for_append(session: Session, upload_id: str, user) -> Optional[UploadSession]:
+    upload = _get_owned(session, upload_id, user)
+    # release the connection: the body may take minutes to arrive
+    session.close()
+    return upload
+
+
+async def _append(upload_id: str, request: Request, response: Response, user, session: Session):
+    upload = await run_in_threadpool(_load_for_append, session, upload_id, user)
+    if not upload:
+        return error("Upload not found", 404, {"code": "UPLOAD_NOT_FOUND"})
+
+    claimed = request.headers.get("upload-offset", "")
+    if not claimed.isdigit():
+        return error("Upload-Offset header required", 400, {"code": "MISSING_OFFSET"})
+    if int(claimed) != upload.offset:
+        return Response(status_code=409, headers=_offset_headers(upload))
+
+    # bytes past the recorded offset come from an interrupted request; drop them
+    offset = upload.offset
+    disconnected = False
+    async with aiofiles.open(staging_path(upload.id), "r+b") as out:
+        await out.truncate(offset)
+        await out.seek(offset)
+        try:
+            async for chunk in request.stream():
+                if offset + len(chunk) > upload.length:
+                    await out.truncate(upload.offset)
+                    return _status_error("Chunk exceeds declared length", 413, {"code": "LENGTH_EXCEEDED"}, upload)
+                await out.write(chunk)
+                offset += len(chunk)
+        except ClientDisconnect:
+            disconnected = True
+        await out.flush()
+
+    # keep what was received even if the client went away, so it can resume from here
+    expires_at = _now() + UPLOAD_SESSION_TTL
+    if not await run_in_threadpool(_claim_offset, session, upload.id, upload.offset, offset, expires_at):
+        # another request moved the offset while this body was streaming
+        current = await run_in_threadpool(_get_owned, session, upload_id, user)
+        if not current:
+            return error("Upload not found", 404, {"code": "UPLOAD_NOT_FOUND"})
+        return Response(status_code=409, headers=_offset_headers(current))
+    upload.offset = offset
+    upload.expires_at = expires_at
+
+    if offset < upload.length or disconnected:
+        return Response(status_code=204, headers=_offset_headers(upload))
+
+    response.headers.update(_offset_headers(upload))
+    new_file, err = await run_in_threadpool(_finalize, session, upload, user)
+    if err:
+        return err
+    schedule_thumbnails(new_file)
+    return success(data=new_file, message="File uploaded", code=201)
+
+
+# CREATE
+@router.post("")
+def create_upload(payload: CreateUploadPayload, response: Response, user = Depends(require_auth), session: Session = Depends(get_session)):
+    name = os.path.basename(payload.name.strip())
+    if not name:
+        return error("File name required", 400, {"code": "MISSING_NAME"})
+    if payload.size < 0 or payload.size > MAX_UPLOAD_SIZE:
+        return error("File too large", 413, {"code": "FILE_TOO_LARGE", "maxSize": MAX_UPLOAD_SIZE})
+
+    quota = remaining_quota(session, user.accountId)
+    if quota is not None and payload.size > quota:
+        return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": quota})
+
+    purge_expired_uploads(session)
+
+    now = _now()
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        accountId=user.accountId,
+        name=name,
+        type=payload.type or "application/octet-stream",
+        length=payload.size,
+        offset=0,
+        created_at=now,
+        expires_at=now + UPLOAD_SESSION_TTL,
+    )
+    open(staging_path(upload.id), "wb").close()
+    session.add(upload)
+    session.commit()
+    session.refresh(upload)
+
+    response.headers.update(_offset_headers(upload))
+    response.headers["Location"] = f"/files/uploads/{upload.id}"
+    return success(
+        data={"uploadId": upload.id, "offset": upload.offset, "length": upload.length, "expiresAt": upload.expires_at.isoformat()},
+        message="Upload created",
+        code=201
+    )
+
+# OFFSET
+@router.head("/{upload_id}")
+def upload_offset(upload_id: str, user = Depends(require_auth), session: Session = Depends(get_session)):
+    upload = _get_owned(session, upload_id, user)
+    if not upload:
+        return Response(status_code=404, headers={"Cache-Control": "no-store"})
+    return Response(status_code=200, headers=_offset_headers(upload))
+
+# APPEND
+@router.patch("/{upload_id}", response_model=Envelope[FileOut], response_model_exclude_unset=True)
+async def upload_chunk(upload_id: str, request: Request, response: Response, user = Depends(require_auth), session: Session = Depends(get_session)):
+    if upload_id in _appending:
+        return Response(status_code=409, headers={"Cache-Control": "no-store"})
+    _appending.add(upload_id)
+    try:
+        return await _append(upload_id, request, response, user, session)
+    finally:
+        _appending.discard(upload_id)
+
+# ABORT
+@router.delete("/{upload_id}")
+def abort_upload(upload_id: str, user = Depends(require_auth), session: Session = Depends(get_session)):
+    upload = _get_owned(session, upload_id, user)
+    if not upload:
+        return error("Upload not found", 404, {"code": "UPLOAD_NOT_FOUND"})
+    remove_quietly(staging_path(upload.id))
+    session.delete(upload)
+    session.commit()
+    return success(message="Upload aborted", code=200)
@@ -1,73 +1,353 @@
-import os, uuid, shutil, datetime
-from fastapi import APIRouter, UploadFile, File as FastAPIFile, Depends, HTTPException
-from fastapi.responses import FileResponse
+import os, uuid, datetime
+from functools import partial
+from urllib.parse import unquote
+from fastapi import APIRouter, UploadFile, File as FastAPIFile, Depends, HTTPException, Request, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
+from sqlalchemy import and_
 from pydantic import BaseModel, EmailStr
-from ..db import get_session
+from typing import List, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session
 from ..auth.jwt_handler import require_auth as old_require_auth  # if you still use old one elsewhere
-from ..models import File as FileModel
-from ..utils.response import success, error
-from ..utils.auth_utils import require_auth
+from ..models import File as FileModel, FileShare
+from ..utils.response import success, error, FastJSONResponse
+from ..schemas import Envelope, FileOut, FilePage, RenamedFile, SearchFileOut, SharedFileOut
+from ..utils.auth_utils import require_auth, require_auth_async
+from .streaming import stream_to_path, copy_to_path, UploadTooLarge, MAX_UPLOAD_SIZE
+from .service import create_file_record, create_file_from_blob, delete_file_record, discard_stored
+from .thumbnails import THUMBNAIL_SIZES, ThumbnailUnsupported, schedule_thumbnails, ensure_thumbnail, derivative_key
+from .blobs import acquire_blob
+from .access import access_role, readable_ids, share_with, unshare_with, SHARE_ROLES
+from .archive import iter_zip, unique_names, MAX_ZIP_FILES
+from .usage import usage_summary, remaining_quota
+from .listing import (
+    DEFAULT_LIMIT, MAX_LIMIT, SORT_COLUMNS, InvalidCursor,
+    category_filter, count_query, decode_cursor, encode_cursor, keyset_filter, keyset_order, parse_fields,
+)
+from .delivery import deliver_file
+from .ranges import content_disposition
+from .storage import new_staging_path, remove_quietly, stat_file
+from .compression import read_content, storage_encoding
+from .search import apply_name_match, visible_to
+from .signing import InvalidSignature, SigningDisabled, cdn_cache_control, linked_file, sign_url, verify_signature
 
 router = APIRouter()
-
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+uploads_router = APIRouter()
 
 class ShareUserPayload(BaseModel):
     email: EmailStr
     mode: str  # "share" or "unshare"
+    role: str = "viewer"
 
 class RenamePayload(BaseModel):
     name: str
 
+class ZipDownloadPayload(BaseModel):
+    ids: List[str]
+    name: str = "files.zip"
+
+class SignedLinkPayload(BaseModel):
+    expiresIn: Optional[int] = None  # seconds, capped at SIGNED_URL_MAX_TTL
+    inline: bool = False
+
+class HashUploadPayload(BaseModel):
+    name: str
+    sha256: str
+    size: int
+    type: Optional[str] = None
+
+# "account": upload-by-hash only matches content this account already stores.
+# "global": any stored content matches; only enable if knowing a hash may grant its content.
+DEDUP_HASH_SCOPE = os.getenv("DEDUP_HASH_SCOPE", "account")
+
 # UPLOAD
-@router.post("/upload")
+@router.post("/upload", response_model=Envelope[FileOut], response_model_exclude_unset=True)
 def upload_file(
     upload: UploadFile = FastAPIFile(...),
     user = Depends(require_auth),
     session: Session = Depends(get_session)
 ):
-    user_dir = os.path.join(UPLOAD_DIR, user.accountId)
-    os.makedirs(user_dir, exist_ok=True)
-
-    unique_name = f"{uuid.uuid4()}-{upload.filename}"
-    path = os.path.join(user_dir, unique_name)
-
-    with open(path, "wb") as f:
-        shutil.copyfileobj(upload.file, f)
-
-    url = f"/uploads/{user.accountId}/{unique_name}"
-    now = datetime.datetime.now(datetime.timezone.utc)
-    ext = os.path.splitext(upload.filename)[1].lstrip(".")
-    size = os.path.getsize(path)
-
-    new_file = FileModel(
-        id=str(uuid.uuid4()),
-        name=upload.filename,
-        url=url,
-        type=upload.content_type or "application/octet-stream",
-        bucketFileId=unique_name,
-        accountId=user.accountId,
-        extension=ext,
-        size=size,
-        createdAt=now,
-        updatedAt=now,
-        owner_id=user.id,
-        users=[] if getattr(FileModel, "users", None) is None else getattr(FileModel, "users", [])
-    )
+    max_size = MAX_UPLOAD_SIZE
+    quota = remaining_quota(session, user.accountId)
+    if quota is not None:
+        if upload.size is not None and upload.size > quota:
+            return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": quota})
+        max_size = min(max_size, quota)
+
+    encoding = storage_encoding(upload.content_type, upload.filename)
+    path = new_staging_path()
+    try:
+        size, checksum = copy_to_path(upload.file, path, max_size, encoding)
+    except UploadTooLarge as e:
+        if e.limit < MAX_UPLOAD_SIZE:
+            return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": e.limit})
+        return error("File too large", 413, {"code": "FILE_TOO_LARGE", "maxSize": e.limit})
+
+    try:
+        new_file = create_file_record(session, user, upload.filename, upload.content_type, path, size, checksum, encoding)
+    except Exception:
+        remove_quietly(path)
+        raise
+    schedule_thumbnails(new_file)
 
-    session.add(new_file)
-    session.commit()
-    session.refresh(new_file)
+    return success(data=new_file, message="File uploaded", code=201)
+
+# UPLOAD (streaming)
+# Raw request body is the file content; name comes from ?name= (or X-File-Name),
+# type from Content-Type. Bytes are written to their final place as they arrive.
+@router.post("/upload/stream", response_model=Envelope[FileOut], response_model_exclude_unset=True)
+async def upload_file_stream(
+    request: Request,
+    name: str = Query(None),
+    user = Depends(require_auth),
+    session: Session = Depends(get_session)
+):
+    filename = (name or unquote(request.headers.get("x-file-name", ""))).strip()
+    filename = os.path.basename(filename)
+    if not filename:
+        return error("File name required", 400, {"code": "MISSING_NAME"})
+
+    declared = request.headers.get("content-length")
+    declared = int(declared) if declared and declared.isdigit() else None
+    if declared is not None and declared > MAX_UPLOAD_SIZE:
+        return error("File too large", 413, {"code": "FILE_TOO_LARGE", "maxSize": MAX_UPLOAD_SIZE})
+
+    max_size = MAX_UPLOAD_SIZE
+    quota = await run_in_threadpool(remaining_quota, session, user.accountId)
+    if quota is not None:
+        if declared is not None and declared > quota:
+            return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": quota})
+        max_size = min(max_size, quota)
+
+    # staged on the same filesystem, then renamed into the blob store (no second copy);
+    # compressible types are compressed on the way in
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    encoding = storage_encoding(content_type, filename)
+    path = new_staging_path()
+    try:
+        size, checksum = await stream_to_path(request.stream(), path, max_size, encoding)
+    except UploadTooLarge as e:
+        if e.limit < MAX_UPLOAD_SIZE:
+            return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": e.limit})
+        return error("File too large", 413, {"code": "FILE_TOO_LARGE", "maxSize": e.limit})
+
+    try:
+        new_file = await run_in_threadpool(create_file_record, session, user, filename, content_type, path, size, checksum, encoding)
+    except Exception:
+        remove_quietly(path)
+        raise
+    schedule_thumbnails(new_file)
+
+    return success(data=new_file, message="File uploaded", code=201)
 
+# UPLOAD BY HASH
+# Client sends the sha256 first; if the content is already stored the File row
+# is created right away, otherwise it gets BLOB_UNKNOWN and uploads normally.
+@router.post("/upload/hash", response_model=Envelope[FileOut], response_model_exclude_unset=True)
+def upload_by_hash(payload: HashUploadPayload, user = Depends(require_auth), session: Session = Depends(get_session)):
+    name = os.path.basename(payload.name.strip())
+    if not name:
+        return error("File name required", 400, {"code": "MISSING_NAME"})
+    blob_hash = payload.sha256.strip().lower()
+
+    if DEDUP_HASH_SCOPE != "global":
+        owned = session.exec(select(FileModel.id).where(
+            FileModel.accountId == user.accountId,
+            FileModel.blobHash == blob_hash
+        )).first()
+        if not owned:
+            return error("Content not stored yet", 404, {"code": "BLOB_UNKNOWN"})
+
+    quota = remaining_quota(session, user.accountId)
+    if quota is not None and payload.size > quota:
+        return error("Storage quota exceeded", 413, {"code": "QUOTA_EXCEEDED", "remaining": quota})
+
+    blob = acquire_blob(session, blob_hash)
+    if not blob or blob.size != payload.size:
+        session.rollback()
+        return error("Content not stored yet", 404, {"code": "BLOB_UNKNOWN"})
+
+    new_file = create_file_from_blob(session, user, name, payload.type, blob)
     return success(data=new_file, message="File uploaded", code=201)
 
 # LIST
-@router.get("/")
-def list_files(session: Session = Depends(get_session), user = Depends(require_auth)):
-    files = session.exec(select(FileModel).where(FileModel.accountId == user.accountId)).all()
-    return success(data={"documents": files, "total": len(files)}, message="OK", code=200)
+# Keyset-paginated: pass back `nextCursor` as ?cursor= for the next page.
+# Filters: type (document|image|video|audio|other), extension, createdAfter/createdBefore.
+# sort=createdAt|name|size, order=asc|desc, fields=id,name,... to project columns.
+@router.get("/", response_model=Envelope[FilePage[FileOut]], response_model_exclude_unset=True)
+async def list_files(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    extension: Optional[str] = None,
+    createdAfter: Optional[datetime.datetime] = None,
+    createdBefore: Optional[datetime.datetime] = None,
+    sort: str = "createdAt",
+    order: str = "desc",
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    user = Depends(require_auth_async)
+):
+    if sort not in SORT_COLUMNS:
+        return error("Invalid sort", 400, {"code": "INVALID_SORT", "allowed": list(SORT_COLUMNS)})
+    if order not in ("asc", "desc"):
+        return error("Invalid order", 400, {"code": "INVALID_ORDER"})
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        return error("Invalid fields", 400, {"code": "INVALID_FIELDS", "fields": str(e)})
+    descending = order == "desc"
+
+    if projection:
+        columns = [getattr(FileModel, f) for f in projection]
+        if sort not in projection:
+            columns.append(SORT_COLUMNS[sort])
+        query = select(*columns)
+    else:
+        query = select(FileModel)
+
+    query = query.where(FileModel.accountId == user.accountId)
+    if type:
+        query = query.where(category_filter(type.lower()))
+    if extension:
+        query = query.where(FileModel.extension == extension.lower().lstrip("."))
+    if createdAfter:
+        query = query.where(FileModel.createdAt >= createdAfter)
+    if createdBefore:
+        query = query.where(FileModel.createdAt < createdBefore)
+    total = (await session.exec(count_query(query))).one()
+    if cursor:
+        try:
+            value, last_id = decode_cursor(cursor, sort)
+        except InvalidCursor as e:
+            return error(str(e), 400, {"code": "INVALID_CURSOR"})
+        query = query.where(keyset_filter(sort, descending, value, last_id))
+
+    rows = (await session.exec(query.order_by(*keyset_order(sort, descending)).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        if projection:
+            last = last._mapping
+            next_cursor = encode_cursor(sort, last[SORT_COLUMNS[sort].key], last["id"])
+        else:
+            next_cursor = encode_cursor(sort, getattr(last, sort), last.id)
+
+    documents = [{f: row._mapping[f] for f in projection} for row in rows] if projection else rows
+    return success(
+        data={"documents": documents, "total": total, "nextCursor": next_cursor, "hasMore": has_more},
+        message="OK",
+        code=200
+    )
+
+# SHARED WITH ME
+# Files other users shared with the caller's email, newest share first.
+@router.get("/shared", response_model=Envelope[FilePage[SharedFileOut]], response_model_exclude_unset=True)
+async def shared_with_me(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    user = Depends(require_auth_async)
+):
+    if not user.email:
+        return success(data={"documents": [], "total": 0, "nextCursor": None, "hasMore": False}, message="OK", code=200)
+
+    query = (
+        select(FileModel, FileShare.id, FileShare.role)
+        .join(FileShare, FileShare.file_id == FileModel.id)
+        .where(FileShare.grantee_email == user.email.lower())
+    )
+    total = (await session.exec(count_query(query))).one()
+    if cursor:
+        try:
+            last_share_id, _ = decode_cursor(cursor, "shared")
+        except InvalidCursor as e:
+            return error(str(e), 400, {"code": "INVALID_CURSOR"})
+        query = query.where(FileShare.id < last_share_id)
+
+    rows = (await session.exec(query.order_by(FileShare.id.desc()).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    documents = [{**file_obj.model_dump(), "role": role} for file_obj, _, role in rows]
+    next_cursor = encode_cursor("shared", rows[-1][1], rows[-1][0].id) if has_more else None
+    return success(
+        data={"documents": documents, "total": total, "nextCursor": next_cursor, "hasMore": has_more},
+        message="OK",
+        code=200
+    )
+
+# SEARCH
+# Name search over owned and shared files through the text index (see search.py).
+# q of 3+ characters matches anywhere in the name, shorter q is a prefix;
+# fuzzy=true tolerates typos and orders by relevance. scope=all|owned|shared,
+# type filters as in LIST. Paginate with nextCursor.
+@router.get("/search", response_model=Envelope[FilePage[SearchFileOut]], response_model_exclude_unset=True)
+async def search_files(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = None,
+    scope: str = "all",
+    fuzzy: bool = False,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    user = Depends(require_auth_async)
+):
+    if scope not in ("all", "owned", "shared"):
+        return error("Invalid scope", 400, {"code": "INVALID_SCOPE"})
+    q = q.strip()
+    if not q:
+        return error("Empty query", 400, {"code": "EMPTY_QUERY"})
+
+    within = visible_to(user, scope)
+    if type:
+        within = and_(within, category_filter(type.lower()))
+    query, rank = apply_name_match(select(FileModel).where(within), session.bind.dialect.name, q, fuzzy, within)
+    total = (await session.exec(count_query(query))).one()
+
+    if rank is not None:
+        # relevance order: the cursor carries an offset
+        offset = 0
+        if cursor:
+            try:
+                offset, _ = decode_cursor(cursor, "rank")
+            except InvalidCursor as e:
+                return error(str(e), 400, {"code": "INVALID_CURSOR"})
+        query = query.order_by(rank, FileModel.id).offset(offset)
+    else:
+        if cursor:
+            try:
+                value, last_id = decode_cursor(cursor, "name")
+            except InvalidCursor as e:
+                return error(str(e), 400, {"code": "INVALID_CURSOR"})
+            query = query.where(keyset_filter("name", False, value, last_id))
+        query = query.order_by(*keyset_order("name", False))
+
+    rows = (await session.exec(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        if rank is not None:
+            next_cursor = encode_cursor("rank", offset + limit, rows[-1].id)
+        else:
+            next_cursor = encode_cursor("name", rows[-1].name, rows[-1].id)
+
+    documents = [
+        {**f.model_dump(), "access": "owner" if f.accountId == user.accountId else "shared-user"}
+        for f in rows
+    ]
+    return success(
+        data={"documents": documents, "total": total, "nextCursor": next_cursor, "hasMore": has_more},
+        message="OK",
+        code=200
+    )
 
 # DELETE
 @router.delete("/{file_id}")
@@ -79,16 +359,13 @@ def delete_file(file_id: str, user = Depends(require_auth), session: Session = D
     if file_obj.owner_id != user.id:
         return error("Not authorized", 403, {"code": "NOT_AUTHORIZED"})
 
-    file_path = os.path.join("uploads", file_obj.accountId, file_obj.bucketFileId)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-    session.delete(file_obj)
+    released = delete_file_record(session, file_obj)
     session.commit()
+    discard_stored(file_obj, released)
     return success(message="File deleted successfully", code=200)
 
 # RENAME
-@router.put("/rename/{file_id}")
+@router.put("/rename/{file_id}", response_model=Envelope[RenamedFile], response_model_exclude_unset=True)
 def rename_file(file_id: str, payload: RenamePayload, user = Depends(require_auth), session: Session = Depends(get_session)):
     file_obj = session.get(FileModel, file_id)
     if not file_obj:
@@ -138,6 +415,8 @@ def disable_public_link(file_id: str, user = Depends(require_auth), session: Ses
         return error("Not allowed", 403, {"code": "NOT_AUTHORIZED"})
 
     file.shareToken = None
+    # download links handed out through the public page stop working too
+    file.linkGeneration = (file.linkGeneration or 0) + 1
     file.updatedAt = datetime.datetime.now(datetime.timezone.utc)
     session.add(file)
     session.commit()
@@ -145,13 +424,86 @@ def disable_public_link(file_id: str, user = Depends(require_auth), session: Ses
     return success(message="Public link disabled", code=200)
 
 # PUBLIC ACCESS
+# Metadata for the public page plus a signed downloadUrl, so the bytes are served
+# (and cached by a CDN) without a shareToken lookup per download.
 @router.get("/public/{token}")
 def public_access(token: str, session: Session = Depends(get_session)):
     file = session.exec(select(FileModel).where(FileModel.shareToken == token)).first()
     if not file:
         return error("Invalid or expired link", 404, {"code": "INVALID_TOKEN"})
 
-    return success(data={"name": file.name, "url": file.url, "type": file.type, "size": file.size}, message="OK", code=200)
+    # stable: repeated views share one URL, so the CDN caching of signed_download applies
+    try:
+        download_url, expires = sign_url(file, stable=True)
+    except SigningDisabled as e:
+        return error(str(e), 503, {"code": "SIGNED_LINKS_DISABLED"})
+    return success(
+        data={"name": file.name, "type": file.type, "size": file.size, "downloadUrl": download_url, "expiresAt": expires},
+        message="OK",
+        code=200
+    )
+
+# SIGNED LINK (create)
+# An expiring download URL anyone can use, checked by signature instead of a session.
+@router.post("/share/{file_id}/signed")
+def create_signed_link(file_id: str, payload: SignedLinkPayload, user = Depends(require_auth), session: Session = Depends(get_session)):
+    file_obj = session.get(FileModel, file_id)
+    if not file_obj:
+        return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
+    if file_obj.owner_id != user.id:
+        return error("Not allowed", 403, {"code": "NOT_AUTHORIZED"})
+    if payload.expiresIn is not None and payload.expiresIn <= 0:
+        return error("Invalid expiry", 400, {"code": "INVALID_EXPIRY"})
+
+    try:
+        url, expires = sign_url(file_obj, payload.expiresIn, payload.inline)
+    except SigningDisabled as e:
+        return error(str(e), 503, {"code": "SIGNED_LINKS_DISABLED"})
+    return success(data={"url": url, "expiresAt": expires}, message="Signed link created", code=200)
+
+# SIGNED LINKS (revoke)
+# Invalidates every signed link issued for the file so far.
+@router.post("/share/{file_id}/signed/revoke")
+def revoke_signed_links(file_id: str, user = Depends(require_auth), session: Session = Depends(get_session)):
+    file_obj = session.get(FileModel, file_id)
+    if not file_obj:
+        return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
+    if file_obj.owner_id != user.id:
+        return error("Not allowed", 403, {"code": "NOT_AUTHORIZED"})
+
+    file_obj.linkGeneration = (file_obj.linkGeneration or 0) + 1
+    session.add(file_obj)
+    session.commit()
+
+    return success(message="Signed links revoked", code=200)
+
+# SIGNED DOWNLOAD
+# No session needed. The signature and expiry are checked without the database;
+# the file (and its generation) comes from a short-lived cache. Responses are
+# cacheable by shared caches for at most SIGNED_URL_CDN_MAX_AGE seconds.
+@router.get("/signed/{file_id}")
+def signed_download(
+    file_id: str,
+    request: Request,
+    exp: int = 0,
+    gen: int = 0,
+    disp: str = "",
+    kid: str = "",
+    sig: str = "",
+    session: Session = Depends(get_session)
+):
+    no_store = {"Cache-Control": "no-store"}
+    try:
+        verify_signature(file_id, exp, gen, disp, kid, sig)
+    except InvalidSignature as e:
+        return FastJSONResponse(error(str(e), 403, {"code": "INVALID_SIGNATURE"}), status_code=403, headers=no_store)
+
+    linked = linked_file(session, file_id)
+    if linked is None or (linked[0].linkGeneration or 0) != gen:
+        return FastJSONResponse(error("Invalid or expired link", 404, {"code": "INVALID_TOKEN"}), status_code=404, headers=no_store)
+
+    file_obj, stat = linked
+    return deliver_file(request, file_obj, stat, inline=disp == "inline", cache_control=cdn_cache_control(exp))
 
 # SHARE TO USER (email)
 @router.post("/share-user/{file_id}")
@@ -162,20 +514,15 @@ def share_file_to_user(file_id: str, payload: ShareUserPayload, user = Depends(r
     if file_obj.owner_id != user.id:
         return error("Not allowed", 403, {"code": "NOT_AUTHORIZED"})
 
-    email = payload.email.lower().strip()
-    users_list = file_obj.users or []
-
     if payload.mode == "share":
-        if email not in [e.lower() for e in users_list]:
-            users_list.append(email)
+        if payload.role not in SHARE_ROLES:
+            return error("Invalid role", 400, {"code": "INVALID_ROLE", "allowed": list(SHARE_ROLES)})
+        share_with(session, file_obj, payload.email, payload.role)
     elif payload.mode == "unshare":
-        users_list = [e for e in users_list if e.lower() != email]
+        unshare_with(session, file_obj, payload.email)
     else:
         return error("Invalid mode", 400, {"code": "INVALID_MODE"})
 
-    file_obj.users = users_list
-    file_obj.updatedAt = datetime.datetime.now(datetime.timezone.utc)
-    session.add(file_obj)
     session.commit()
     session.refresh(file_obj)
 
@@ -188,66 +535,126 @@ def check_access(file_id: str, user = Depends(require_auth), session: Session =
     if not file_obj:
         return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
 
-    if file_obj.owner_id == user.id:
-        return success(data={"access": True, "role": "owner"}, message="OK", code=200)
-
-    if user.email and user.email.lower() in [e.lower() for e in (file_obj.users or [])]:
-        return success(data={"access": True, "role": "shared-user"}, message="OK", code=200)
+    role = access_role(session, file_obj, user)
+    if role:
+        return success(data={"access": True, "role": role}, message="OK", code=200)
 
     return error("Access denied", 403, {"code": "ACCESS_DENIED"})
 
 # DOWNLOAD
+# Supports Range / If-Range (206, multipart/byteranges), ETag / If-None-Match and
+# If-Modified-Since (304). ?inline=1 serves with an inline disposition for previews.
+# With DOWNLOAD_DELIVERY=x-accel|x-sendfile the front proxy sends the bytes.
 @router.get("/download/{file_id}")
-def download_file(file_id: str, user = Depends(require_auth), session: Session = Depends(get_session)):
+def download_file(file_id: str, request: Request, inline: bool = False, user = Depends(require_auth), session: Session = Depends(get_session)):
     file_obj = session.get(FileModel, file_id)
     if not file_obj:
         return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
 
     # owner or shared user
-    if file_obj.owner_id != user.id and (not user.email or user.email.lower() not in [e.lower() for e in (file_obj.users or [])]):
+    if not access_role(session, file_obj, user):
         return error("You do not have access to this file", 403, {"code": "ACCESS_DENIED"})
 
-    file_path = os.path.join("uploads", file_obj.accountId, file_obj.bucketFileId)
-    if not os.path.exists(file_path):
+    stat = stat_file(file_obj)
+    if stat is None:
         return error("File missing on server", 404, {"code": "FILE_MISSING"})
 
-    # Return actual file stream (FileResponse)
-    return FileResponse(
-        file_path,
-        media_type=file_obj.type,
-        filename=file_obj.name,
-        headers={"Content-Disposition": f'attachment; filename="{file_obj.name}"'}
+    return deliver_file(request, file_obj, stat, inline=inline)
+
+# DOWNLOAD ZIP
+# Several files (owned or shared with the caller) as one ZIP64 archive, built
+# while it is sent. Media and already-compressed formats are stored, the rest
+# deflated. Entries keep the order of `ids`; clashing names get " (n)".
+@router.post("/download/zip")
+def download_zip(payload: ZipDownloadPayload, user = Depends(require_auth), session: Session = Depends(get_session)):
+    ids = list(dict.fromkeys(payload.ids))
+    if not ids:
+        return error("No files selected", 400, {"code": "EMPTY_SELECTION"})
+    if len(ids) > MAX_ZIP_FILES:
+        return error("Too many files", 400, {"code": "TOO_MANY_FILES", "max": MAX_ZIP_FILES})
+
+    files = []
+    for i in range(0, len(ids), 900):
+        files.extend(session.exec(select(FileModel).where(FileModel.id.in_(ids[i:i + 900]))).all())
+    allowed = readable_ids(session, files, user)
+    by_id = {f.id: f for f in files if f.id in allowed}
+    denied = [i for i in ids if i not in by_id]
+    if denied:
+        return error("Access denied", 403, {"code": "ACCESS_DENIED", "ids": denied})
+
+    selected = [by_id[i] for i in ids]
+    missing = [f.id for f in selected if stat_file(f) is None]
+    if missing:
+        return error("File missing on server", 404, {"code": "FILE_MISSING", "ids": missing})
+
+    names = unique_names(f.name for f in selected)
+    entries = [(name, partial(read_content, f), f.type, f.createdAt) for name, f in zip(names, selected)]
+
+    archive_name = os.path.basename(payload.name.strip()) or "files.zip"
+    if not archive_name.lower().endswith(".zip"):
+        archive_name += ".zip"
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(archive_name), "Cache-Control": "no-store"}
     )
 
+# THUMBNAIL
+# WebP derivative of an image (or a PDF's first page); content behind a file id
+# never changes, so the response is cacheable for a year.
+@router.get("/{file_id}/thumbnail")
+async def file_thumbnail(
+    file_id: str,
+    request: Request,
+    size: str = "medium",
+    user = Depends(require_auth_async),
+    session: AsyncSession = Depends(get_async_session)
+):
+    if size not in THUMBNAIL_SIZES:
+        return error("Invalid size", 400, {"code": "INVALID_SIZE", "allowed": list(THUMBNAIL_SIZES)})
+
+    file_obj = await session.get(FileModel, file_id)
+    if not file_obj or not await session.run_sync(access_role, file_obj, user):
+        return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
+
+    etag = f'"{derivative_key(file_obj)}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        path = await ensure_thumbnail(file_obj, size)
+    except ThumbnailUnsupported:
+        return error("Preview could not be generated", 422, {"code": "THUMBNAIL_FAILED"})
+    except Exception as e:
+        print("[THUMB] render failed", file_obj.id, repr(e))
+        return FastJSONResponse(error("Preview failed", 500, {"code": "THUMBNAIL_ERROR"}), status_code=500, headers={"Cache-Control": "no-store"})
+    if not path:
+        return error("No preview for this file type", 415, {"code": "THUMBNAIL_UNSUPPORTED"})
+
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+# LEGACY UPLOAD URLS
+# Older File rows have url=/uploads/<accountId>/<bucketFileId>; that path used to be
+# an open StaticFiles mount and now goes through the same access check as downloads.
+@uploads_router.get("/{account_id}/{bucket_file_id}")
+def legacy_upload_url(account_id: str, bucket_file_id: str, request: Request, user = Depends(require_auth), session: Session = Depends(get_session)):
+    file_obj = session.exec(select(FileModel).where(
+        FileModel.accountId == account_id,
+        FileModel.bucketFileId == bucket_file_id
+    )).first()
+    if not file_obj or not access_role(session, file_obj, user):
+        return error("File not found", 404, {"code": "FILE_NOT_FOUND"})
+
+    stat = stat_file(file_obj)
+    if stat is None:
+        return error("File missing on server", 404, {"code": "FILE_MISSING"})
+
+    return deliver_file(request, file_obj, stat, inline=True)
+
 # USAGE SUMMARY
+# Served from the account_usage counters maintained on upload/delete.
 @router.get("/usage")
-def file_usage(user = Depends(require_auth), session: Session = Depends(get_session)):
-    files = session.exec(select(FileModel).where(FileModel.accountId == user.accountId)).all()
-
-    summary = {
-        "document": {"size": 0, "latestDate": None},
-        "image": {"size": 0, "latestDate": None},
-        "video": {"size": 0, "latestDate": None},
-        "audio": {"size": 0, "latestDate": None},
-        "other": {"size": 0, "latestDate": None},
-        "used": 0,
-    }
-
-    for f in files:
-        size = f.size or 0
-        summary["used"] += size
-
-        file_category = (f.type.split("/")[0] if f.type else "other").lower()
-        if file_category not in summary:
-            file_category = "other"
-
-        summary[file_category]["size"] += size
-
-        created = None
-        if getattr(f, "createdAt", None):
-            created = f.createdAt.isoformat() if hasattr(f.createdAt, "isoformat") else str(f.createdAt)
-        if created:
-            if summary[file_category]["latestDate"] is None or created > summary[file_category]["latestDate"]:
-                summary[file_category]["latestDate"] = created
-
+async def file_usage(user = Depends(require_auth_async), session: AsyncSession = Depends(get_async_session)):
+    summary = await session.run_sync(usage_summary, user.accountId)
     return success(data=summary, message="OK", code=200)
@@ -0,0 +1,349 @@
+# app/files/scrub.py
+# Reconciles stored bytes with the database. Nothing else notices bytes left
+# behind by a crash between storing an upload and committing its row, or rows
+# whose bytes disappeared.
+#
+#   python -m app.files.scrub [--repair] [--verify] [--workers N] [--batch N]
+#                             [--checkpoint FILE] [--max-seconds S] [--grace S]
+#
+# Passes, each streamed in batches so memory stays flat on huge trees:
+#   blobs     Blob rows (by hash): missing object, size mismatch, refCount that
+#             does not match the File rows, and with --verify a sha256 of the
+#             (decoded) content
+#   legacy    File rows still on uploads/<accountId>/<bucketFileId>: missing file,
+#             size / checksum mismatch
+#   shards    every object in the blob storage, 256 shards spread over a thread
+#             pool (os.scandir locally, listings on S3): objects without a Blob row
+#   tree      uploads/<accountId>/ files whose File row is gone or was migrated
+#   staging   leftovers in uploads/.staging that belong to no upload session
+#
+# Findings are printed as "[SCRUB] <kind> <key> ...". --repair deletes orphans
+# and stale staging files and fixes refCounts (dropping blobs nobody references);
+# missing or damaged content is only reported. Objects younger than --grace are
+# never treated as orphans: an upload stores its bytes before its row commits.
+#
+# With --checkpoint the position is saved after every batch / shard, so a run cut
+# short by --max-seconds (or a crash) resumes where it stopped; the file is
+# removed once a full pass completes.
+import os, sys, json, time, hashlib, argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+from sqlmodel import Session, select
+from sqlalchemy import func
+from ..models import Blob, File as FileModel, UploadSession
+from .blobs import delete_unreferenced
+from .storage import STAGING_DIR, UPLOAD_DIR, ObjectStat, blob_storage, legacy_storage, remove_quietly
+from .compression import decompress
+
+SCRUB_WORKERS = int(os.getenv("SCRUB_WORKERS", "8"))
+DEFAULT_BATCH = 500
+ORPHAN_GRACE_SECONDS = 3600
+PASSES = ("blobs", "legacy", "shards", "tree", "staging")
+SHARDS = [f"{i:02x}" for i in range(256)]
+_ID_CHUNK = 900  # stay under SQLite's bound-parameter limit
+
+
+class Checkpoint:
+    """Scrub position persisted as JSON (written atomically); a no-op without a path."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.state = {"pass": PASSES[0], "after": "", "shards": []}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+
+    def save(self, **changes):
+        self.state.update(changes)
+        if not self.path:
+            return
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(temp, self.path)
+
+    def finish(self):
+        if self.path:
+            remove_quietly(self.path)
+
+
+class TimeUp(Exception):
+    pass
+
+
+def _chunks(items: List, size: int = _ID_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _sha256(chunks: Iterator[bytes]) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Scrubber:
+    def __init__(self, engine, store=blob_storage, repair: bool = False, verify: bool = False,
+                 workers: int = SCRUB_WORKERS, batch_size: int = DEFAULT_BATCH, grace: float = ORPHAN_GRACE_SECONDS,
+                 checkpoint: Optional[Checkpoint] = None, max_seconds: Optional[float] = None):
+        self.engine = engine
+        self.store = store
+        self.repair = repair
+        self.verify = verify
+        self.workers = workers
+        self.batch_size = batch_size
+        self.grace = grace
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.counts = Counter()
+
+    def report(self, kind: str, key: str, detail: str = ""):
+        self.counts[kind] += 1
+        print(f"[SCRUB] {kind} {key} {detail}".rstrip())
+
+    def _check_time(self):
+        if self.deadline and time.monotonic() > self.deadline:
+            raise TimeUp()
+
+    def _old_enough(self, mtime: float) -> bool:
+        return time.time() - mtime >= self.grace
+
+    def run(self) -> Counter:
+        """Run the remaining passes. Returns the counts; "complete" is 1 if the pass finished."""
+        passes = {"blobs": self.scrub_blobs, "legacy": self.scrub_legacy_rows, "shards": self.scrub_shards,
+                  "tree": self.scrub_legacy_tree, "staging": self.scrub_staging}
+        try:
+            with ThreadPoolExecutor(self.workers) as self.pool:
+                for name in PASSES[PASSES.index(self.checkpoint.state["pass"]):]:
+                    if self.checkpoint.state["pass"] != name:
+                        self.checkpoint.save(**{"pass": name, "after": ""})
+                    passes[name]()
+        except TimeUp:
+            return self.counts
+        self.checkpoint.finish()
+        self.counts["complete"] = 1
+        return self.counts
+
+    # --- database -> storage ---------------------------------------------------
+
+    def scrub_blobs(self):
+        with Session(self.engine) as session:
+            while True:
+                self._check_time()
+                # plain rows, not ORM objects: the workers read them while repairs commit
+                blobs = session.exec(
+                    select(Blob.hash, Blob.size, Blob.storedSize, Blob.contentEncoding, Blob.refCount)
+                    .where(Blob.hash > self.checkpoint.state["after"])
+                    .order_by(Blob.hash)
+                    .limit(self.batch_size)
+                ).all()
+                if not blobs:
+                    return
+                hashes = [b.hash for b in blobs]
+                references = Counter()
+                for chunk in _chunks(hashes):
+                    references.update(dict(session.exec(
+                        select(FileModel.blobHash, func.count()).where(FileModel.blobHash.in_(chunk)).group_by(FileModel.blobHash)
+                    ).all()))
+                for blob, problem in zip(blobs, self.pool.map(self._check_blob, blobs)):
+                    self.counts["blobs"] += 1
+                    if problem:
+                        self.report(*problem)
+                    if references[blob.hash] != blob.refCount:
+                        self.report("refcount", blob.hash, f"recorded={blob.refCount} actual={references[blob.hash]}")
+                        if self.repair:
+                            self._fix_refcount(session, blob.hash)
+                self.checkpoint.save(after=hashes[-1])
+
+    def _check_blob(self, blob) -> Optional[Tuple[str, str, str]]:
+        stat = self.store.stat(blob.hash)
+        if stat is None:
+            return ("missing-blob", blob.hash, "")
+        expected = blob.storedSize if blob.storedSize is not None else (None if blob.contentEncoding else blob.size)
+        if expected is not None and stat.size != expected:
+            return ("size-mismatch", blob.hash, f"stored={stat.size} expected={expected}")
+        if self.verify:
+            chunks = self.store.stream(blob.hash)
+            if blob.contentEncoding:
+                chunks = decompress(chunks, blob.contentEncoding)
+            try:
+                digest = _sha256(chunks)
+            except Exception as e:  # damaged compressed data fails to decode
+                return ("corrupt", blob.hash, f"unreadable: {e}")
+            if digest != blob.hash:
+                return ("corrupt", blob.hash, "sha256 does not match")
+        return None
+
+    def _fix_refcount(self, session: Session, blob_hash: str):
+        # same lock store_blob / release_blob take, so uploads cannot interleave
+        blob = session.exec(select(Blob).where(Blob.hash == blob_hash).with_for_update()).first()
+        if not blob:
+            session.rollback()
+            return
+        actual = session.exec(select(func.count()).where(FileModel.blobHash == blob_hash)).one()
+        if actual:
+            blob.refCount = actual
+            session.add(blob)
+            session.commit()
+        else:
+            session.delete(blob)
+            session.commit()
+            delete_unreferenced(session, blob_hash, self.store)
+        self.counts["repaired"] += 1
+
+    def scrub_legacy_rows(self):
+        with Session(self.engine) as session:
+            while True:
+                self._check_time()
+                files = session.exec(
+                    select(FileModel.id, FileModel.accountId, FileModel.bucketFileId, FileModel.size, FileModel.checksum)
+                    .where(FileModel.blobHash.is_(None), FileModel.id > self.checkpoint.state["after"])
+                    .order_by(FileModel.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not files:
+                    return
+                for file_obj, problem in zip(files, self.pool.map(self._check_legacy_file, files)):
+                    self.counts["legacy"] += 1
+                    if problem:
+                        self.report(*problem)
+                self.checkpoint.save(after=files[-1].id)
+
+    def _check_legacy_file(self, file_obj) -> Optional[Tuple[str, str, str]]:
+        key = f"{file_obj.accountId}/{file_obj.bucketFileId}"
+        stat = legacy_storage.stat(key)
+        if stat is None:
+            return ("missing-file", file_obj.id, key)
+        if file_obj.size is not None and stat.size != file_obj.size:
+            return ("size-mismatch", file_obj.id, f"stored={stat.size} expected={file_obj.size}")
+        if self.verify and file_obj.checksum and _sha256(legacy_storage.stream(key)) != file_obj.checksum:
+            return ("corrupt", file_obj.id, "sha256 does not match")
+        return None
+
+    # --- storage -> database ---------------------------------------------------
+
+    def scrub_shards(self):
+        done = set(self.checkpoint.state["shards"])
+        pending = [shard for shard in SHARDS if shard not in done]
+        futures = [self.pool.submit(self._scan_shard, shard) for shard in pending]
+        try:
+            for future in as_completed(futures):
+                shard, counts = future.result()
+                self.counts.update(counts)
+                done.add(shard)
+                self.checkpoint.save(shards=sorted(done))
+                self._check_time()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _scan_shard(self, shard: str) -> Tuple[str, Counter]:
+        counts = Counter()
+        batch: List[Tuple[str, ObjectStat]] = []
+        with Session(self.engine) as session:
+            for item in self.store.list_shard(shard):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    counts.update(self._check_objects(session, batch))
+                    batch = []
+            if batch:
+                counts.update(self._check_objects(session, batch))
+        return shard, counts
+
+    def _check_objects(self, session: Session, items: List[Tuple[str, ObjectStat]]) -> Counter:
+        counts = Counter(objects=len(items))
+        known = set()
+        for chunk in _chunks([key for key, _ in items]):
+            known.update(session.exec(select(Blob.hash).where(Blob.hash.in_(chunk))).all())
+            # bytes File rows still point at are never orphans, even if their Blob row is gone
+            known.update(session.exec(select(FileModel.blobHash).where(FileModel.blobHash.in_(chunk))).all())
+        for key, stat in items:
+            if key in known or not self._old_enough(stat.mtime):
+                continue
+            counts["orphan-blob"] += 1
+            print(f"[SCRUB] orphan-blob {key} size={stat.size}")
+            if self.repair and delete_unreferenced(session, key, self.store):
+                counts["repaired"] += 1
+        return counts
+
+    def scrub_legacy_tree(self):
+        accounts = [e.name for e in os.scandir(UPLOAD_DIR) if e.is_dir(follow_symlinks=False) and not e.name.startswith(".")]
+        for counts in self.pool.map(self._scan_account_dir, accounts):
+            self.counts.update(counts)
+        self._check_time()
+
+    def _scan_account_dir(self, account_id: str) -> Counter:
+        counts = Counter()
+        with Session(self.engine) as session, os.scandir(os.path.join(UPLOAD_DIR, account_id)) as entries:
+            batch = []
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    batch.append((entry.name, entry.stat(follow_symlinks=False)))
+                if len(batch) >= self.batch_size:
+                    counts.update(self._check_legacy_objects(session, account_id, batch))
+                    batch = []
+            if batch:
+                counts.update(self._check_legacy_objects(session, account_id, batch))
+        return counts
+
+    def _check_legacy_objects(self, session: Session, account_id: str, items) -> Counter:
+        counts = Counter(objects=len(items))
+        known = set()
+        for chunk in _chunks([name for name, _ in items]):
+            known.update(session.exec(select(FileModel.bucketFileId).where(
+                FileModel.accountId == account_id,
+                FileModel.bucketFileId.in_(chunk),
+                FileModel.blobHash.is_(None),
+            )).all())
+        for name, st in items:
+            if name in known or not self._old_enough(st.st_mtime):
+                continue
+            counts["orphan-file"] += 1
+            print(f"[SCRUB] orphan-file {account_id}/{name} size={st.st_size}")
+            if self.repair:
+                legacy_storage.delete(f"{account_id}/{name}")
+                counts["repaired"] += 1
+        return counts
+
+    def scrub_staging(self):
+        with Session(self.engine) as session, os.scandir(STAGING_DIR) as entries:
+            stale = []
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and self._old_enough(entry.stat().st_mtime):
+                    stale.append(entry.name)
+            live = set()
+            for chunk in _chunks(stale):
+                live.update(session.exec(select(UploadSession.id).where(UploadSession.id.in_(chunk))).all())
+        for name in stale:
+            if name in live:
+                continue
+            self.report("stale-staging", name)
+            if self.repair:
+                remove_quietly(os.path.join(STAGING_DIR, name))
+                self.counts["repaired"] += 1
+
+
+if __name__ == "__main__":
+    from ..db import engine
+
+    parser = argparse.ArgumentParser(prog="python -m app.files.scrub")
+    parser.add_argument("--repair", action="store_true", help="delete orphans / stale staging files, fix refCounts")
+    parser.add_argument("--verify", action="store_true", help="re-hash stored content (reads every byte)")
+    parser.add_argument("--workers", type=int, default=SCRUB_WORKERS)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--grace", type=float, default=ORPHAN_GRACE_SECONDS, help="seconds before unreferenced bytes count as orphans")
+    parser.add_argument("--checkpoint", help="resume from / save progress to this file")
+    parser.add_argument("--max-seconds", type=float, help="stop (resumably, with --checkpoint) after about this long")
+    args = parser.parse_args()
+
+    scrubber = Scrubber(
+        engine, repair=args.repair, verify=args.verify, workers=args.workers, batch_size=args.batch,
+        grace=args.grace, checkpoint=Checkpoint(args.checkpoint), max_seconds=args.max_seconds,
+    )
+    counts = scrubber.run()
+    print(" ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    if not counts.get("complete"):
+        print(f"[SCRUB] stopped early; run again{' with the same --checkpoint' if args.checkpoint else ''} to continue")
+    sys.exit(1 if any(counts.get(k) for k in ("missing-blob", "missing-file", "size-mismatch", "corrupt")) else 0)
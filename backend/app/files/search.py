@@ -0,0 +1,126 @@
+# app/files/search.py
+# File-name search backed by a real text index instead of client-side filtering:
+#   SQLite    files_fts, an FTS5 table (trigram tokenizer) over files.name that
+#             triggers keep in step with every insert / rename / delete. Its
+#             rowids come from files_fts_map (file id -> INTEGER docid), not from
+#             the implicit rowid of files, which VACUUM may renumber.
+#   Postgres  a pg_trgm GIN index on lower(name), maintained by Postgres itself
+# Both answer substring queries of 3+ characters from the index; "fuzzy" matches
+# names sharing most trigrams with the query (typos, transpositions). Shorter
+# queries are name prefixes on lower(name); case is folded throughout, as the
+# trigram tokenizer and the lower(name) index do.
+from sqlalchemy import text, literal_column, func, or_, select, table, column
+from sqlalchemy.engine import Engine
+from ..models import File as FileModel, FileShare
+
+MIN_TRIGRAM_QUERY = 3
+# fuzzy matching on SQLite ranks at most this many best index hits
+FUZZY_CANDIDATES = 5000
+
+_SQLITE_SETUP = [
+    "CREATE TABLE IF NOT EXISTS files_fts_map (docid INTEGER PRIMARY KEY AUTOINCREMENT, file_id TEXT NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(name, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts_map(file_id) VALUES (new.id);
+        INSERT INTO files_fts(rowid, name) VALUES ((SELECT docid FROM files_fts_map WHERE file_id = new.id), new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+        DELETE FROM files_fts WHERE rowid = (SELECT docid FROM files_fts_map WHERE file_id = old.id);
+        DELETE FROM files_fts_map WHERE file_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_fts_rename AFTER UPDATE OF name ON files BEGIN
+        UPDATE files_fts SET name = new.name WHERE rowid = (SELECT docid FROM files_fts_map WHERE file_id = new.id);
+    END""",
+]
+_SQLITE_TRIGGERS = ("files_fts_insert", "files_fts_delete", "files_fts_rename")
+_SQLITE_OBJECTS = ("files_fts", "files_fts_map") + _SQLITE_TRIGGERS
+_SQLITE_FILL = [
+    "INSERT INTO files_fts_map(file_id) SELECT id FROM files",
+    "INSERT INTO files_fts(rowid, name) SELECT m.docid, f.name FROM files_fts_map m JOIN files f ON f.id = m.file_id",
+]
+
+_fts = table("files_fts", column("rowid"), column("rank"))
+_fts_map = table("files_fts_map", column("docid"), column("file_id"))
+
+_POSTGRES_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_files_name_trgm ON files USING gin (lower(name) gin_trgm_ops)",
+]
+
+
+def ensure_search_index(engine: Engine):
+    """Create the index (and on SQLite its triggers); rebuild it when it is new."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            existing = set(conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE name IN ('files_fts', 'files_fts_map') OR (type = 'trigger' AND name LIKE 'files_fts_%')"
+            )).scalars())
+            if not existing.issuperset(_SQLITE_OBJECTS):
+                # first run, the files table was re-created, or an index from before
+                # files_fts_map (keyed on files.rowid): start over and index what is there
+                for trigger in _SQLITE_TRIGGERS:
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+                conn.execute(text("DROP TABLE IF EXISTS files_fts"))
+                conn.execute(text("DROP TABLE IF EXISTS files_fts_map"))
+                for statement in _SQLITE_SETUP + _SQLITE_FILL:
+                    conn.execute(text(statement))
+        elif dialect == "postgresql":
+            for statement in _POSTGRES_SETUP:
+                conn.execute(text(statement))
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _trigrams(value: str):
+    value = value.lower()
+    return list(dict.fromkeys(value[i:i + 3] for i in range(len(value) - 2)))
+
+
+def apply_name_match(query, dialect: str, q: str, fuzzy: bool, within=None):
+    """Restrict `query` (over files) to names matching `q`. Returns the query and a
+    relevance expression to order by (ascending, best first), or None.
+
+    `within` is the caller's WHERE clause over files (visibility, type). Index
+    hits are drawn from those rows only, so other accounts' matches cannot
+    crowd out the capped fuzzy candidate list."""
+    lowered = func.lower(FileModel.name)
+    if len(q) < MIN_TRIGRAM_QUERY:
+        return query.where(lowered.startswith(q.lower(), autoescape=True)), None
+
+    if dialect == "sqlite":
+        expr = " OR ".join(_fts_phrase(t) for t in _trigrams(q)) if fuzzy else _fts_phrase(q)
+        matched = (
+            select(_fts_map.c.file_id, _fts.c.rank)
+            .select_from(_fts.join(_fts_map, _fts_map.c.docid == _fts.c.rowid))
+            .where(literal_column("files_fts").op("MATCH")(expr))
+        )
+        if within is not None:
+            matched = matched.join(FileModel, FileModel.id == _fts_map.c.file_id).where(within)
+        if fuzzy:
+            matched = matched.order_by(_fts.c.rank).limit(FUZZY_CANDIDATES)
+        matched = matched.subquery("matched")
+        query = query.join(matched, matched.c.file_id == FileModel.id)
+        return query, (matched.c.rank if fuzzy else None)
+
+    if dialect == "postgresql" and fuzzy:
+        return query.where(lowered.op("%")(q.lower())), -func.similarity(lowered, q.lower())
+    # substring; on Postgres the trigram index serves LIKE '%...%'
+    return query.where(lowered.contains(q.lower(), autoescape=True)), None
+
+
+def visible_to(user, scope: str = "all"):
+    """Files the user owns and/or has been shared, as a WHERE clause."""
+    owned = FileModel.accountId == user.accountId
+    if not user.email:
+        return owned if scope != "shared" else FileModel.id.is_(None)
+    shared = FileModel.id.in_(
+        select(FileShare.file_id).where(FileShare.grantee_email == user.email.lower())
+    )
+    if scope == "owned":
+        return owned
+    if scope == "shared":
+        return shared
+    return or_(owned, shared)
@@ -0,0 +1,82 @@
+# app/files/service.py
+import os, uuid, datetime
+from typing import Optional
+from sqlmodel import Session
+from ..db import engine
+from ..models import File as FileModel, Blob
+from .blobs import store_blob, release_blob, delete_unreferenced
+from .storage import Locator, delete_stored, locate
+from .thumbnails import derivative_key, purge_derivatives
+from .usage import add_usage, remove_usage
+from .access import drop_shares
+
+
+def _add_file_row(session: Session, user, name: str, content_type: str, blob: Blob) -> FileModel:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    file_id = str(uuid.uuid4())
+    new_file = FileModel(
+        id=file_id,
+        name=name,
+        url=f"/files/download/{file_id}?inline=1",
+        type=content_type or "application/octet-stream",
+        bucketFileId=blob.hash,
+        blobHash=blob.hash,
+        accountId=user.accountId,
+        extension=os.path.splitext(name)[1].lstrip("."),
+        size=blob.size,
+        checksum=blob.hash,
+        storedSize=blob.storedSize,
+        contentEncoding=blob.contentEncoding,
+        createdAt=now,
+        updatedAt=now,
+        owner_id=user.id,
+        users=[],
+    )
+    session.add(new_file)
+    add_usage(session, new_file)
+    return new_file
+
+
+def create_file_record(session: Session, user, name: str, content_type: str, temp_path: str, size: int, checksum: str, encoding: Optional[str] = None) -> FileModel:
+    """Move a fully written temp file (compressed with `encoding`, if set) into the
+    blob store and insert its File row."""
+    blob = store_blob(session, temp_path, checksum, size, encoding)
+    new_file = _add_file_row(session, user, name, content_type, blob)
+    session.commit()
+    session.refresh(new_file)
+    return new_file
+
+
+def create_file_from_blob(session: Session, user, name: str, content_type: str, blob: Blob) -> FileModel:
+    """Insert a File row for content that is already stored (upload by hash)."""
+    new_file = _add_file_row(session, user, name, content_type, blob)
+    session.commit()
+    session.refresh(new_file)
+    return new_file
+
+
+def delete_file_record(session: Session, file_obj: FileModel) -> Optional[Locator]:
+    """Delete the File row and release its storage. Returns the locator of bytes
+    to delete after commit, if any."""
+    if file_obj.blobHash:
+        released = release_blob(session, file_obj.blobHash)
+    else:
+        released = locate(file_obj)
+    drop_shares(session, file_obj.id)
+    session.delete(file_obj)
+    remove_usage(session, file_obj)
+    return released
+
+
+def discard_stored(file_obj: FileModel, released: Optional[Locator]):
+    """Remove bytes released by delete_file_record (and their derivatives). Call after commit."""
+    if not released:
+        return
+    if released[0] == "blob":
+        # the same content may have been uploaded again since the commit
+        with Session(engine) as session:
+            if not delete_unreferenced(session, released[1]):
+                return
+    else:
+        delete_stored(released)
+    purge_derivatives(derivative_key(file_obj))
@@ -0,0 +1,170 @@
+# app/files/signing.py
+# HMAC-signed, expiring download URLs:
+#   /files/signed/<fileId>?exp=<unix>&gen=<n>&disp=inline|attachment&kid=<key id>&sig=<base64url>
+# sig = HMAC-SHA256(key[kid], "v1\n<fileId>\n<gen>\n<exp>\n<disp>"), so the link
+# can be checked without the database (a front proxy with the keys can do the
+# same). Revocation:
+#   - per file: bumping File.linkGeneration invalidates every link issued before
+#   - per key: drop its kid from URL_SIGNING_KEYS
+# The generation (and what is needed to serve the file) is read through a small
+# per-process cache, so hot links do not touch the database; other workers see a
+# revocation within SIGNED_URL_CACHE_TTL seconds.
+#
+# URL_SIGNING_KEYS="k2:secret2,k1:secret1" - the first key signs, all verify.
+# Without it a key derived from JWT_SECRET is used; when JWT_SECRET is still the
+# built-in default (which is public) signed links are disabled instead.
+import os, time, hmac, base64, hashlib, threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+from sqlalchemy import event
+from sqlmodel import Session
+from ..models import File as FileModel
+from ..utils.utils import DEFAULT_JWT_SECRET, JWT_SECRET
+from .storage import ObjectStat, stat_file
+
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", "3600"))
+SIGNED_URL_MAX_TTL = int(os.getenv("SIGNED_URL_MAX_TTL", str(7 * 24 * 3600)))
+SIGNED_URL_CACHE_TTL = int(os.getenv("SIGNED_URL_CACHE_TTL", "30"))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+# origin put in front of signed links, e.g. the CDN host; relative links without it
+SIGNED_URL_BASE = os.getenv("SIGNED_URL_BASE", "").rstrip("/")
+# shared caches (CDN) keep a response at most this long, so revocation still lands
+SIGNED_URL_CDN_MAX_AGE = int(os.getenv("SIGNED_URL_CDN_MAX_AGE", "300"))
+
+DISPOSITIONS = ("inline", "attachment")
+
+
+class InvalidSignature(Exception):
+    pass
+
+
+class SigningDisabled(Exception):
+    pass
+
+
+def _load_keys() -> Tuple[Optional[str], Dict[str, bytes]]:
+    raw = os.getenv("URL_SIGNING_KEYS", "")
+    keys = OrderedDict()
+    for item in raw.split(","):
+        kid, sep, secret = item.strip().partition(":")
+        if sep and kid and secret:
+            keys[kid] = secret.encode()
+    if not keys:
+        if JWT_SECRET == DEFAULT_JWT_SECRET:
+            print("[SIGNING] signed links disabled: set URL_SIGNING_KEYS or JWT_SECRET")
+            return None, {}
+        keys["default"] = hmac.new(JWT_SECRET.encode(), b"url-signing", hashlib.sha256).digest()
+    return next(iter(keys)), dict(keys)
+
+
+SIGNING_KID, SIGNING_KEYS = _load_keys()
+SIGNING_ENABLED = SIGNING_KID is not None
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _signature(key: bytes, file_id: str, generation: int, expires: int, disposition: str) -> str:
+    message = f"v1\n{file_id}\n{generation}\n{expires}\n{disposition}".encode()
+    return _b64(hmac.new(key, message, hashlib.sha256).digest())
+
+
+def sign_url(file_obj: FileModel, ttl: Optional[int] = None, inline: bool = False, stable: bool = False) -> Tuple[str, int]:
+    """Signed link to `file_obj` and its expiry (unix seconds).
+
+    With `stable` the expiry is rounded to a ttl-sized window, so every request in
+    the same window gets the same URL (and a CDN its cached copy); such links stay
+    valid for between ttl and 2 * ttl seconds. Raises SigningDisabled when no
+    signing key is configured."""
+    if not SIGNING_ENABLED:
+        raise SigningDisabled("Signed links are disabled")
+    ttl = min(max(int(ttl or SIGNED_URL_TTL), 1), SIGNED_URL_MAX_TTL)
+    now = int(time.time())
+    expires = now - now % ttl + 2 * ttl if stable else now + ttl
+    generation = file_obj.linkGeneration or 0
+    disposition = "inline" if inline else "attachment"
+    query = urlencode({
+        "exp": expires,
+        "gen": generation,
+        "disp": disposition,
+        "kid": SIGNING_KID,
+        "sig": _signature(SIGNING_KEYS[SIGNING_KID], file_obj.id, generation, expires, disposition),
+    })
+    return f"{SIGNED_URL_BASE}/files/signed/{file_obj.id}?{query}", expires
+
+
+def verify_signature(file_id: str, exp: int, gen: int, disp: str, kid: str, sig: str):
+    """Check the signature and expiry only; the generation is checked by the caller."""
+    key = SIGNING_KEYS.get(kid)
+    if key is None or disp not in DISPOSITIONS:
+        raise InvalidSignature("Invalid link")
+    if not hmac.compare_digest(_signature(key, file_id, gen, exp, disp), sig):
+        raise InvalidSignature("Invalid link")
+    if exp < time.time():
+        raise InvalidSignature("Link expired")
+
+
+class _LinkCache:
+    """file id -> (deadline, detached File copy, stat of the stored bytes)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: str):
+        with self._lock:
+            item = self._data.get(file_id)
+            if not item:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[file_id]
+                return None
+            self._data.move_to_end(file_id)
+            return item[1], item[2]
+
+    def set(self, file_id: str, file_obj: FileModel, stat: ObjectStat):
+        with self._lock:
+            self._data[file_id] = (time.monotonic() + SIGNED_URL_CACHE_TTL, file_obj, stat)
+            self._data.move_to_end(file_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, file_id: str):
+        with self._lock:
+            self._data.pop(file_id, None)
+
+
+_cache = _LinkCache(SIGNED_URL_CACHE_SIZE)
+
+
+def linked_file(session: Session, file_id: str) -> Optional[Tuple[FileModel, ObjectStat]]:
+    """The file behind a signed link and its stat, from the cache when possible
+    (the session only connects on a miss)."""
+    cached = _cache.get(file_id) if SIGNED_URL_CACHE_TTL > 0 else None
+    if cached:
+        return cached
+    file_obj = session.get(FileModel, file_id)
+    if not file_obj:
+        return None
+    detached = FileModel.model_validate(file_obj.model_dump())
+    stat = stat_file(detached)
+    if stat is None:
+        return None
+    if SIGNED_URL_CACHE_TTL > 0:
+        _cache.set(file_id, detached, stat)
+    return detached, stat
+
+
+def cdn_cache_control(expires: int) -> str:
+    max_age = max(0, min(int(expires - time.time()), SIGNED_URL_CDN_MAX_AGE))
+    return f"public, max-age={max_age}, immutable"
+
+
+# revocations, renames and deletes made in this process apply at once
+@event.listens_for(FileModel, "after_update")
+@event.listens_for(FileModel, "after_delete")
+def _file_changed(mapper, connection, target):
+    _cache.delete(target.id)
@@ -0,0 +1,236 @@
+# app/files/storage.py
+# Where file bytes live. Content-addressed blobs go through a storage backend
+# chosen by STORAGE_BACKEND:
+#   local   uploads/.blobs/ab/cd/<sha256> on this machine (default)
+#   s3      an S3-compatible bucket (AWS, MinIO, ...), needs the optional boto3
+# Both fan keys out as <h[:2]>/<h[2:4]>/<key>, so no directory grows unbounded.
+#
+# Everything else stays on local disk:
+#   uploads/<accountId>/<bucketFileId>   legacy per-upload files (see migrate.py)
+#   uploads/.staging/<id>                in-flight uploads
+#   uploads/.derivatives/ab/<key>/...    thumbnails and previews (a cache)
+#
+# A stored file is addressed by a locator: ("blob", sha256) or ("legacy", "<accountId>/<bucketFileId>").
+import os, uuid, hashlib, re
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+UPLOAD_DIR = "uploads"
+STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(UPLOAD_DIR, ".staging"))
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(UPLOAD_DIR, ".blobs"))
+DERIVATIVE_DIR = os.getenv("DERIVATIVE_DIR", os.path.join(UPLOAD_DIR, ".derivatives"))
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "blobs/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION")
+
+CHUNK_SIZE = 1024 * 1024
+
+for _dir in (UPLOAD_DIR, STAGING_DIR, BLOB_DIR, DERIVATIVE_DIR):
+    os.makedirs(_dir, exist_ok=True)
+
+Locator = Tuple[str, str]
+
+
+class ObjectStat(NamedTuple):
+    size: int
+    mtime: float
+
+
+def shard_prefix(key: str) -> str:
+    digest = key if re.fullmatch(r"[0-9a-f]{8,}", key) else hashlib.sha256(key.encode()).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}"
+
+
+class LocalStorage:
+    """Files under `root`; with shard=False keys are used as relative paths as is."""
+
+    def __init__(self, root: str, shard: bool = True):
+        self.root = root
+        self.shard = shard
+
+    def local_path(self, key: str) -> str:
+        if self.shard:
+            return os.path.join(self.root, *shard_prefix(key).split("/"), key)
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key: str, src_path: str):
+        """Take ownership of a fully written local file."""
+        dest = self.local_path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(src_path, dest)
+
+    def get(self, key: str) -> bytes:
+        with open(self.local_path(key), "rb") as f:
+            return f.read()
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive; end=None reads to EOF)."""
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str):
+        remove_quietly(self.local_path(key))
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            st = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return ObjectStat(st.st_size, st.st_mtime)
+
+    def list_shard(self, shard: str) -> Iterator[Tuple[str, ObjectStat]]:
+        """(key, stat) of every object under one top-level shard ("00".."ff")."""
+        top = os.path.join(self.root, shard)
+        try:
+            subdirs = [e.path for e in os.scandir(top) if e.is_dir(follow_symlinks=False)]
+        except FileNotFoundError:
+            return
+        for subdir in subdirs:
+            with os.scandir(subdir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield entry.name, ObjectStat(st.st_size, st.st_mtime)
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket. There is no local path, so downloads
+    are proxied through the app (with Range support) instead of X-Accel/X-Sendfile."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{shard_prefix(key)}/{key}"
+
+    def local_path(self, key: str) -> None:
+        return None
+
+    def put(self, key: str, src_path: str):
+        """Upload a fully written local file (multipart for big ones), then remove it."""
+        self.client.upload_file(src_path, self.bucket, self._key(key))
+        remove_quietly(src_path)
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectStat(head["ContentLength"], head["LastModified"].timestamp())
+
+    def list_shard(self, shard: str) -> Iterator[Tuple[str, ObjectStat]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{shard}/"):
+            for item in page.get("Contents", ()):
+                yield item["Key"].rsplit("/", 1)[-1], ObjectStat(item["Size"], item["LastModified"].timestamp())
+
+
+def build_blob_storage():
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(BLOB_DIR)
+    if STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise ValueError("STORAGE_BACKEND=s3 needs S3_BUCKET")
+        return S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+blob_storage = build_blob_storage()
+legacy_storage = LocalStorage(UPLOAD_DIR, shard=False)
+_stores = {"blob": blob_storage, "legacy": legacy_storage}
+
+
+def locate(file_obj) -> Locator:
+    if file_obj.blobHash:
+        return ("blob", file_obj.blobHash)
+    return ("legacy", f"{file_obj.accountId}/{file_obj.bucketFileId}")
+
+
+def store_for(locator: Locator):
+    return _stores[locator[0]]
+
+
+def file_path(file_obj) -> Optional[str]:
+    """Local path of the file's bytes, or None when they live in a remote backend."""
+    locator = locate(file_obj)
+    return store_for(locator).local_path(locator[1])
+
+
+def stat_file(file_obj) -> Optional[ObjectStat]:
+    locator = locate(file_obj)
+    return store_for(locator).stat(locator[1])
+
+
+def stream_file(file_obj, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    locator = locate(file_obj)
+    return store_for(locator).stream(locator[1], start, end)
+
+
+def delete_stored(locator: Optional[Locator]):
+    if locator:
+        store_for(locator).delete(locator[1])
+
+
+@contextmanager
+def local_copy(locator: Locator):
+    """A local path with the object's bytes; remote objects are fetched into staging
+    for the duration of the block."""
+    store = store_for(locator)
+    path = store.local_path(locator[1])
+    if path:
+        yield path
+        return
+    temp = new_staging_path()
+    try:
+        with open(temp, "wb") as out:
+            for chunk in store.stream(locator[1]):
+                out.write(chunk)
+        yield temp
+    finally:
+        remove_quietly(temp)
+
+
+def new_staging_path() -> str:
+    return os.path.join(STAGING_DIR, uuid.uuid4().hex)
+
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,73 @@
+# app/files/streaming.py
+import os, hashlib
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+import aiofiles
+from .compression import compressor
+
+# hard limit for a single uploaded file (bytes), default 5 GiB
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(5 * 1024 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {limit} bytes")
+        self.limit = limit
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_path(chunks: AsyncIterator[bytes], path: str, max_size: int = MAX_UPLOAD_SIZE, encoding: Optional[str] = None) -> Tuple[int, str]:
+    """Write an async byte stream to `path` in one pass, compressed when `encoding` is set.
+
+    Returns (size, sha256 hex) of the original bytes. The partial file is removed
+    if the stream fails or goes over `max_size`.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    encoder = compressor(encoding) if encoding else None
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await out.write(encoder.compress(chunk) if encoder else chunk)
+            if encoder:
+                await out.write(encoder.flush())
+    except BaseException:
+        _discard(path)
+        raise
+    return size, digest.hexdigest()
+
+
+def copy_to_path(src: BinaryIO, path: str, max_size: int = MAX_UPLOAD_SIZE, encoding: Optional[str] = None) -> Tuple[int, str]:
+    """Sync counterpart of `stream_to_path` for already spooled uploads."""
+    digest = hashlib.sha256()
+    size = 0
+    encoder = compressor(encoding) if encoding else None
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                out.write(encoder.compress(chunk) if encoder else chunk)
+            if encoder:
+                out.write(encoder.flush())
+    except BaseException:
+        _discard(path)
+        raise
+    return size, digest.hexdigest()
@@ -0,0 +1,150 @@
+# app/files/thumbnails.py
+# Thumbnail/preview derivatives, rendered in a process pool and cached on disk
+# under uploads/.derivatives/<key[:2]>/<key>/<size>.webp. The key is the content
+# hash, so identical uploads share their thumbnails. Rendering is kicked off
+# after upload and redone lazily if a derivative is missing.
+import os, shutil, asyncio, importlib.util, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from .storage import DERIVATIVE_DIR, Locator, local_copy, locate
+
+THUMBNAIL_SIZES = {"small": 128, "medium": 320, "large": 1024}
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_FORMAT = "webp"
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ThumbnailUnsupported(Exception):
+    """The content could not be decoded as its type says (corrupt, truncated,
+    not really an image, or too large to decode safely)."""
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # never fork: the server process already runs threads (DB pools, mail and
+        # maintenance workers) whose locks a forked child would inherit mid-use
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def supports_thumbnail(content_type: Optional[str]) -> bool:
+    content_type = (content_type or "").lower()
+    if content_type.startswith("image/") and content_type != "image/svg+xml":
+        return HAS_PILLOW
+    if content_type == "application/pdf":
+        return HAS_PILLOW and HAS_PYMUPDF
+    return False
+
+
+def derivative_key(file_obj) -> str:
+    return file_obj.blobHash or file_obj.checksum or f"f-{file_obj.id}"
+
+
+def derivative_dir(key: str) -> str:
+    return os.path.join(DERIVATIVE_DIR, key[:2], key)
+
+
+def thumbnail_path(key: str, size: str) -> str:
+    return os.path.join(derivative_dir(key), f"{size}.{THUMBNAIL_FORMAT}")
+
+
+def purge_derivatives(key: str):
+    shutil.rmtree(derivative_dir(key), ignore_errors=True)
+
+
+def render_thumbnails(src: str, content_type: str, targets: Dict[str, str]):
+    """Runs in a worker process: decode once, write every requested size."""
+    from PIL import Image, ImageOps
+
+    if content_type == "application/pdf":
+        import fitz
+        try:
+            with fitz.open(src) as doc:
+                page = doc.load_page(0)
+                scale = max(THUMBNAIL_SIZES.values()) / max(page.rect.width, page.rect.height, 1)
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        except (fitz.FileDataError, ValueError) as e:
+            raise ThumbnailUnsupported(f"unreadable PDF: {e}")
+    else:
+        try:
+            image = Image.open(src)
+            image.draft("RGB", (max(THUMBNAIL_SIZES.values()),) * 2)  # cheap JPEG downscale on decode
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        except (Image.UnidentifiedImageError, Image.DecompressionBombError, SyntaxError) as e:
+            raise ThumbnailUnsupported(f"unreadable image: {e}")
+        except OSError as e:
+            # truncated or corrupt pixel data; I/O errors on src are not the content's fault
+            if isinstance(e, (FileNotFoundError, PermissionError)):
+                raise
+            raise ThumbnailUnsupported(f"unreadable image: {e}")
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    for size, dest in sorted(targets.items(), key=lambda t: -THUMBNAIL_SIZES[t[0]]):
+        edge = THUMBNAIL_SIZES[size]
+        thumb = image.copy()
+        thumb.thumbnail((edge, edge))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        thumb.save(tmp, "WEBP", quality=80, method=4)
+        os.replace(tmp, dest)
+
+
+def render_stored(locator: Locator, content_type: str, targets: Dict[str, str]):
+    """Worker-process entry point; remote objects are fetched to staging first."""
+    with local_copy(locator) as src:
+        render_thumbnails(src, content_type, targets)
+
+
+def _missing_targets(file_obj) -> Dict[str, str]:
+    key = derivative_key(file_obj)
+    return {
+        size: thumbnail_path(key, size)
+        for size in THUMBNAIL_SIZES
+        if not os.path.exists(thumbnail_path(key, size))
+    }
+
+
+def schedule_thumbnails(file_obj):
+    """Fire-and-forget rendering after an upload; errors only mean a lazy render later."""
+    if not supports_thumbnail(file_obj.type):
+        return
+    targets = _missing_targets(file_obj)
+    if targets:
+        future = _get_pool().submit(render_stored, locate(file_obj), file_obj.type.lower(), targets)
+        future.add_done_callback(_log_failure)
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception():
+        print("[THUMB] render failed", future.exception())
+
+
+async def ensure_thumbnail(file_obj, size: str) -> Optional[str]:
+    """Path of the cached derivative, rendering it first if needed. None if unsupported."""
+    if not supports_thumbnail(file_obj.type):
+        return None
+    path = thumbnail_path(derivative_key(file_obj), size)
+    if os.path.exists(path):
+        return path
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        _get_pool(), render_stored, locate(file_obj), file_obj.type.lower(), _missing_targets(file_obj)
+    )
+    return path
@@ -0,0 +1,130 @@
+# app/files/usage.py
+# Per-account, per-category usage counters kept in step with the files table.
+# Writers call add_usage / remove_usage in the same transaction as the File row;
+# `python -m app.files.usage` rebuilds the counters from the files table.
+import os, sys, datetime
+from typing import Optional
+from sqlmodel import Session, select
+from sqlalchemy import func, delete
+from sqlalchemy.exc import IntegrityError
+from ..models import AccountUsage, File as FileModel
+from .listing import CATEGORIES, category_expr, file_category
+
+# 0 disables the quota
+ACCOUNT_QUOTA_BYTES = int(os.getenv("ACCOUNT_QUOTA_BYTES", "0"))
+
+
+def _aware(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def _locked_row(session: Session, account_id: str, category: str) -> AccountUsage:
+    row = session.exec(select(AccountUsage).where(
+        AccountUsage.accountId == account_id,
+        AccountUsage.category == category
+    ).with_for_update()).first()
+    if row:
+        return row
+    row = AccountUsage(accountId=account_id, category=category, size=0, count=0)
+    try:
+        with session.begin_nested():
+            session.add(row)
+    except IntegrityError:
+        # created concurrently by another writer
+        return _locked_row(session, account_id, category)
+    return row
+
+
+def add_usage(session: Session, file_obj: FileModel):
+    row = _locked_row(session, file_obj.accountId, file_category(file_obj.type))
+    row.size += file_obj.size or 0
+    row.count += 1
+    if file_obj.createdAt and (row.latestDate is None or _aware(file_obj.createdAt) > _aware(row.latestDate)):
+        row.latestDate = file_obj.createdAt
+    session.add(row)
+
+
+def remove_usage(session: Session, file_obj: FileModel):
+    """Call after session.delete(file_obj), before commit."""
+    category = file_category(file_obj.type)
+    row = _locked_row(session, file_obj.accountId, category)
+    row.size = max(row.size - (file_obj.size or 0), 0)
+    row.count = max(row.count - 1, 0)
+    if row.latestDate is not None and _aware(file_obj.createdAt) == _aware(row.latestDate):
+        # the newest file went away; find the next newest through (accountId, createdAt)
+        session.flush()
+        row.latestDate = session.exec(
+            select(func.max(FileModel.createdAt)).where(
+                FileModel.accountId == file_obj.accountId,
+                category_expr() == category
+            )
+        ).first()
+    session.add(row)
+
+
+def usage_summary(session: Session, account_id: str) -> dict:
+    summary = {c: {"size": 0, "latestDate": None} for c in CATEGORIES + ("other",)}
+    summary["used"] = 0
+    rows = session.exec(select(AccountUsage).where(AccountUsage.accountId == account_id)).all()
+    for row in rows:
+        summary[row.category] = {
+            "size": row.size,
+            "latestDate": row.latestDate.isoformat() if row.latestDate else None,
+        }
+        summary["used"] += row.size
+    return summary
+
+
+def used_bytes(session: Session, account_id: str) -> int:
+    return session.exec(
+        select(func.coalesce(func.sum(AccountUsage.size), 0)).where(AccountUsage.accountId == account_id)
+    ).one()
+
+
+def remaining_quota(session: Session, account_id: str) -> Optional[int]:
+    """Bytes this account may still upload, or None when quotas are off."""
+    if ACCOUNT_QUOTA_BYTES <= 0:
+        return None
+    return max(ACCOUNT_QUOTA_BYTES - used_bytes(session, account_id), 0)
+
+
+def recompute_usage(session: Session, account_id: Optional[str] = None) -> int:
+    """Rebuild counters with one GROUP BY over files. Returns rows written."""
+    category = category_expr().label("category")
+    query = select(
+        FileModel.accountId,
+        category,
+        func.coalesce(func.sum(FileModel.size), 0),
+        func.count(),
+        func.max(FileModel.createdAt),
+    ).group_by(FileModel.accountId, category)
+    clear = delete(AccountUsage)
+    if account_id:
+        query = query.where(FileModel.accountId == account_id)
+        clear = clear.where(AccountUsage.accountId == account_id)
+
+    rows = session.exec(query).all()
+    session.exec(clear)
+    for acc, cat, size, count, latest in rows:
+        session.add(AccountUsage(accountId=acc, category=cat, size=size, count=count, latestDate=latest))
+    session.commit()
+    return len(rows)
+
+
+def backfill_usage_if_empty(session: Session):
+    # first start after the counters were introduced
+    has_counters = session.exec(select(AccountUsage.accountId).limit(1)).first()
+    has_files = session.exec(select(FileModel.id).limit(1)).first()
+    if has_files and not has_counters:
+        recompute_usage(session)
+
+
+if __name__ == "__main__":
+    from ..db import engine
+
+    account = sys.argv[1] if len(sys.argv) > 1 else None
+    with Session(engine) as session:
+        written = recompute_usage(session, account)
+    print(f"Usage recomputed: {written} rows")
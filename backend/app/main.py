@@ -5,24 +5,52 @@ load_dotenv()
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from fastapi.staticfiles import StaticFiles
-from .db import init_db
+from sqlmodel import Session
+from .db import init_db, engine, dispose_engines
+from .utils.mailer import start_email_worker, stop_email_worker
+from .utils.maintenance import start_maintenance, stop_maintenance
+from .utils.metrics import MetricsMiddleware, metrics_endpoint
+from .utils.response import FastJSONResponse
 
 # routers
 from .auth.google import router as google_router
+from .auth.google_keys import google_keys
 from .auth.router import router as auth_router
 from .users.router import router as users_router
-from .files.router import router as files_router
+from .files.router import router as files_router, uploads_router
+from .files.resumable import router as resumable_router, purge_expired_uploads
+from .files.batch import router as batch_router
+from .files.usage import backfill_usage_if_empty
+from .files.access import migrate_json_shares
+from .files.search import ensure_search_index
+from .files.admission import AdmissionMiddleware
+from .files.thumbnails import shutdown_pool as shutdown_thumbnail_pool
 from .sessions.router import router as sessions_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    ensure_search_index(engine)
+    with Session(engine) as session:
+        backfill_usage_if_empty(session)
+        migrate_json_shares(session)
+    start_email_worker(engine)
+    start_maintenance(engine, [purge_expired_uploads])
+    google_keys.start_background_refresh()
     print("Database initialized and app started.")
     yield
+    stop_maintenance()
+    stop_email_worker()
+    google_keys.stop()
+    shutdown_thumbnail_pool()
+    await dispose_engines()
     print("App shutdown complete.")
 
-app = FastAPI(title="MyDrive Backend", lifespan=lifespan)
+app = FastAPI(title="MyDrive Backend", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# innermost: rejected transfers still show up in metrics and get CORS headers
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,11 +63,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
 # order matters: mount google first (prefix /auth/google) then /auth
 app.include_router(google_router, prefix="/auth/google", tags=["auth_google"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(users_router, prefix="/users", tags=["users"])
+app.include_router(resumable_router, prefix="/files/uploads", tags=["files"])
+app.include_router(batch_router, prefix="/files/batch", tags=["files"])
 app.include_router(files_router, prefix="/files", tags=["files"])
+app.include_router(uploads_router, prefix="/uploads", tags=["files"])
 app.include_router(sessions_router, prefix="/sessions", tags=["sessions"])
+
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -1,7 +1,7 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 import datetime
-from sqlalchemy import Column, ARRAY, String, JSON
+from sqlalchemy import Column, ARRAY, String, JSON, Index, UniqueConstraint
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
@@ -17,8 +17,27 @@ class User(SQLModel, table=True):
     files: List["File"] = Relationship(back_populates="owner")
 
 
+class Blob(SQLModel, table=True):
+    __tablename__ = "blobs"
+
+    hash: str = Field(primary_key=True)  # sha256 hex
+    size: int
+    refCount: int = 0
+    storedSize: Optional[int] = None  # bytes in storage; differs from size when compressed
+    contentEncoding: Optional[str] = None  # None (stored as is) or "zstd"
+    createdAt: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
 class File(SQLModel, table=True):
     __tablename__ = "files"
+    __table_args__ = (
+        # keyset pagination / filtering for list_files
+        Index("ix_files_account_created", "accountId", "createdAt", "id"),
+        Index("ix_files_account_name", "accountId", "name", "id"),
+        Index("ix_files_account_size", "accountId", "size", "id"),
+        Index("ix_files_account_type", "accountId", "type"),
+        Index("ix_files_account_extension", "accountId", "extension"),
+    )
 
     id: Optional[str] = Field(default=None, primary_key=True)
     name: str
@@ -29,6 +48,11 @@ class File(SQLModel, table=True):
 
     extension: Optional[str] = None
     size: Optional[int] = None
+    checksum: Optional[str] = None  # sha256 hex of the content
+    blobHash: Optional[str] = Field(default=None, foreign_key="blobs.hash", index=True)
+    # how the blob is stored (mirrors Blob); size and checksum are of the original content
+    storedSize: Optional[int] = None
+    contentEncoding: Optional[str] = None
 
     users: List[str] = Field(default_factory=list, sa_column=Column(JSON))
 
@@ -37,6 +61,9 @@ class File(SQLModel, table=True):
         default=None, sa_column=Column(String, unique=True, index=True)
     )
 
+    # bumped to revoke every signed download link issued for this file
+    linkGeneration: Optional[int] = None
+
     createdAt: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
     updatedAt: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
 
@@ -44,20 +71,83 @@ class File(SQLModel, table=True):
     owner: Optional[User] = Relationship(back_populates="files")
 
 
+class FileShare(SQLModel, table=True):
+    __tablename__ = "file_shares"
+    __table_args__ = (
+        UniqueConstraint("file_id", "grantee_email", name="uq_file_shares_file_email"),
+        # "shared with me", newest first
+        Index("ix_file_shares_email_id", "grantee_email", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: str = Field(foreign_key="files.id", index=True)
+    grantee_email: str  # lowercased
+    grantee_user_id: Optional[str] = Field(default=None, foreign_key="users.id", index=True)
+    role: str = "viewer"
+    createdAt: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+class AccountUsage(SQLModel, table=True):
+    __tablename__ = "account_usage"
+
+    accountId: str = Field(primary_key=True)
+    category: str = Field(primary_key=True)  # document | image | video | audio | other
+    size: int = 0
+    count: int = 0
+    latestDate: Optional[datetime.datetime] = None
+
+
 class SessionModel(SQLModel, table=True):
     __tablename__ = "sessions"
 
     id: Optional[str] = Field(default=None, primary_key=True)
-    user_id: str = Field(foreign_key="users.id")
-    token: str
-    expires_at: datetime.datetime
+    user_id: str = Field(foreign_key="users.id", index=True)
+    token: str = Field(index=True)
+    expires_at: datetime.datetime = Field(index=True)
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
 
 
 class OTP(SQLModel, table=True):
     __tablename__ = "otp"
+    __table_args__ = (
+        # verify-otp lookup
+        Index("ix_otp_user_code", "user_id", "code"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str
     code: str
-    expires_at: datetime.datetime
+    expires_at: datetime.datetime = Field(index=True)
+
+
+class UploadSession(SQLModel, table=True):
+    __tablename__ = "upload_sessions"
+
+    id: Optional[str] = Field(default=None, primary_key=True)
+    user_id: str = Field(foreign_key="users.id", index=True)
+    accountId: str
+    name: str
+    type: str
+    length: int
+    offset: int = 0
+    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    expires_at: datetime.datetime = Field(index=True)
+
+
+class EmailJob(SQLModel, table=True):
+    __tablename__ = "email_jobs"
+    __table_args__ = (
+        Index("ix_email_jobs_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    to_email: str
+    subject: str
+    body: str
+    status: str = "pending"  # pending | sending | sent | failed
+    attempts: int = 0
+    next_attempt_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    claimed_at: Optional[datetime.datetime] = None
+    sent_at: Optional[datetime.datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr
+import datetime
+from typing import Any, Generic, List, Optional, TypeVar
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 class RegisterIn(BaseModel):
     fullname: str
@@ -10,3 +12,64 @@ class LoginIn(BaseModel):
 class VerifyOTPIn(BaseModel):
     accountId: str
     passcode: str
+
+
+# Response models. Routes declare Envelope[...] with response_model_exclude_unset=True:
+# success() leaves `error` unset and error() leaves `data` unset, so both keep the
+# envelope they always had, and payloads are serialized by pydantic instead of
+# jsonable_encoder walking every ORM object.
+T = TypeVar("T")
+
+class Envelope(BaseModel, Generic[T]):
+    code: int
+    success: bool
+    message: str
+    data: Optional[T] = None
+    error: Optional[Any] = None
+
+class FileOut(BaseModel):
+    # same keys as File; all optional so ?fields= projections validate too
+    model_config = ConfigDict(from_attributes=True)
+
+    id: Optional[str] = None
+    name: Optional[str] = None
+    url: Optional[str] = None
+    type: Optional[str] = None
+    bucketFileId: Optional[str] = None
+    accountId: Optional[str] = None
+    extension: Optional[str] = None
+    size: Optional[int] = None
+    checksum: Optional[str] = None
+    blobHash: Optional[str] = None
+    storedSize: Optional[int] = None
+    contentEncoding: Optional[str] = None
+    users: Optional[List[str]] = None
+    shareToken: Optional[str] = None
+    linkGeneration: Optional[int] = None
+    createdAt: Optional[datetime.datetime] = None
+    updatedAt: Optional[datetime.datetime] = None
+    owner_id: Optional[str] = None
+
+class SharedFileOut(FileOut):
+    role: str
+
+class SearchFileOut(FileOut):
+    access: str  # owner | shared-user
+
+class FilePage(BaseModel, Generic[T]):
+    documents: List[T]
+    total: int = Field(description="Number of documents matching the query, across all pages")
+    nextCursor: Optional[str] = None
+    hasMore: bool
+
+class RenamedFile(BaseModel):
+    file: FileOut
+
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    fullName: str
+    email: str
+    avatar: Optional[str] = None
+    accountId: str
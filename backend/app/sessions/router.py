@@ -1,12 +1,13 @@
 # app/sessions/router.py
 from fastapi import APIRouter, Depends
+from ..schemas import Envelope, UserOut
 from ..utils.response import success
-from ..utils.auth_utils import require_auth
+from ..utils.auth_utils import require_auth_async
 
 router = APIRouter()
 
-@router.get("/me")
-def get_me(user = Depends(require_auth)):
+@router.get("/me", response_model=Envelope[UserOut], response_model_exclude_unset=True)
+async def get_me(user = Depends(require_auth_async)):
     return success(
         data={
             "id": user.id,
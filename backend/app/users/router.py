@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends
 from ..auth.jwt_handler import require_auth
+from ..schemas import Envelope, UserOut
 from ..utils.response import success, error
 
 router = APIRouter()
 
-@router.get("/me")
+@router.get("/me", response_model=Envelope[UserOut], response_model_exclude_unset=True)
 def me(user = Depends(require_auth)):
     if not user:
         return error(
@@ -0,0 +1,214 @@
+# app/utils/auth_cache.py
+# Cache of session -> (user, session expiry) shared by both require_auth
+# dependencies, so an authenticated request normally costs no DB round trip.
+# Each dependency has its own key space: auth_utils caches by session id
+# (session_key), jwt_handler by the verified JWT (token_key), so an entry stored
+# by one is never taken as proof by the other.
+#
+# Entries live for at most AUTH_CACHE_TTL seconds (never past the session expiry)
+# and are dropped when the session row is deleted or the user row changes - once
+# that change commits, so a request reading the old row in between cannot put
+# the stale user back.
+# The default backend is per process; set AUTH_CACHE_URL=redis://... to share one
+# cache (and its invalidations) between uvicorn workers.
+import os, json, time, datetime, threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from ..models import User, SessionModel
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_URL = os.getenv("AUTH_CACHE_URL")
+
+
+class MemoryBackend:
+    """Bounded LRU with per-entry deadlines."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (deadline, value)
+        self._by_user = {}  # user_id -> {keys}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return None
+            deadline, value = item
+            if deadline < time.monotonic():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: float):
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._by_user.setdefault(value["user"]["id"], set()).add(key)
+            while len(self._data) > self.max_size:
+                self._drop(next(iter(self._data)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._drop(key)
+
+    def delete_user(self, user_id: str):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def _drop(self, key: str):
+        item = self._data.pop(key, None)
+        if item:
+            keys = self._by_user.get(item[1]["user"]["id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[item[1]["user"]["id"]]
+
+
+class RedisBackend:
+    """Shared backend; needs the optional `redis` package."""
+
+    PREFIX = "mydrive:auth:"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self._redis.get(self.PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict, ttl: float):
+        user_key = f"{self.PREFIX}user:{value['user']['id']}"
+        pipe = self._redis.pipeline()
+        pipe.set(self.PREFIX + key, json.dumps(value, default=str), ex=max(int(ttl), 1))
+        pipe.sadd(user_key, key)
+        pipe.expire(user_key, max(int(ttl), 1))
+        pipe.execute()
+
+    def delete(self, key: str):
+        self._redis.delete(self.PREFIX + key)
+
+    def delete_user(self, user_id: str):
+        user_key = f"{self.PREFIX}user:{user_id}"
+        keys = [self.PREFIX + k.decode() for k in self._redis.smembers(user_key)]
+        self._redis.delete(user_key, *keys)
+
+
+_backend = RedisBackend(AUTH_CACHE_URL) if AUTH_CACHE_URL else MemoryBackend(AUTH_CACHE_SIZE)
+
+
+def _aware(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+# fields stored as ISO strings in the cached JSON, parsed back on the way out
+_DATETIME_FIELDS = tuple(
+    name for name, field in User.model_fields.items()
+    if field.annotation in (datetime.datetime, Optional[datetime.datetime])
+)
+
+
+def _load_user(data: dict) -> User:
+    data = dict(data)
+    for name in _DATETIME_FIELDS:
+        if isinstance(data.get(name), str):
+            data[name] = datetime.datetime.fromisoformat(data[name])
+    return User.model_validate(data)
+
+
+def session_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def token_key(token: str) -> str:
+    return f"jwt:{token}"
+
+
+def get_cached_user(key: str) -> Optional[Tuple[User, datetime.datetime]]:
+    if AUTH_CACHE_TTL <= 0:
+        return None
+    value = _backend.get(key)
+    if not value:
+        return None
+    expires_at = _aware(datetime.datetime.fromisoformat(value["expires_at"]))
+    if expires_at < datetime.datetime.now(datetime.timezone.utc):
+        _backend.delete(key)
+        return None
+    return _load_user(value["user"]), expires_at
+
+
+def cache_user(key: str, user: User, expires_at: datetime.datetime):
+    if AUTH_CACHE_TTL <= 0:
+        return
+    expires_at = _aware(expires_at)
+    remaining = (expires_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    ttl = min(AUTH_CACHE_TTL, remaining)
+    if ttl <= 0:
+        return
+    value = {"user": user.model_dump(mode="json"), "expires_at": expires_at.isoformat()}
+    _backend.set(key, value, ttl)
+
+
+def invalidate_session(session_id: str, token: Optional[str] = None):
+    _backend.delete(session_key(session_id))
+    if token:
+        _backend.delete(token_key(token))
+
+
+def invalidate_user(user_id: str):
+    _backend.delete_user(user_id)
+
+
+# keep the cache honest whenever rows change through the ORM: the flush records
+# what to drop on the session, the commit drops it, a rollback forgets it
+_PENDING = "auth_cache_pending"
+
+
+def _defer(target, *keys):
+    session = object_session(target)
+    if session is None:
+        for kind, value in keys:
+            _invalidate(kind, value)
+        return
+    session.info.setdefault(_PENDING, set()).update(keys)
+
+
+def _invalidate(kind: str, value: str):
+    if kind == "user":
+        invalidate_user(value)
+    else:
+        _backend.delete(value)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    _defer(target, ("user", target.id))
+
+
+@event.listens_for(SessionModel, "after_delete")
+def _session_deleted(mapper, connection, target):
+    keys = [("key", session_key(target.id))]
+    if target.token:
+        keys.append(("key", token_key(target.token)))
+    _defer(target, *keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for kind, value in session.info.pop(_PENDING, ()):
+        _invalidate(kind, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
@@ -4,32 +4,81 @@ from sqlmodel import Session, select
 from typing import Tuple, Optional
 import datetime
 
-from ..db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db import get_session, get_async_session, get_async_engine
 from ..models import SessionModel, User
 from .response import error
+from .auth_cache import get_cached_user, cache_user, session_key
 
-def get_user_from_cookie(request: Request, db: Session) -> Tuple[Optional[User], Optional[dict]]:
-    token = request.cookies.get("session")
-    if not token:
-        return None, error("Not authenticated", 401, {"code": "AUTH_REQUIRED"})
+def _aware(value: datetime.datetime) -> datetime.datetime:
+    # DB drivers hand back naive datetimes for timestamp columns; they are stored as UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
 
-    sess = db.exec(select(SessionModel).where(SessionModel.id == token)).first()
+def _session_user_query(token: str):
+    # session + user in one round trip
+    return (
+        select(SessionModel, User)
+        .join(User, User.id == SessionModel.user_id, isouter=True)
+        .where(SessionModel.id == token)
+    )
 
-    if not sess:
+def _check_session_row(token: str, row) -> Tuple[Optional[User], Optional[dict]]:
+    if not row:
         return None, error("Invalid session", 401, {"code": "INVALID_SESSION"})
+    sess, user = row
 
-    if sess.expires_at < datetime.datetime.now(datetime.timezone.utc):
+    if _aware(sess.expires_at) < datetime.datetime.now(datetime.timezone.utc):
         return None, error("Session expired", 401, {"code": "SESSION_EXPIRED"})
 
-    user = db.exec(select(User).where(User.id == sess.user_id)).first()
     if not user:
         return None, error("User not found", 404, {"code": "USER_NOT_FOUND"})
 
+    cache_user(session_key(token), user, sess.expires_at)
     return user, None
 
+def get_user_from_cookie(request: Request, db: Session) -> Tuple[Optional[User], Optional[dict]]:
+    token = request.cookies.get("session")
+    if not token:
+        return None, error("Not authenticated", 401, {"code": "AUTH_REQUIRED"})
+
+    cached = get_cached_user(session_key(token))
+    if cached:
+        return cached[0], None
+
+    return _check_session_row(token, db.exec(_session_user_query(token)).first())
+
+async def get_user_from_cookie_async(request: Request, db: AsyncSession) -> Tuple[Optional[User], Optional[dict]]:
+    token = request.cookies.get("session")
+    if not token:
+        return None, error("Not authenticated", 401, {"code": "AUTH_REQUIRED"})
+
+    cached = get_cached_user(session_key(token))
+    if cached:
+        return cached[0], None
+
+    return _check_session_row(token, (await db.exec(_session_user_query(token))).first())
+
+async def session_user_async(token: str) -> Optional[User]:
+    """The user behind a valid session id (cached, else one query), or None."""
+    cached = get_cached_user(session_key(token))
+    if cached:
+        return cached[0]
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as db:
+        user, _ = _check_session_row(token, (await db.exec(_session_user_query(token))).first())
+    return user
+
 def require_auth(request: Request, db: Session = Depends(get_session)) -> User:
     user, err = get_user_from_cookie(request, db)
     if err:
         # Raise HTTPException with the error dict in detail → frontend will receive consistent payload
         raise HTTPException(status_code=err.get("code", 401), detail=err)
     return user
+
+# Same as require_auth for `async def` routes: runs on the event loop with the async engine.
+async def require_auth_async(request: Request, db: AsyncSession = Depends(get_async_session)) -> User:
+    user, err = await get_user_from_cookie_async(request, db)
+    if err:
+        raise HTTPException(status_code=err.get("code", 401), detail=err)
+    return user
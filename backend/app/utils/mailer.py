@@ -0,0 +1,210 @@
+# app/utils/mailer.py
+# Outbound email goes through the email_jobs table: request handlers enqueue a
+# row in their own transaction and return, a small pool of worker threads
+# delivers it through one shared transport and retries failures with backoff.
+#
+# MAIL_TRANSPORT picks the transport: sendgrid (default when SENDGRID_API_KEY
+# is set), smtp (SMTP_HOST/SMTP_PORT/..., e.g. a local debugging server) or
+# console (prints the message; default without a SendGrid key).
+import os, smtplib, threading, datetime
+from email.message import EmailMessage
+from typing import List, Optional
+from sqlmodel import Session, select
+from sqlalchemy import update, or_, and_
+from ..models import EmailJob
+
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+SENDGRID_FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL")
+SENDGRID_FROM_NAME = os.getenv("SENDGRID_FROM_NAME", "MyDrive App")
+
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "sendgrid" if SENDGRID_API_KEY else "console").lower()
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "5"))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "10"))
+MAIL_RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX_SECONDS", "900"))
+# a job left in "sending" this long (worker crashed mid-send) is retried
+MAIL_STALE_SECONDS = float(os.getenv("MAIL_STALE_SECONDS", "600"))
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class SendGridTransport:
+    def __init__(self):
+        from sendgrid import SendGridAPIClient
+        self._client = SendGridAPIClient(SENDGRID_API_KEY)
+
+    def send(self, to_email: str, subject: str, body: str):
+        from sendgrid.helpers.mail import Mail
+        message = Mail(
+            from_email=(SENDGRID_FROM_EMAIL, SENDGRID_FROM_NAME),
+            to_emails=to_email,
+            subject=subject,
+            plain_text_content=body
+        )
+        response = self._client.send(message)
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid returned {response.status_code}")
+
+
+class SMTPTransport:
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "localhost")
+        self.port = int(os.getenv("SMTP_PORT", "1025"))
+        self.username = os.getenv("SMTP_USERNAME")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.starttls = os.getenv("SMTP_STARTTLS", "0") == "1"
+        self.from_email = os.getenv("SMTP_FROM_EMAIL", SENDGRID_FROM_EMAIL or "no-reply@localhost")
+
+    def send(self, to_email: str, subject: str, body: str):
+        message = EmailMessage()
+        message["From"] = self.from_email
+        message["To"] = to_email
+        message["Subject"] = subject
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+
+class ConsoleTransport:
+    def send(self, to_email: str, subject: str, body: str):
+        print(f"[MAIL] to={to_email} subject={subject!r}: {body}")
+
+
+def build_transport():
+    if MAIL_TRANSPORT == "sendgrid":
+        return SendGridTransport()
+    if MAIL_TRANSPORT == "smtp":
+        return SMTPTransport()
+    if MAIL_TRANSPORT == "console":
+        return ConsoleTransport()
+    raise ValueError(f"Unknown MAIL_TRANSPORT: {MAIL_TRANSPORT}")
+
+
+def enqueue_email(session: Session, to_email: str, subject: str, body: str) -> EmailJob:
+    """Add a job to the caller's transaction; it is picked up after commit."""
+    job = EmailJob(to_email=to_email, subject=subject, body=body, status="pending", next_attempt_at=_now())
+    session.add(job)
+    return job
+
+
+def enqueue_otp_email(session: Session, to_email: str, code: str) -> EmailJob:
+    return enqueue_email(session, to_email, "Your OTP Code", f"Your OTP code is: {code}")
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(MAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), MAIL_RETRY_MAX_SECONDS))
+
+
+class EmailWorker:
+    def __init__(self, engine, transport=None, workers: int = MAIL_WORKERS):
+        self.engine = engine
+        self.transport = transport
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self.transport is None:
+            self.transport = build_transport()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception as e:
+                print("[MAIL] worker error", e)
+                processed = 0
+            if processed == 0:
+                self._wake.wait(MAIL_POLL_SECONDS)
+                self._wake.clear()
+
+    def _claim(self, session: Session) -> List[EmailJob]:
+        now = _now()
+        stale = now - datetime.timedelta(seconds=MAIL_STALE_SECONDS)
+        due = or_(
+            and_(EmailJob.status == "pending", EmailJob.next_attempt_at <= now),
+            and_(EmailJob.status == "sending", EmailJob.claimed_at < stale),
+        )
+        candidates = session.exec(
+            select(EmailJob.id).where(due).order_by(EmailJob.next_attempt_at).limit(MAIL_BATCH_SIZE)
+        ).all()
+        claimed = []
+        for job_id in candidates:
+            # conditional update so two workers (or processes) never take the same job
+            result = session.exec(
+                update(EmailJob)
+                .where(EmailJob.id == job_id, due)
+                .values(status="sending", claimed_at=now)
+            )
+            if result.rowcount:
+                claimed.append(job_id)
+        session.commit()
+        if not claimed:
+            return []
+        return session.exec(select(EmailJob).where(EmailJob.id.in_(claimed))).all()
+
+    def process_batch(self) -> int:
+        with Session(self.engine) as session:
+            jobs = self._claim(session)
+            for job in jobs:
+                job.attempts += 1
+                try:
+                    self.transport.send(job.to_email, job.subject, job.body)
+                    job.status = "sent"
+                    job.sent_at = _now()
+                    job.last_error = None
+                except Exception as e:
+                    job.last_error = str(e)[:500]
+                    if job.attempts >= MAIL_MAX_ATTEMPTS:
+                        job.status = "failed"
+                    else:
+                        job.status = "pending"
+                        job.next_attempt_at = _now() + retry_delay(job.attempts)
+                    print("[MAIL] delivery failed", job.id, job.attempts, e)
+                session.add(job)
+                session.commit()
+            return len(jobs)
+
+
+_worker: Optional[EmailWorker] = None
+
+
+def start_email_worker(engine) -> EmailWorker:
+    global _worker
+    _worker = EmailWorker(engine)
+    _worker.start()
+    return _worker
+
+
+def stop_email_worker():
+    if _worker:
+        _worker.stop()
+
+
+def notify_email_worker():
+    if _worker:
+        _worker.notify()
@@ -0,0 +1,124 @@
+# app/utils/maintenance.py
+# Background sweeper for rows that only ever expire: sessions, OTP codes, upload
+# sessions, delivered email jobs. Every task deletes at most `limit` rows per
+# call and the scheduler repeats it up to MAINTENANCE_MAX_BATCHES times per
+# tick, so one pass never holds long locks or one huge transaction.
+#
+# Tasks are plain `task(session, limit) -> rows_removed` callables; deletes are
+# idempotent, so several app processes can each run a scheduler.
+import os, threading, datetime
+from typing import Callable, List, Optional
+from sqlmodel import Session, select
+from sqlalchemy import delete
+from ..models import SessionModel, OTP, EmailJob
+from .auth_cache import invalidate_session
+
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "1000"))
+MAINTENANCE_MAX_BATCHES = int(os.getenv("MAINTENANCE_MAX_BATCHES", "20"))
+# sent / failed email jobs are kept this long for troubleshooting
+EMAIL_JOB_RETENTION_DAYS = int(os.getenv("EMAIL_JOB_RETENTION_DAYS", "7"))
+
+Task = Callable[[Session, int], int]
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def purge_expired_sessions(session: Session, limit: int = MAINTENANCE_BATCH_SIZE) -> int:
+    rows = session.exec(
+        select(SessionModel.id, SessionModel.token).where(SessionModel.expires_at < _now()).limit(limit)
+    ).all()
+    if not rows:
+        return 0
+    session.exec(delete(SessionModel).where(SessionModel.id.in_([row[0] for row in rows])))
+    session.commit()
+    # bulk deletes bypass the ORM after_delete hook that normally does this
+    for session_id, token in rows:
+        invalidate_session(session_id, token)
+    return len(rows)
+
+
+def purge_expired_otps(session: Session, limit: int = MAINTENANCE_BATCH_SIZE) -> int:
+    ids = session.exec(select(OTP.id).where(OTP.expires_at < _now()).limit(limit)).all()
+    if not ids:
+        return 0
+    session.exec(delete(OTP).where(OTP.id.in_(ids)))
+    session.commit()
+    return len(ids)
+
+
+def purge_finished_email_jobs(session: Session, limit: int = MAINTENANCE_BATCH_SIZE) -> int:
+    cutoff = _now() - datetime.timedelta(days=EMAIL_JOB_RETENTION_DAYS)
+    ids = session.exec(
+        select(EmailJob.id).where(EmailJob.status.in_(("sent", "failed")), EmailJob.created_at < cutoff).limit(limit)
+    ).all()
+    if not ids:
+        return 0
+    session.exec(delete(EmailJob).where(EmailJob.id.in_(ids)))
+    session.commit()
+    return len(ids)
+
+
+class MaintenanceScheduler:
+    def __init__(self, engine, tasks: List[Task], interval: float = MAINTENANCE_INTERVAL_SECONDS):
+        self.engine = engine
+        self.tasks = tasks
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def run_once(self) -> dict:
+        removed = {}
+        for task in self.tasks:
+            total = 0
+            try:
+                for _ in range(MAINTENANCE_MAX_BATCHES):
+                    if self._stop.is_set():
+                        break
+                    with Session(self.engine) as session:
+                        count = task(session, MAINTENANCE_BATCH_SIZE)
+                    total += count
+                    if count < MAINTENANCE_BATCH_SIZE:
+                        break
+            except Exception as e:
+                print("[MAINTENANCE] task failed", task.__name__, e)
+            removed[task.__name__] = total
+            if total:
+                print(f"[MAINTENANCE] {task.__name__}: removed {total}")
+        return removed
+
+
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def start_maintenance(engine, extra_tasks: List[Task] = ()) -> MaintenanceScheduler:
+    global _scheduler
+    tasks = [purge_expired_sessions, purge_expired_otps, purge_finished_email_jobs, *extra_tasks]
+    _scheduler = MaintenanceScheduler(engine, tasks)
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_maintenance():
+    if _scheduler:
+        _scheduler.stop()
@@ -0,0 +1,186 @@
+# app/utils/metrics.py
+# Prometheus metrics for /metrics plus per-request SQL accounting.
+#
+# MetricsMiddleware (plain ASGI, so streaming bodies are not buffered) records
+# latency per route template, requests in flight, and bytes received/sent.
+# SQL statements are counted through engine events on every SQLAlchemy Engine
+# (the sync engine and the async engine's sync_engine alike) and attributed to
+# the current request through a contextvar.
+#
+# SLOW_REQUEST_MS > 0 logs requests slower than that with their statements
+# grouped by SQL text, which makes N+1 patterns stand out.
+# With PROMETHEUS_MULTIPROC_DIR set, /metrics aggregates all uvicorn workers.
+import os, time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_TOP_STATEMENTS = 10
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being served", ["method"], multiprocess_mode="livesum",
+)
+REQUEST_BYTES = Counter("http_request_body_bytes_total", "Request body bytes received", ["route"])
+RESPONSE_BYTES = Counter("http_response_body_bytes_total", "Response body bytes sent", ["route"])
+# file content moving through the app; rate() of this is the transfer throughput
+TRANSFER_BYTES = Counter("file_transfer_bytes_total", "File bytes uploaded / downloaded", ["direction"])
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed")
+DB_SECONDS = Counter("db_statement_seconds_total", "Time spent executing SQL statements")
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250),
+)
+DB_SECONDS_PER_REQUEST = Histogram(
+    "db_seconds_per_request", "SQL time per request", ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# routes whose request (upload) / response (download) bodies are file content
+TRANSFER_ROUTES = {
+    ("POST", "/files/upload"): "upload",
+    ("POST", "/files/upload/stream"): "upload",
+    ("PATCH", "/files/uploads/{upload_id}"): "upload",
+    ("GET", "/files/download/{file_id}"): "download",
+    ("POST", "/files/download/zip"): "download",
+    ("GET", "/files/signed/{file_id}"): "download",
+    ("GET", "/uploads/{account_id}/{bucket_file_id}"): "download",
+}
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self, keep_statements: bool):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0]) if keep_statements else None
+
+    def add(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        if self.statements is not None:
+            entry = self.statements[" ".join(statement.split())]
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    DB_STATEMENTS.inc()
+    DB_SECONDS.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, elapsed)
+
+
+def _route_template(scope) -> str:
+    """Full path template of the matched route (e.g. /files/download/{file_id}),
+    which keeps label cardinality bounded. The matched route may only know its path
+    relative to the router prefix, so the prefix is recovered from the real path."""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    concrete = template
+    for name, value in (scope.get("path_params") or {}).items():
+        concrete = concrete.replace("{" + name + "}", str(value))
+    path = scope["path"]
+    if path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + template
+    return template
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = QueryStats(keep_statements=SLOW_REQUEST_MS > 0)
+        token = _current.set(stats)
+        received = 0
+        sent = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            _current.reset(token)
+            route = _route_template(scope)
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUEST_BYTES.labels(route).inc(received)
+            RESPONSE_BYTES.labels(route).inc(sent)
+            DB_STATEMENTS_PER_REQUEST.labels(route).observe(stats.count)
+            DB_SECONDS_PER_REQUEST.labels(route).observe(stats.seconds)
+            direction = TRANSFER_ROUTES.get((method, route))
+            if direction:
+                TRANSFER_BYTES.labels(direction).inc(received if direction == "upload" else sent)
+            if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow(method, scope["path"], route, status, elapsed, stats)
+
+
+def _log_slow(method: str, path: str, route: str, status: int, elapsed: float, stats: QueryStats):
+    print(
+        f"[SLOW] {method} {path} ({route}) -> {status} in {elapsed * 1000:.1f} ms; "
+        f"{stats.count} SQL statements, {stats.seconds * 1000:.1f} ms in SQL"
+    )
+    top = sorted(stats.statements.items(), key=lambda item: -item[1][1])[:SLOW_REQUEST_TOP_STATEMENTS]
+    for statement, (count, seconds) in top:
+        print(f"[SLOW]   {count}x {seconds * 1000:.1f} ms  {statement[:300]}")
+
+
+def metrics_endpoint(request: Request) -> Response:
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,5 +1,11 @@
 # app/utils/response.py
 from typing import Any, Optional, Dict
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
 
 def success(data: Optional[Any] = None, message: str = "OK", code: int = 200) -> Dict:
     return {
@@ -16,3 +22,11 @@ def error(message: str = "Error", code: int = 400, err: Optional[Any] = None) ->
         "message": message,
         "error": err or {}
     }
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson when installed (several times faster than json.dumps)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
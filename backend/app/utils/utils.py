@@ -1,17 +1,12 @@
 import os, jwt, datetime
 from dotenv import load_dotenv
 load_dotenv()
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 
-JWT_SECRET = os.getenv("JWT_SECRET", "3583673n375b80b653t7535v83t68v3b68v3b68v3b68v3b")
+DEFAULT_JWT_SECRET = "3583673n375b80b653t7535v83t68v3b68v3b68v3b68v3b"
+JWT_SECRET = os.getenv("JWT_SECRET", DEFAULT_JWT_SECRET)
 JWT_ALGO = os.getenv("JWT_ALGO", "HS256")
 JWT_EXPIRES_DAYS = int(os.getenv("JWT_EXPIRES_DAYS", "7"))
 
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-SENDGRID_FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL")
-SENDGRID_FROM_NAME = os.getenv("SENDGRID_FROM_NAME", "MyDrive App")
-
 def create_token(user_id: str):
     payload = {
         "user_id": user_id,
@@ -22,19 +17,3 @@ def create_token(user_id: str):
 
 def verify_token(token: str):
     return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-
-def send_otp_email_sendgrid(to_email: str, code: str):
-    if not SENDGRID_API_KEY:
-        print("[WARN] SendGrid missing. OTP:", code)
-        return
-    message = Mail(
-        from_email=(SENDGRID_FROM_EMAIL, SENDGRID_FROM_NAME),
-        to_emails=to_email,
-        subject="Your OTP Code",
-        plain_text_content=f"Your OTP code is: {code}"
-    )
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        sg.send(message)
-    except Exception as e:
-        print("SendGrid error", e)
\ No newline at end of file
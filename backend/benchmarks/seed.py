@@ -0,0 +1,101 @@
+# benchmarks/seed.py
+# Deterministic dataset for the benchmarks: N accounts, each with a user and a
+# live session (cookie "bench-session-<n>"), and M files spread over them. Files
+# point at a small pool of real blobs on disk so downloads return actual bytes.
+# Rows go in with bulk INSERTs; usage counters are rebuilt afterwards.
+import random, hashlib, datetime
+from dataclasses import dataclass, asdict
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel
+
+TYPES = [
+    ("application/pdf", "pdf"), ("text/plain", "txt"), ("image/jpeg", "jpg"), ("image/png", "png"),
+    ("video/mp4", "mp4"), ("audio/mpeg", "mp3"), ("application/zip", "zip"),
+    ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+]
+INSERT_CHUNK = 5000
+
+
+@dataclass
+class Dataset:
+    accounts: int = 1000
+    files: int = 100_000
+    blobs: int = 64
+    blob_size: int = 64 * 1024
+    seed: int = 1
+
+    def describe(self) -> dict:
+        return asdict(self)
+
+
+def session_cookie(n: int) -> str:
+    return f"bench-session-{n}"
+
+
+def _chunks(rows, size=INSERT_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def seed(engine, dataset: Dataset, reset: bool = True) -> dict:
+    """Create the schema and fill it. Needs the process cwd to be the bench workdir
+    (blob bytes go to uploads/.blobs there)."""
+    from app.db import init_db
+    from app.models import User, SessionModel, Blob, File as FileModel
+    from app.files.storage import blob_storage, new_staging_path
+    from app.files.usage import recompute_usage
+
+    if reset:
+        SQLModel.metadata.drop_all(engine)
+    init_db()
+
+    rng = random.Random(dataset.seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    blobs = []
+    for i in range(dataset.blobs):
+        content = rng.randbytes(dataset.blob_size)
+        digest = hashlib.sha256(content).hexdigest()
+        temp = new_staging_path()
+        with open(temp, "wb") as f:
+            f.write(content)
+        blob_storage.put(digest, temp)
+        blobs.append({"hash": digest, "size": len(content), "refCount": 0, "createdAt": now})
+
+    users, sessions, accounts = [], [], []
+    for n in range(dataset.accounts):
+        user_id = f"bench-user-{n}"
+        account_id = f"bench-account-{n}"
+        accounts.append((user_id, account_id))
+        users.append({
+            "id": user_id, "fullName": f"Bench User {n}", "email": f"bench{n}@example.com",
+            "avatar": None, "accountId": account_id, "createdAt": now, "updatedAt": now,
+        })
+        sessions.append({
+            "id": session_cookie(n), "user_id": user_id, "token": f"bench-token-{n}",
+            "created_at": now, "expires_at": now + datetime.timedelta(days=30),
+        })
+
+    files = []
+    for i in range(dataset.files):
+        user_id, account_id = accounts[i % dataset.accounts]
+        content_type, ext = rng.choice(TYPES)
+        blob = blobs[i % len(blobs)]
+        blob["refCount"] += 1
+        file_id = f"bench-file-{i}"
+        created = now - datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        files.append({
+            "id": file_id, "name": f"file-{i}.{ext}", "url": f"/files/download/{file_id}?inline=1",
+            "type": content_type, "bucketFileId": blob["hash"], "accountId": account_id,
+            "extension": ext, "size": blob["size"], "checksum": blob["hash"], "blobHash": blob["hash"],
+            "users": [], "shareToken": None, "createdAt": created, "updatedAt": created, "owner_id": user_id,
+        })
+
+    with Session(engine) as session:
+        for table, rows in ((Blob, blobs), (User, users), (SessionModel, sessions), (FileModel, files)):
+            for chunk in _chunks(rows):
+                session.execute(insert(table.__table__), chunk)
+        session.commit()
+        recompute_usage(session)
+
+    return {"accounts": dataset.accounts, "files": dataset.files, "blobs": dataset.blobs}
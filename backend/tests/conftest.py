@@ -0,0 +1,62 @@
+# tests/conftest.py
+# The app reads its configuration at import time, so a throwaway SQLite database
+# and upload tree are set up here, before anything from app/ is imported.
+import os, sys, uuid, datetime, tempfile
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix="mydrive-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["MAIL_TRANSPORT"] = "console"
+os.environ["STORAGE_BACKEND"] = "local"
+os.chdir(_WORKDIR)  # uploads/ is relative to the working directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def engine(app):
+    from app.db import engine
+    return engine
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(engine):
+    """Creates a user with a live session; returns (user, session cookie value)."""
+    from sqlmodel import Session
+    from app.models import User, SessionModel
+
+    def make():
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with Session(engine) as session:
+            user = User(id=str(uuid.uuid4()), fullName="Test User", email=f"{uuid.uuid4().hex[:8]}@example.com", accountId=str(uuid.uuid4()))
+            session.add(user)
+            session.commit()
+            session_id = str(uuid.uuid4())
+            session.add(SessionModel(id=session_id, user_id=user.id, token=session_id, expires_at=now + datetime.timedelta(days=1)))
+            session.commit()
+            session.refresh(user)
+            session.expunge(user)
+        return user, session_id
+    return make
+
+
+@pytest.fixture
+def user_client(client, make_user):
+    """`client` logged in as a new user; the user is at `client.user`."""
+    user, session_id = make_user()
+    client.cookies.set("session", session_id)
+    client.user = user
+    return client
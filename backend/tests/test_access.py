@@ -0,0 +1,36 @@
+# tests/test_access.py
+# Moving the old File.users JSON list into file_shares rows.
+from sqlmodel import Session, select, update
+
+from app.files.access import migrate_json_shares, share_with
+from app.models import File as FileModel, FileShare
+
+
+def _upload(client, name):
+    response = client.post(f"/files/upload/stream?name={name}", content=name.encode(), headers={"content-type": "text/plain"})
+    return response.json()["data"]["id"]
+
+
+def _shares(session, file_id):
+    rows = session.exec(select(FileShare).where(FileShare.file_id == file_id)).all()
+    return {row.grantee_email: row.grantee_user_id for row in rows}
+
+
+def test_migrates_per_file(user_client, make_user, engine):
+    grantee, _ = make_user()
+    legacy, already = _upload(user_client, "legacy.txt"), _upload(user_client, "already.txt")
+    with Session(engine) as session:
+        share_with(session, session.get(FileModel, already), "kept@example.com")
+        session.commit()
+        # shares written by a client that only knows the JSON column
+        session.exec(update(FileModel).where(FileModel.id == legacy).values(users=[grantee.email.upper(), "nobody@example.com", ""]))
+        session.exec(update(FileModel).where(FileModel.id == already).values(users=["kept@example.com", "extra@example.com"]))
+        session.commit()
+
+        assert migrate_json_shares(session, batch_size=1) == 2
+        assert _shares(session, legacy) == {grantee.email: grantee.id, "nobody@example.com": None}
+        # a file that has share rows is left as it is
+        assert _shares(session, already) == {"kept@example.com": None}
+
+        # nothing left to do on the next start
+        assert migrate_json_shares(session) == 0
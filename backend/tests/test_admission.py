@@ -0,0 +1,50 @@
+# tests/test_admission.py
+# Which bucket a transfer is counted in: the session's user (cookie or bearer
+# header), else the client address.
+import asyncio, uuid
+from sqlalchemy.exc import OperationalError
+
+from app.files import admission
+from app.files.admission import _client_key
+
+
+def _scope(cookie=None, client=("203.0.113.7", 5000), authorization=None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    if authorization:
+        headers.append((b"authorization", authorization.encode()))
+    return {"type": "http", "headers": headers, "client": client}
+
+
+def _key(scope):
+    return asyncio.run(_client_key(scope))
+
+
+def test_valid_session_is_keyed_on_the_user(user_client):
+    session_id = user_client.cookies.get("session")
+    assert _key(_scope(f"session={session_id}")) == f"user:{user_client.user.id}"
+
+
+def test_unknown_sessions_share_the_client_address(user_client):
+    keys = {_key(_scope(f"session={uuid.uuid4()}")) for _ in range(3)}
+    assert keys == {"ip:203.0.113.7"}
+
+
+def test_no_cookie():
+    assert _key(_scope()) == "ip:203.0.113.7"
+    assert _key(_scope("theme=dark")) == "ip:203.0.113.7"
+    assert _key(_scope(client=None)) == "anonymous"
+
+
+def test_bearer_session_is_keyed_on_the_user(user_client):
+    session_id = user_client.cookies.get("session")
+    assert _key(_scope(authorization=f"Bearer {session_id}")) == f"user:{user_client.user.id}"
+    # a bad bearer token does not hide a valid cookie
+    assert _key(_scope(f"session={session_id}", authorization="Bearer nope")) == f"user:{user_client.user.id}"
+    assert _key(_scope(authorization="Basic abc")) == "ip:203.0.113.7"
+
+
+def test_failed_lookup_falls_back_to_the_address(monkeypatch):
+    async def broken(token):
+        raise OperationalError("SELECT", {}, Exception("database is down"))
+    monkeypatch.setattr(admission, "session_user_async", broken)
+    assert _key(_scope(f"session={uuid.uuid4()}")) == "ip:203.0.113.7"
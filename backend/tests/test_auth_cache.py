@@ -0,0 +1,66 @@
+# tests/test_auth_cache.py
+# The session -> user cache: what comes back out of it, and when ORM changes
+# drop entries (at commit, not at flush).
+import datetime
+from sqlmodel import Session, select
+
+from app.models import SessionModel, User
+from app.utils import auth_cache
+from app.utils.auth_cache import cache_user, get_cached_user, session_key
+
+
+def _cache(user, key):
+    cache_user(key, user, datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1))
+    assert get_cached_user(key)
+
+
+def test_cached_user_keeps_its_types(user_client):
+    user = user_client.user
+    _cache(user, "test:types")
+    cached, expires_at = get_cached_user("test:types")
+    assert isinstance(cached, User)
+    assert cached.id == user.id and cached.email == user.email
+    assert isinstance(cached.createdAt, datetime.datetime)
+    assert cached.createdAt == user.createdAt
+    assert expires_at.tzinfo is not None
+
+
+def test_user_change_invalidates_on_commit(user_client, engine):
+    key = session_key(user_client.cookies.get("session"))
+    with Session(engine) as session:
+        user = session.get(User, user_client.user.id)
+        _cache(user, key)
+        user.fullName = "Renamed"
+        session.add(user)
+        session.flush()
+        # another request may still read the old row until the commit
+        assert get_cached_user(key)
+        session.commit()
+    assert get_cached_user(key) is None
+    assert user_client.get("/files/").json()["success"]
+    assert get_cached_user(key)[0].fullName == "Renamed"
+
+
+def test_rollback_keeps_the_entry(user_client, engine):
+    key = session_key(user_client.cookies.get("session"))
+    with Session(engine) as session:
+        user = session.get(User, user_client.user.id)
+        _cache(user, key)
+        user.fullName = "Never saved"
+        session.add(user)
+        session.flush()
+        session.rollback()
+    assert get_cached_user(key)[0].fullName == "Test User"
+    assert not session.info.get(auth_cache._PENDING)
+
+
+def test_deleted_session_is_dropped(user_client, engine):
+    session_id = user_client.cookies.get("session")
+    key = session_key(session_id)
+    assert user_client.get("/files/").json()["success"]
+    assert get_cached_user(key)
+    with Session(engine) as session:
+        session.delete(session.exec(select(SessionModel).where(SessionModel.id == session_id)).one())
+        session.commit()
+    assert get_cached_user(key) is None
+    assert user_client.get("/files/").status_code == 401
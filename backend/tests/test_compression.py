@@ -0,0 +1,85 @@
+# tests/test_compression.py
+# STORAGE_COMPRESSION=zstd end to end: uploads are stored compressed, downloads
+# decode them (whole or by Range), or pass them through with Content-Encoding and
+# a separate ETag to clients that accept zstd. Usage counts the original size.
+import pytest
+from sqlmodel import Session
+
+zstandard = pytest.importorskip("zstandard")
+
+from app.files import compression, delivery, usage
+from app.files.storage import file_path
+from app.models import File as FileModel
+
+TEXT = b"".join(b"%06d INFO request handled in 12ms\n" % i for i in range(5000))
+
+
+@pytest.fixture
+def zstd(monkeypatch):
+    monkeypatch.setattr(compression, "STORAGE_COMPRESSION", "zstd")
+    monkeypatch.setattr(delivery, "DOWNLOAD_DELIVERY", "direct")
+
+
+def _upload(client, name="server.log", content=TEXT, content_type="text/plain"):
+    body = client.post(f"/files/upload/stream?name={name}", content=content, headers={"content-type": content_type}).json()
+    assert body["success"], body
+    return body["data"]
+
+
+def test_round_trip(user_client, zstd, engine):
+    file = _upload(user_client)
+    assert file["contentEncoding"] == "zstd"
+    assert file["size"] == len(TEXT)
+    assert file["storedSize"] < len(TEXT) // 4
+    with Session(engine) as session:
+        stored = file_path(session.get(FileModel, file["id"]))
+    with open(stored, "rb") as f:
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(f.read()) == TEXT
+
+    response = user_client.get(f"/files/download/{file['id']}", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.content == TEXT
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_media_is_stored_as_is(user_client, zstd):
+    file = _upload(user_client, "photo.jpg", TEXT + b"jpeg", "image/jpeg")
+    assert not file.get("contentEncoding")
+
+
+def test_range_on_a_compressed_blob(user_client, zstd):
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}", headers={"range": "bytes=100000-100099", "accept-encoding": "identity"})
+    assert response.status_code == 206
+    assert response.content == TEXT[100000:100100]
+    assert response.headers["content-range"] == f"bytes 100000-100099/{len(TEXT)}"
+
+    tail = user_client.get(f"/files/download/{file['id']}", headers={"range": "bytes=-10", "accept-encoding": "identity"})
+    assert tail.content == TEXT[-10:]
+
+
+def test_zstd_passthrough_has_its_own_etag(user_client, zstd):
+    file = _upload(user_client)
+    plain = user_client.get(f"/files/download/{file['id']}", headers={"accept-encoding": "gzip"})
+    encoded = user_client.get(f"/files/download/{file['id']}", headers={"accept-encoding": "zstd"})
+    assert encoded.status_code == 200
+    assert encoded.headers["content-encoding"] == "zstd"
+    assert int(encoded.headers["content-length"]) == file["storedSize"]
+    # httpx decodes zstd itself; Content-Length is what went over the wire
+    assert encoded.content == TEXT
+
+    assert encoded.headers["etag"].endswith('-zstd"')
+    assert encoded.headers["etag"] != plain.headers["etag"]
+    assert encoded.headers["etag"][:-len('-zstd"')] == plain.headers["etag"][:-1]
+
+    revalidated = user_client.get(f"/files/download/{file['id']}", headers={"accept-encoding": "zstd", "if-none-match": encoded.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_usage_counts_original_size(user_client, zstd, engine):
+    file = _upload(user_client)
+    with Session(engine) as session:
+        assert usage.used_bytes(session, user_client.user.accountId) == len(TEXT)
+    assert file["storedSize"] < file["size"]
+
@@ -0,0 +1,130 @@
+# tests/test_delivery.py
+# How downloads leave the server: streamed by the app, or handed to the front
+# proxy with X-Accel-Redirect / X-Sendfile (and the cases that always stream).
+import os
+import pytest
+
+from app.files import compression, delivery
+from app.files.storage import UPLOAD_DIR
+
+CONTENT = b"0123456789" * 1000
+
+
+def _upload(client, name="report.bin", content=CONTENT, content_type="application/octet-stream"):
+    response = client.post(f"/files/upload/stream?name={name}", content=content, headers={"content-type": content_type})
+    body = response.json()
+    assert body["success"], body
+    return body["data"]
+
+
+@pytest.fixture
+def mode(monkeypatch):
+    def set_mode(value):
+        monkeypatch.setattr(delivery, "DOWNLOAD_DELIVERY", value)
+    return set_mode
+
+
+def test_direct_streams_the_file(user_client, mode):
+    mode("direct")
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert "x-accel-redirect" not in response.headers
+    assert "x-sendfile" not in response.headers
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+
+
+def test_direct_serves_ranges(user_client, mode):
+    mode("direct")
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}", headers={"range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+def test_x_accel_redirect(user_client, mode):
+    mode("x-accel")
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}")
+    assert response.status_code == 200
+    assert response.content == b""
+    target = response.headers["x-accel-redirect"]
+    assert target.startswith(delivery.X_ACCEL_PREFIX)
+    relative = target[len(delivery.X_ACCEL_PREFIX):]
+    with open(os.path.join(UPLOAD_DIR, relative), "rb") as f:
+        assert f.read() == CONTENT
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert "report.bin" in response.headers["content-disposition"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_x_accel_inline_disposition(user_client, mode):
+    mode("x-accel")
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}?inline=true")
+    assert response.headers["content-disposition"].startswith("inline")
+
+
+def test_x_sendfile(user_client, mode):
+    mode("x-sendfile")
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}")
+    assert response.status_code == 200
+    assert response.content == b""
+    path = response.headers["x-sendfile"]
+    assert os.path.isabs(path)
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+    assert "x-accel-redirect" not in response.headers
+
+
+def test_config_is_checked(monkeypatch, tmp_path):
+    with pytest.raises(ValueError):
+        delivery.check_delivery_config("bogus", UPLOAD_DIR)
+    delivery.check_delivery_config("x-accel", UPLOAD_DIR)
+    # blobs outside the aliased root would give X-Accel paths with ../
+    monkeypatch.setattr(delivery, "BLOB_DIR", str(tmp_path / "blobs"))
+    with pytest.raises(ValueError):
+        delivery.check_delivery_config("x-accel", UPLOAD_DIR)
+    delivery.check_delivery_config("x-sendfile", UPLOAD_DIR)
+    delivery.check_delivery_config("x-accel", os.path.commonpath([os.path.abspath(UPLOAD_DIR), str(tmp_path)]))
+
+
+def test_x_accel_outside_the_root_streams(user_client, mode, monkeypatch, tmp_path):
+    mode("x-accel")
+    monkeypatch.setattr(delivery, "X_ACCEL_ROOT", str(tmp_path))
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}")
+    assert response.content == CONTENT
+    assert "x-accel-redirect" not in response.headers
+
+
+@pytest.mark.parametrize("value", ["x-accel", "x-sendfile"])
+def test_files_without_a_local_path_stream(user_client, mode, monkeypatch, value):
+    # a remote storage backend has no path to hand to the proxy
+    mode(value)
+    monkeypatch.setattr(delivery, "file_path", lambda file_obj: None)
+    file = _upload(user_client)
+    response = user_client.get(f"/files/download/{file['id']}", headers={"range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+    assert "x-accel-redirect" not in response.headers
+    assert "x-sendfile" not in response.headers
+
+
+def test_compressed_files_stream(user_client, mode, monkeypatch):
+    pytest.importorskip("zstandard")
+    mode("x-accel")
+    monkeypatch.setattr(compression, "STORAGE_COMPRESSION", "zstd")
+    text = b"log line\n" * 2000
+    file = _upload(user_client, "app.log", text, "text/plain")
+    assert file["contentEncoding"] == "zstd"
+
+    response = user_client.get(f"/files/download/{file['id']}", headers={"accept-encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == text
+    assert "x-accel-redirect" not in response.headers
+    assert "content-encoding" not in response.headers
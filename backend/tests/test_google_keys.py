@@ -0,0 +1,160 @@
+# tests/test_google_keys.py
+# Google ID token verification against a locally generated keyset served from a
+# stubbed JWKS endpoint.
+import json, time
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.auth import google_keys as gk
+from app.auth.google_keys import GoogleKeyStore, InvalidGoogleToken, verify_google_id_token
+
+AUDIENCE = "client-id.apps.googleusercontent.com"
+
+
+def _keypair(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    jwk.update(kid=kid, alg="RS256", use="sig")
+    return private, jwk
+
+
+class JWKS:
+    """Stub for Google's certs endpoint; `keys` can be swapped to rotate."""
+
+    def __init__(self, *jwks, max_age=3600):
+        self.keys = list(jwks)
+        self.max_age = max_age
+        self.requests = 0
+        self.fail = False
+
+    def handler(self, request):
+        self.requests += 1
+        if self.fail:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"keys": self.keys}, headers={"cache-control": f"public, max-age={self.max_age}"})
+
+    def store(self):
+        return GoogleKeyStore("https://certs.test/", client=httpx.Client(transport=httpx.MockTransport(self.handler)))
+
+
+def _token(private, kid, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": AUDIENCE,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "email_verified": True,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture(scope="module")
+def key1():
+    return _keypair("k1")
+
+
+@pytest.fixture(scope="module")
+def key2():
+    return _keypair("k2")
+
+
+def _code(token, store):
+    with pytest.raises(InvalidGoogleToken) as exc:
+        verify_google_id_token(token, AUDIENCE, store)
+    return exc.value.code
+
+
+def test_valid_token(key1):
+    jwks = JWKS(key1[1])
+    claims = verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, jwks.store())
+    assert claims["email"] == "user@example.com"
+    assert jwks.requests == 1
+
+
+def test_keys_are_cached(key1):
+    jwks = JWKS(key1[1])
+    store = jwks.store()
+    for _ in range(3):
+        verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, store)
+    assert jwks.requests == 1
+
+
+def test_kid_rotation_refetches(key1, key2, monkeypatch):
+    monkeypatch.setattr(gk, "MIN_REFETCH_INTERVAL", 0)
+    jwks = JWKS(key1[1])
+    store = jwks.store()
+    verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, store)
+
+    jwks.keys = [key2[1]]
+    claims = verify_google_id_token(_token(key2[0], "k2"), AUDIENCE, store)
+    assert claims["sub"] == "1234567890"
+    assert jwks.requests == 2
+
+
+def test_unknown_kid_refetch_is_rate_limited(key1, key2):
+    jwks = JWKS(key1[1])
+    store = jwks.store()
+    verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, store)
+
+    assert _code(_token(key2[0], "k2"), store) == "INVALID_TOKEN"
+    assert _code(_token(key2[0], "k2"), store) == "INVALID_TOKEN"
+    assert jwks.requests == 1
+
+
+def test_expired_keys_are_refetched(key1):
+    jwks = JWKS(key1[1], max_age=0)
+    store = jwks.store()
+    verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, store)
+    verify_google_id_token(_token(key1[0], "k1"), AUDIENCE, store)
+    assert jwks.requests == 2
+
+
+def test_wrong_signing_key(key1, key2):
+    # signed with key2 but claiming kid k1
+    assert _code(_token(key2[0], "k1"), JWKS(key1[1]).store()) == "INVALID_TOKEN"
+
+
+def test_bad_audience(key1):
+    assert _code(_token(key1[0], "k1", aud="someone-else"), JWKS(key1[1]).store()) == "INVALID_AUD"
+
+
+def test_bad_issuer(key1):
+    assert _code(_token(key1[0], "k1", iss="https://evil.example.com"), JWKS(key1[1]).store()) == "INVALID_ISS"
+
+
+def test_expired_token(key1):
+    past = int(time.time()) - 3600
+    token = _token(key1[0], "k1", iat=past - 3600, exp=past)
+    assert _code(token, JWKS(key1[1]).store()) == "TOKEN_EXPIRED"
+
+
+def test_clock_skew_is_tolerated(key1):
+    token = _token(key1[0], "k1", exp=int(time.time()) - gk.CLOCK_SKEW // 2)
+    assert verify_google_id_token(token, AUDIENCE, JWKS(key1[1]).store())["sub"] == "1234567890"
+
+
+def test_unverified_email(key1):
+    assert _code(_token(key1[0], "k1", email_verified=False), JWKS(key1[1]).store()) == "EMAIL_NOT_VERIFIED"
+
+
+def test_missing_claims(key1):
+    private = key1[0]
+    token = jwt.encode({"iss": "accounts.google.com", "aud": AUDIENCE, "exp": int(time.time()) + 60},
+                       private, algorithm="RS256", headers={"kid": "k1"})
+    assert _code(token, JWKS(key1[1]).store()) == "INVALID_TOKEN"
+
+
+def test_malformed_token(key1):
+    assert _code("not-a-jwt", JWKS(key1[1]).store()) == "INVALID_TOKEN"
+
+
+def test_keys_unavailable(key1):
+    jwks = JWKS(key1[1])
+    jwks.fail = True
+    assert _code(_token(key1[0], "k1"), jwks.store()) == "KEYS_UNAVAILABLE"
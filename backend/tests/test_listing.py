@@ -0,0 +1,71 @@
+# tests/test_listing.py
+# Keyset pagination of GET /files/, including rows whose sort value is NULL,
+# and the type filter.
+import pytest
+from sqlmodel import Session, update
+
+from app.files import usage
+from app.models import File as FileModel
+
+
+def _pages(client, **params):
+    seen, totals, cursor = [], set(), None
+    while True:
+        query = dict(params, limit=2)
+        if cursor:
+            query["cursor"] = cursor
+        data = client.get("/files/", params=query).json()["data"]
+        totals.add(data["total"])
+        seen += [(d["size"], d["id"]) for d in data["documents"]]
+        cursor = data["nextCursor"]
+        if not data["hasMore"]:
+            assert totals == {len(seen)}
+            return seen
+
+
+@pytest.fixture
+def files_with_null_sizes(user_client, engine):
+    ids = []
+    for i, content in enumerate([b"a", b"bb", b"bb", b"cccc", b"d", b"e", b"f"]):
+        response = user_client.post(f"/files/upload/stream?name=f{i}.bin", content=content + bytes([i]),
+                                    headers={"content-type": "application/octet-stream"})
+        ids.append(response.json()["data"]["id"])
+    with Session(engine) as session:
+        session.exec(update(FileModel).where(FileModel.id.in_(ids[4:])).values(size=None))
+        session.commit()
+    return ids
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_size_sort_pages_through_nulls(user_client, files_with_null_sizes, order):
+    seen = _pages(user_client, sort="size", order=order)
+    assert sorted(i for _, i in seen) == sorted(files_with_null_sizes)
+
+    sized = [(s, i) for s, i in seen if s is not None]
+    nulls = [(s, i) for s, i in seen if s is None]
+    if order == "asc":
+        assert seen == sorted(sized) + sorted(nulls, key=lambda r: r[1])
+    else:
+        assert seen == sorted(nulls, key=lambda r: r[1], reverse=True) + sorted(sized, reverse=True)
+
+
+def test_name_sort_pages(user_client, files_with_null_sizes):
+    seen = _pages(user_client, sort="name", order="asc")
+    assert len(seen) == len(files_with_null_sizes)
+
+
+def test_type_filter_ignores_case(user_client, files_with_null_sizes, engine):
+    with Session(engine) as session:
+        session.exec(update(FileModel).where(FileModel.id == files_with_null_sizes[0]).values(type="IMAGE/PNG"))
+        session.commit()
+    data = user_client.get("/files/", params={"type": "image"}).json()["data"]
+    assert [d["id"] for d in data["documents"]] == [files_with_null_sizes[0]]
+    assert data["total"] == 1
+    other = user_client.get("/files/", params={"type": "other"}).json()["data"]
+    assert other["total"] == len(files_with_null_sizes) - 1
+
+    # usage counters use the same expression
+    with Session(engine) as session:
+        usage.recompute_usage(session, user_client.user.accountId)
+        session.commit()
+        assert usage.usage_summary(session, user_client.user.accountId)["image"]["size"] == 2
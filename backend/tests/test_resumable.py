@@ -0,0 +1,77 @@
+# tests/test_resumable.py
+# Resumable uploads: offset checks, one PATCH at a time, quota at completion.
+from sqlmodel import Session
+
+from app.files import resumable, usage
+from app.models import UploadSession
+
+
+def _create(client, size, name="big.bin"):
+    response = client.post("/files/uploads", json={"name": name, "size": size})
+    return response.json()["data"]["uploadId"]
+
+
+def _patch(client, upload_id, offset, body):
+    return client.patch(f"/files/uploads/{upload_id}", content=body, headers={"upload-offset": str(offset)})
+
+
+def test_chunks_and_offset_conflict(user_client):
+    upload_id = _create(user_client, 10)
+    assert _patch(user_client, upload_id, 0, b"01234").status_code == 204
+    conflict = _patch(user_client, upload_id, 0, b"01234")
+    assert conflict.status_code == 409
+    assert conflict.headers["upload-offset"] == "5"
+    done = _patch(user_client, upload_id, 5, b"56789")
+    assert done.json()["data"]["size"] == 10
+
+
+def test_patch_in_progress_is_rejected(user_client):
+    upload_id = _create(user_client, 10)
+    resumable._appending.add(upload_id)
+    try:
+        assert _patch(user_client, upload_id, 0, b"0123456789").status_code == 409
+    finally:
+        resumable._appending.discard(upload_id)
+    assert _patch(user_client, upload_id, 0, b"0123456789").json()["success"]
+
+
+def test_quota_is_checked_when_the_upload_completes(user_client, monkeypatch):
+    monkeypatch.setattr(usage, "ACCOUNT_QUOTA_BYTES", 150)
+    upload_id = _create(user_client, 100)
+    assert _patch(user_client, upload_id, 0, b"x" * 50).status_code == 204
+
+    # meanwhile another upload takes most of the space
+    other = user_client.post("/files/upload/stream?name=other.bin", content=b"y" * 100,
+                             headers={"content-type": "application/octet-stream"}).json()["data"]
+
+    refused = _patch(user_client, upload_id, 50, b"x" * 50)
+    assert refused.status_code == 413
+    assert refused.json()["error"]["code"] == "QUOTA_EXCEEDED"
+    assert refused.headers["upload-offset"] == "100"
+    assert user_client.head(f"/files/uploads/{upload_id}").headers["upload-offset"] == "100"
+
+    # once space is freed, an empty PATCH at the end finishes the upload
+    user_client.delete(f"/files/{other['id']}")
+    done = _patch(user_client, upload_id, 100, b"").json()
+    assert done["success"]
+    assert done["data"]["size"] == 100
+
+
+def test_chunk_past_declared_length(user_client):
+    upload_id = _create(user_client, 4)
+    refused = _patch(user_client, upload_id, 0, b"too long")
+    assert refused.status_code == 413
+    assert refused.json()["error"]["code"] == "LENGTH_EXCEEDED"
+    assert user_client.head(f"/files/uploads/{upload_id}").headers["upload-offset"] == "0"
+    assert _patch(user_client, upload_id, 0, b"okay").json()["success"]
+
+
+def test_offset_claim_is_conditional(user_client, engine):
+    # what a PATCH from another process sees when this one moved the offset first
+    upload_id = _create(user_client, 10)
+    expires = resumable._now() + resumable.UPLOAD_SESSION_TTL
+    with Session(engine) as session:
+        assert resumable._claim_offset(session, upload_id, 0, 5, expires)
+        assert not resumable._claim_offset(session, upload_id, 0, 7, expires)
+        assert session.get(UploadSession, upload_id).offset == 5
+    assert _patch(user_client, upload_id, 0, b"01234").status_code == 409
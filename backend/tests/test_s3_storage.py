@@ -0,0 +1,103 @@
+# tests/test_s3_storage.py
+# S3Storage against moto's in-process S3, on its own and as the app's blob store.
+import io, os, time, zipfile
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from app.files import blobs, storage
+from app.files.storage import S3Storage, new_staging_path, shard_prefix
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        import boto3
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield S3Storage(BUCKET, "blobs/", client=client)
+
+
+def _staged(content: bytes) -> str:
+    path = new_staging_path()
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_put_get_stat_delete(s3):
+    key = "ab" * 32
+    path = _staged(b"hello world")
+    s3.put(key, path)
+    assert not os.path.exists(path)
+    assert s3.local_path(key) is None
+
+    keys = [o["Key"] for o in s3.client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == [f"blobs/{shard_prefix(key)}/{key}"]
+
+    assert s3.get(key) == b"hello world"
+    stat = s3.stat(key)
+    assert stat.size == 11
+    assert abs(stat.mtime - time.time()) < 60
+
+    s3.delete(key)
+    assert s3.stat(key) is None
+
+
+def test_stream_ranges(s3):
+    key = "cd" * 32
+    content = os.urandom(20000)
+    s3.put(key, _staged(content))
+    assert b"".join(s3.stream(key, chunk_size=4096)) == content
+    assert b"".join(s3.stream(key, 100, 199)) == content[100:200]
+    assert b"".join(s3.stream(key, 19990)) == content[19990:]
+
+
+def test_stat_missing(s3):
+    assert s3.stat("ef" * 32) is None
+
+
+def test_list_shard(s3):
+    for key in ("ab" + "1" * 62, "ab" + "2" * 62, "cd" + "3" * 62):
+        s3.put(key, _staged(b"x"))
+    assert sorted(key for key, _ in s3.list_shard("ab")) == ["ab" + "1" * 62, "ab" + "2" * 62]
+    assert list(s3.list_shard("00")) == []
+
+
+@pytest.fixture
+def s3_blobs(s3, monkeypatch):
+    monkeypatch.setattr(storage, "blob_storage", s3)
+    monkeypatch.setattr(blobs, "blob_storage", s3)
+    monkeypatch.setitem(storage._stores, "blob", s3)
+    return s3
+
+
+def _objects(s3):
+    return [o["Key"] for o in s3.client.list_objects_v2(Bucket=BUCKET).get("Contents", ())]
+
+
+def test_app_with_s3_backend(user_client, s3_blobs):
+    content = os.urandom(300000)
+    response = user_client.post("/files/upload/stream?name=data.bin", content=content, headers={"content-type": "application/octet-stream"})
+    file = response.json()["data"]
+    assert _objects(s3_blobs) == [f"blobs/{shard_prefix(file['blobHash'])}/{file['blobHash']}"]
+
+    download = user_client.get(f"/files/download/{file['id']}")
+    assert download.status_code == 200
+    assert download.content == content
+    assert "x-accel-redirect" not in download.headers
+
+    partial = user_client.get(f"/files/download/{file['id']}", headers={"range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == content[10:20]
+
+    archive = user_client.post("/files/download/zip", json={"ids": [file["id"]]})
+    assert zipfile.ZipFile(io.BytesIO(archive.content)).read("data.bin") == content
+
+    assert user_client.delete(f"/files/{file['id']}").json()["success"]
+    assert _objects(s3_blobs) == []
@@ -0,0 +1,120 @@
+# tests/test_scrub.py
+# The scrubber against a throwaway blob store (and the test UPLOAD_DIR): what
+# --repair deletes, what it must leave alone, refCount repair, and resuming a
+# checkpointed run.
+import os, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlmodel import Session, select, update
+
+from app.files import scrub
+from app.files.scrub import Checkpoint, Scrubber
+from app.files.storage import LocalStorage
+from app.models import Blob, File as FileModel
+
+GRACE = 3600
+
+
+@pytest.fixture
+def store(tmp_path, client):
+    # `client` runs the app's startup, which creates the tables
+    return LocalStorage(str(tmp_path / "blobs"))
+
+
+def _key():
+    return uuid.uuid4().hex + uuid.uuid4().hex
+
+
+def _put(store, key, age=2 * GRACE, content=b"bytes"):
+    path = store.local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return key
+
+
+def _run_pass(scrubber, name):
+    with ThreadPoolExecutor(2) as scrubber.pool:
+        getattr(scrubber, name)()
+    return scrubber.counts
+
+
+def _upload(client, content):
+    body = client.post("/files/upload/stream?name=scrub.bin", content=content, headers={"content-type": "application/octet-stream"}).json()
+    assert body["success"], body
+    return body["data"]
+
+
+def test_repair_deletes_orphans_past_the_grace_period(engine, store):
+    old, young = _put(store, _key()), _put(store, _key(), age=60)
+    counts = _run_pass(Scrubber(engine, store, repair=True, grace=GRACE), "scrub_shards")
+    assert counts["orphan-blob"] == 1
+    assert counts["repaired"] == 1
+    assert store.stat(old) is None
+    assert store.stat(young) is not None
+
+
+def test_report_only_without_repair(engine, store):
+    old = _put(store, _key())
+    counts = _run_pass(Scrubber(engine, store, grace=GRACE), "scrub_shards")
+    assert counts["orphan-blob"] == 1 and not counts["repaired"]
+    assert store.stat(old) is not None
+
+
+def test_referenced_blobs_are_kept(user_client, engine, store):
+    file = _upload(user_client, uuid.uuid4().bytes * 64)
+    with Session(engine) as session:
+        blob_hash = session.get(FileModel, file["id"]).blobHash
+    _put(store, blob_hash)
+    counts = _run_pass(Scrubber(engine, store, repair=True, grace=GRACE), "scrub_shards")
+    assert not counts["orphan-blob"]
+    assert store.stat(blob_hash) is not None
+
+    # a File row still pointing at the bytes protects them even without a Blob row
+    with Session(engine) as session:
+        session.exec(update(FileModel).where(FileModel.id == file["id"]).values(blobHash=None))
+        session.delete(session.get(Blob, blob_hash))
+        session.commit()
+        session.exec(update(FileModel).where(FileModel.id == file["id"]).values(blobHash=blob_hash))
+        session.commit()
+    counts = _run_pass(Scrubber(engine, store, repair=True, grace=GRACE), "scrub_shards")
+    assert not counts["orphan-blob"]
+    assert store.stat(blob_hash) is not None
+
+
+def test_repair_fixes_ref_count(user_client, engine):
+    file = _upload(user_client, uuid.uuid4().bytes * 64)
+    with Session(engine) as session:
+        blob_hash = session.get(FileModel, file["id"]).blobHash
+        session.exec(update(Blob).where(Blob.hash == blob_hash).values(refCount=5))
+        session.commit()
+    counts = _run_pass(Scrubber(engine, repair=True, grace=GRACE), "scrub_blobs")
+    assert counts["refcount"] >= 1 and counts["repaired"] >= 1
+    with Session(engine) as session:
+        assert session.exec(select(Blob.refCount).where(Blob.hash == blob_hash)).one() == 1
+
+
+def test_checkpointed_run_resumes(engine, store, tmp_path, monkeypatch):
+    keys = {_put(store, f"{shard}{uuid.uuid4().hex}") for shard in scrub.SHARDS[::16]}
+    path = str(tmp_path / "scrub.json")
+    Checkpoint(path).save(**{"pass": "shards"})
+
+    first = Scrubber(engine, store, workers=1, grace=GRACE, checkpoint=Checkpoint(path), max_seconds=1e-6).run()
+    assert not first["complete"]
+    done = set(Checkpoint(path).state["shards"])
+    assert done and len(done) < len(scrub.SHARDS)
+
+    scanned = []
+    scan_shard = Scrubber._scan_shard
+    def recording(self, shard):
+        scanned.append(shard)
+        return scan_shard(self, shard)
+    monkeypatch.setattr(Scrubber, "_scan_shard", recording)
+
+    second = Scrubber(engine, store, workers=1, grace=GRACE, checkpoint=Checkpoint(path)).run()
+    assert second["complete"] == 1
+    assert set(scanned) == set(scrub.SHARDS) - done
+    assert first["orphan-blob"] + second["orphan-blob"] == len(keys)
+    assert not os.path.exists(path)
@@ -0,0 +1,90 @@
+# tests/test_search.py
+# GET /files/search over the SQLite FTS index: substring, prefix and fuzzy
+# matches, the triggers that keep the index in step with files, and visibility
+# (own files plus files shared with the caller, never anyone else's).
+import pytest
+from sqlalchemy import text
+
+
+def _upload(client, name, content_type="text/plain"):
+    response = client.post(f"/files/upload/stream?name={name}", content=name.encode(), headers={"content-type": content_type})
+    body = response.json()
+    assert body["success"], body
+    return body["data"]
+
+
+def _names(client, q, **params):
+    data = client.get("/files/search", params=dict(params, q=q)).json()["data"]
+    assert data["total"] == len(data["documents"])
+    return sorted(d["name"] for d in data["documents"])
+
+
+@pytest.fixture
+def files(user_client):
+    types = {"Quarterly Report.pdf": "application/pdf", "report-draft.txt": "text/plain", "holiday.jpg": "image/jpeg", "Notes.md": "text/markdown"}
+    return {name: _upload(user_client, name, content_type) for name, content_type in types.items()}
+
+
+def test_substring_is_case_insensitive(user_client, files):
+    assert _names(user_client, "REPORT") == ["Quarterly Report.pdf", "report-draft.txt"]
+    assert _names(user_client, "iday") == ["holiday.jpg"]
+
+
+def test_short_query_is_a_case_insensitive_prefix(user_client, files):
+    assert _names(user_client, "no") == ["Notes.md"]
+    assert _names(user_client, "RE") == ["report-draft.txt"]
+    # LIKE wildcards in q are literal
+    assert _names(user_client, "_") == []
+
+
+def test_fuzzy_tolerates_typos(user_client, files):
+    assert "Quarterly Report.pdf" in _names(user_client, "quartrely", fuzzy="true")
+    assert _names(user_client, "quartrely") == []
+
+
+def test_type_filter(user_client, files):
+    assert _names(user_client, "day", type="image") == ["holiday.jpg"]
+    assert _names(user_client, "day", type="other") == []
+    assert _names(user_client, "report", type="IMAGE") == []
+
+
+def test_index_follows_insert_rename_delete(user_client, files, engine):
+    file = files["Notes.md"]
+    with engine.connect() as conn:
+        indexed = conn.execute(text(
+            "SELECT f.name FROM files_fts f JOIN files_fts_map m ON m.docid = f.rowid WHERE m.file_id = :id"
+        ), {"id": file["id"]}).scalar_one()
+    assert indexed == "Notes.md"
+
+    assert user_client.put(f"/files/rename/{file['id']}", json={"name": "minutes.md"}).json()["success"]
+    assert _names(user_client, "notes") == []
+    assert _names(user_client, "minute") == ["minutes.md"]
+
+    assert user_client.delete(f"/files/{file['id']}").json()["success"]
+    assert _names(user_client, "minute") == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM files_fts_map WHERE file_id = :id"), {"id": file["id"]}).scalar_one() == 0
+
+
+def test_shared_files_are_visible_others_are_not(user_client, make_user):
+    owner, owner_session = make_user()
+    stranger, stranger_session = make_user()
+    me = user_client.cookies.get("session")
+
+    user_client.cookies.set("session", owner_session)
+    shared = _upload(user_client, "budget shared.xlsx")
+    _upload(user_client, "budget private.xlsx")
+    assert user_client.post(f"/files/share-user/{shared['id']}", json={"email": user_client.user.email, "mode": "share"}).json()["success"]
+
+    user_client.cookies.set("session", stranger_session)
+    _upload(user_client, "budget stranger.xlsx")
+
+    user_client.cookies.set("session", me)
+    _upload(user_client, "budget mine.xlsx")
+    assert _names(user_client, "budget") == ["budget mine.xlsx", "budget shared.xlsx"]
+    assert _names(user_client, "budget", scope="shared") == ["budget shared.xlsx"]
+    assert _names(user_client, "budget", scope="owned") == ["budget mine.xlsx"]
+    assert _names(user_client, "bud") == ["budget mine.xlsx", "budget shared.xlsx"]
+    assert _names(user_client, "budgte", fuzzy="true") == ["budget mine.xlsx", "budget shared.xlsx"]
+    results = user_client.get("/files/search", params={"q": "budget"}).json()["data"]["documents"]
+    assert {d["name"]: d["access"] for d in results} == {"budget mine.xlsx": "owner", "budget shared.xlsx": "shared-user"}
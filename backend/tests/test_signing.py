@@ -0,0 +1,61 @@
+# tests/test_signing.py
+# Signed links: disabled while only the public default JWT_SECRET is known, and
+# the public share payload carries the signed URL rather than the (authenticated)
+# file URL.
+import pytest
+
+from app.files import signing
+
+
+def _public_token(client):
+    response = client.post("/files/upload/stream?name=shared.txt", content=b"hello", headers={"content-type": "text/plain"})
+    file = response.json()["data"]
+    token = client.post(f"/files/share/{file['id']}/public").json()["data"]["token"]
+    return file, token
+
+
+@pytest.fixture
+def no_signing_key(monkeypatch):
+    monkeypatch.setattr(signing, "SIGNING_KID", None)
+    monkeypatch.setattr(signing, "SIGNING_KEYS", {})
+    monkeypatch.setattr(signing, "SIGNING_ENABLED", False)
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    monkeypatch.setattr(signing, "SIGNING_KID", "test")
+    monkeypatch.setattr(signing, "SIGNING_KEYS", {"test": b"test-secret"})
+    monkeypatch.setattr(signing, "SIGNING_ENABLED", True)
+
+
+def test_default_jwt_secret_disables_signing(monkeypatch):
+    monkeypatch.delenv("URL_SIGNING_KEYS", raising=False)
+    monkeypatch.setattr(signing, "JWT_SECRET", signing.DEFAULT_JWT_SECRET)
+    assert signing._load_keys() == (None, {})
+
+    monkeypatch.setattr(signing, "JWT_SECRET", "something else")
+    kid, keys = signing._load_keys()
+    assert kid == "default" and keys[kid]
+
+    monkeypatch.setenv("URL_SIGNING_KEYS", "k2:two,k1:one")
+    monkeypatch.setattr(signing, "JWT_SECRET", signing.DEFAULT_JWT_SECRET)
+    assert signing._load_keys() == ("k2", {"k2": b"two", "k1": b"one"})
+
+
+def test_public_link_refused_without_key(user_client, no_signing_key):
+    _, token = _public_token(user_client)
+    body = user_client.get(f"/files/public/{token}").json()
+    assert body["code"] == 503
+    assert body["error"]["code"] == "SIGNED_LINKS_DISABLED"
+
+
+def test_public_link_serves_signed_url(user_client, signing_key):
+    file, token = _public_token(user_client)
+    data = user_client.get(f"/files/public/{token}").json()["data"]
+    assert "url" not in data
+    assert data["downloadUrl"].startswith(f"/files/signed/{file['id']}?")
+
+    user_client.cookies.clear()
+    response = user_client.get(data["downloadUrl"])
+    assert response.status_code == 200
+    assert response.content == b"hello"
@@ -0,0 +1,59 @@
+# tests/test_thumbnails.py
+# GET /files/{id}/thumbnail: rendered in the worker pool and cached; content that
+# does not decode is 422, any other failure 500.
+import io
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from app.files import router
+
+
+def _png(width=800, height=600):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _upload(client, name, content, content_type):
+    body = client.post(f"/files/upload/stream?name={name}", content=content, headers={"content-type": content_type}).json()
+    assert body["success"], body
+    return body["data"]
+
+
+def test_image_round_trip(user_client):
+    file = _upload(user_client, "red.png", _png(), "image/png")
+    response = user_client.get(f"/files/{file['id']}/thumbnail", params={"size": "small"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    thumb = Image.open(io.BytesIO(response.content))
+    assert thumb.format == "WEBP"
+    assert thumb.size == (128, 96)
+    assert thumb.convert("RGB").getpixel((64, 48))[0] > 150
+
+    etag = response.headers["etag"]
+    again = user_client.get(f"/files/{file['id']}/thumbnail", params={"size": "small"}, headers={"if-none-match": etag})
+    assert again.status_code == 304
+
+
+def test_undecodable_image_is_422(user_client):
+    file = _upload(user_client, "fake.png", b"not a png at all", "image/png")
+    body = user_client.get(f"/files/{file['id']}/thumbnail").json()
+    assert body["code"] == 422
+    assert body["error"]["code"] == "THUMBNAIL_FAILED"
+
+
+def test_unsupported_type_is_415(user_client):
+    file = _upload(user_client, "notes.txt", b"hello", "text/plain")
+    assert user_client.get(f"/files/{file['id']}/thumbnail").json()["code"] == 415
+
+
+def test_other_failures_are_500(user_client, monkeypatch):
+    async def broken(file_obj, size):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(router, "ensure_thumbnail", broken)
+    file = _upload(user_client, "blue.png", _png(40, 40), "image/png")
+    response = user_client.get(f"/files/{file['id']}/thumbnail")
+    assert response.status_code == 500
+    assert response.json()["error"]["code"] == "THUMBNAIL_ERROR"
+    assert response.headers["cache-control"] == "no-store"
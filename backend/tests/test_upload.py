@@ -0,0 +1,32 @@
+# tests/test_upload.py
+# Staged upload bytes are removed when the File row cannot be created.
+import os
+import pytest
+
+from app.files import router
+from app.files.storage import STAGING_DIR
+
+
+@pytest.fixture
+def failing_record(monkeypatch):
+    def create_file_record(*args, **kwargs):
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(router, "create_file_record", create_file_record)
+
+
+def _staged():
+    return set(os.listdir(STAGING_DIR))
+
+
+def test_stream_upload_cleans_up(user_client, failing_record):
+    before = _staged()
+    with pytest.raises(RuntimeError):
+        user_client.post("/files/upload/stream?name=a.bin", content=b"x" * 1000, headers={"content-type": "application/octet-stream"})
+    assert _staged() == before
+
+
+def test_multipart_upload_cleans_up(user_client, failing_record):
+    before = _staged()
+    with pytest.raises(RuntimeError):
+        user_client.post("/files/upload", files={"upload": ("a.bin", b"x" * 1000, "application/octet-stream")})
+    assert _staged() == before